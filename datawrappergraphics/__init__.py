@@ -10,4 +10,9 @@ except PackageNotFoundError:
 
 from datawrappergraphics.errors import *
 from datawrappergraphics.icons import dw_icons
-from datawrappergraphics.graphics import *
\ No newline at end of file
+from datawrappergraphics.cache import *
+from datawrappergraphics.retry import *
+from datawrappergraphics.ratelimit import *
+from datawrappergraphics.encoding import *
+from datawrappergraphics.graphics import *
+from datawrappergraphics.aio import *
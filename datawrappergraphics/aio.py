@@ -0,0 +1,972 @@
+# Asyncio versions of the Graphic, Chart, Map and Folder classes.
+#
+# These make their requests with httpx, which is an optional dependency. Install it with:
+#
+#   pip install datawrappergraphics[async]
+#
+# Methods on the async classes don't make any requests right away. Instead, they queue up a step and return the object, so they can be chained
+# just like the regular classes. The queued steps run in order when the object is awaited:
+#
+#   await AsyncMap(chart_id).data(df).head("A headline").publish()
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import pandas as pd
+import geopandas
+from datawrappergraphics.graphics import Datawrapper, Graphic, Map, CHART_TYPES, _deep_merge, _differs, _modified_since_publish, _read_chunks
+from datawrappergraphics.cache import write_atomic
+from datawrappergraphics.errors import *
+from datawrappergraphics.encoding import JSONStream
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+__all__ = ["AsyncDatawrapper", "AsyncGraphic", "AsyncChart", "AsyncMap", "AsyncFolder", "gather_limited"]
+
+
+
+
+class AsyncDatawrapper(Datawrapper):
+
+    """The base class for async Datawrapper folders and graphics.
+
+    All async objects share a single httpx.AsyncClient, so connections to Datawrapper's API are pooled and kept alive between calls.
+    Use configure_client() to tune the pool, or set_client() to inject your own client. This object should not be instantiated directly.
+
+    Args:
+        auth_token (str, optional): The auth_token from Datawrapper. You can authenticate by passing this into the class instantiation, or by putting an auth.txt file in your project's root folder with the token.
+    """
+
+    # Settings for the shared client. The timeout is in seconds.
+    client_config = {
+        "max_connections": 20,
+        "max_keepalive_connections": 20,
+        "keepalive_expiry": 30,
+        "timeout": 120,
+    }
+
+    # The shared client, and the event loop it was created in. httpx clients can't be shared between event loops.
+    _client = None
+    _client_loop = None
+    _client_injected = False
+
+
+
+
+    @classmethod
+    def configure_client(cls,
+                         max_connections: int = None,
+                         max_keepalive_connections: int = None,
+                         keepalive_expiry: float = None,
+                         timeout: float = None):
+
+        """Changes the settings of the client shared by all async Datawrapper objects.
+
+        A new client is built with the new settings the next time a request is made. Any argument left as None keeps its current value.
+
+        Args:
+            max_connections (int, optional): The maximum number of requests to Datawrapper's API that can be in flight at once.
+            max_keepalive_connections (int, optional): The maximum number of idle connections to keep open.
+            keepalive_expiry (float, optional): How long an idle connection is kept open, in seconds.
+            timeout (float, optional): The default timeout for every request, in seconds.
+        """
+
+        settings = {
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "keepalive_expiry": keepalive_expiry,
+            "timeout": timeout,
+        }
+
+        AsyncDatawrapper.client_config = {**AsyncDatawrapper.client_config, **{key: value for key, value in settings.items() if value is not None}}
+
+        if not AsyncDatawrapper._client_injected:
+            AsyncDatawrapper._client_loop = None
+
+
+
+
+    @classmethod
+    def set_client(cls, client = None):
+
+        """Injects a custom httpx.AsyncClient to be used by all async Datawrapper objects. Pass None to go back to the default client.
+
+        Args:
+            client (httpx.AsyncClient): The client to use for all requests to Datawrapper's API.
+        """
+
+        AsyncDatawrapper._client = client
+        AsyncDatawrapper._client_loop = None
+        AsyncDatawrapper._client_injected = client is not None
+
+
+
+
+    @classmethod
+    async def get_client(cls):
+
+        """Returns the client shared by all async Datawrapper objects, creating it if it doesn't exist yet in the running event loop.
+
+        Returns:
+            httpx.AsyncClient: The shared client.
+        """
+
+        if AsyncDatawrapper._client_injected:
+            return AsyncDatawrapper._client
+
+        if httpx is None:
+            raise ImportError("The async classes need httpx. Install it with: pip install datawrappergraphics[async]")
+
+        loop = asyncio.get_running_loop()
+
+        if AsyncDatawrapper._client is None or AsyncDatawrapper._client_loop is not loop:
+
+            # Close the old client if it belongs to this loop. Clients from a loop that has already finished can't be closed anymore.
+            if AsyncDatawrapper._client is not None and AsyncDatawrapper._client_loop is None:
+                await AsyncDatawrapper._client.aclose()
+
+            config = AsyncDatawrapper.client_config
+
+            limits = httpx.Limits(max_connections=config["max_connections"],
+                                  max_keepalive_connections=config["max_keepalive_connections"],
+                                  keepalive_expiry=config["keepalive_expiry"])
+
+            AsyncDatawrapper._client = httpx.AsyncClient(limits=limits, timeout=config["timeout"])
+            AsyncDatawrapper._client_loop = loop
+
+        return AsyncDatawrapper._client
+
+
+
+
+    @classmethod
+    async def aclose(cls):
+
+        """Closes the shared client. Call this at the end of your program to close any open connections."""
+
+        if AsyncDatawrapper._client is not None and not AsyncDatawrapper._client_injected:
+            await AsyncDatawrapper._client.aclose()
+            AsyncDatawrapper._client = None
+            AsyncDatawrapper._client_loop = None
+
+
+
+
+    async def _arequest(self, method: str, endpoint: str, headers: dict = None, idempotent: bool = None, **kwargs):
+
+        """Makes a request to Datawrapper's API using the shared client. This is the async version of Datawrapper._request(). It
+        uses the same rate limits and retries failed requests with the same Datawrapper.retry_policy.
+
+        Args:
+            method (str): The HTTP method (GET, POST, PATCH, PUT, DELETE).
+            endpoint (str): The endpoint, relative to the API's base URL (ie. "charts/abc12/data"). Full URLs are also accepted.
+            headers (dict, optional): Headers to send on top of the default Accept and Authorization headers.
+            idempotent (bool, optional): Whether the request is safe to repeat. See RetryPolicy.
+            **kwargs: Passed on to httpx.AsyncClient.request().
+
+        Returns:
+            httpx.Response: The response from the API.
+        """
+
+        url = endpoint if endpoint.startswith("http") else f"{self.API_URL}/{endpoint.lstrip('/')}"
+
+        request_headers = {
+            "Accept": "*/*",
+            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
+        }
+
+        if headers:
+            request_headers.update(headers)
+
+        client = await self.get_client()
+
+        policy = Datawrapper.retry_policy
+        limiter = self._get_rate_limiter()
+        attempt = 0
+
+        while True:
+
+            if limiter is not None:
+                await limiter.aacquire()
+
+            try:
+                response = await client.request(method, url, headers=request_headers, **kwargs)
+
+            except httpx.TransportError as e:
+
+                if policy is None or not policy.should_retry(method, attempt, idempotent=idempotent):
+                    raise
+
+                reason = type(e).__name__
+                delay = policy.delay(attempt)
+
+            else:
+
+                if policy is None or not policy.should_retry(method, attempt, status=response.status_code, idempotent=idempotent):
+                    return response
+
+                reason = response.status_code
+                delay = policy.delay(attempt, retry_after=response.headers.get("Retry-After"))
+
+            attempt += 1
+
+            logging.warning(f"RETRYING: {method} {endpoint} failed ({reason}). Trying again in {delay:.1f}s (retry {attempt} of {policy.total}).")
+
+            await asyncio.sleep(delay)
+
+
+
+
+
+class _AsyncChunks:
+
+    """Lets httpx stream a JSONStream (or any other iterable of bytes that can be read more than once) from an async client.
+
+    Each chunk is encoded in a worker thread, so the event loop stays free. httpx starts reading again for every attempt at a request,
+    and each read starts the stream over, so retried uploads send the whole payload again.
+
+    Args:
+        chunks (Iterable[bytes]): The bytes to send, in chunks.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+
+
+    async def __aiter__(self):
+
+        iterator = iter(self.chunks)
+
+        while True:
+
+            chunk = await asyncio.to_thread(next, iterator, None)
+
+            if chunk is None:
+                return
+
+            yield chunk
+
+
+
+
+
+class AsyncGraphic(AsyncDatawrapper):
+
+    """The base class for async Datawrapper graphics.
+
+    Works like Graphic, except that methods queue up their requests instead of making them right away. Await the object to run everything
+    that's queued, in order. Awaiting returns the object, so it can be reused for more steps afterwards.
+
+        chart = await AsyncChart(chart_id).data(df).head("A headline").publish()
+
+    Args:
+        chart_id (str): The ID of the chart you're bringing into the module.
+        copy_id (str, optional): Instead of a chart_id, you can specify the id of a chart to copy.
+        folder_id (str, optional): If a new chart is being created because no chart_id or copy_id is passed, this is where you specify which folder to create it in.
+        chart_type (str, optional): The type of chart to create if no chart_id or copy_id is passed.
+        expected_type (str, optional): The graphic's type, if you already know it. See Graphic. Saves fetching the metadata just to check the type.
+        auth_token (str, optional): The auth_token from Datawrapper.
+
+    Attributes:
+        CHART_ID (str): The ID of the chart. This is None until the chart is created if you passed a copy_id or no ID at all.
+        metadata (dict): The chart's metadata. This is None until the object is awaited for the first time, and stays None if expected_type is passed
+            until a step updates it.
+    """
+
+    # The graphic types this class can load. None means any type is allowed.
+    graphic_types = None
+
+    def __init__(self,
+                 chart_id: str = None,
+                 copy_id: str = None,
+                 folder_id: str = None,
+                 chart_type: str = None,
+                 expected_type: str = None,
+                 auth_token: str = None):
+
+        super(AsyncGraphic, self).__init__(auth_token=auth_token)
+
+        if chart_id != None and copy_id != None:
+            raise Exception(f"Please specify either a chart_id or a copy_id, but not both.")
+
+        self.CHART_ID = chart_id
+        self.metadata = None
+        self._expected_type = expected_type
+
+        # See Graphic.publish() and Graphic.has_changes().
+        self._remote_metadata = None
+        self._changed = False
+        self._published = False
+
+        # See Graphic.batch().
+        self._pending_patch = None
+
+        # Each step is a (coroutine function, args, kwargs) tuple, run in order when the object is awaited.
+        self._steps = []
+
+        if chart_id == None:
+            self._then(self._create, copy_id=copy_id, folder_id=folder_id, chart_type=chart_type)
+
+        self._then(self._load)
+
+
+
+
+    def _then(self, step, *args, **kwargs):
+
+        # Queue up a step to be run when the object is awaited.
+        self._steps.append((step, args, kwargs))
+
+        return self
+
+
+
+    def __await__(self):
+        return self._run().__await__()
+
+
+
+    async def _run(self):
+
+        try:
+            while self._steps:
+                step, args, kwargs = self._steps.pop(0)
+                await step(*args, **kwargs)
+
+        # Don't leave half a chain behind if a step fails.
+        except Exception:
+            self._steps.clear()
+            raise
+
+        return self
+
+
+
+
+    def _new_chart_type(self, chart_type: str):
+
+        if chart_type in CHART_TYPES:
+            return chart_type
+
+        logging.warning(f"Invalid or no chart type specified. Creating new chart as a line chart instead.")
+
+        return "d3-lines"
+
+
+
+
+    async def _create(self, copy_id: str = None, folder_id: str = None, chart_type: str = None):
+
+        if copy_id != None:
+
+            logging.info(f"No chart specified. Copying chart with ID: {copy_id}...")
+
+            r = await self._arequest("POST", f"charts/{copy_id}/copy", headers={"Content-Type": "application/json"})
+
+        else:
+
+            logging.info(f"No chart specified. Creating new chart...")
+
+            payload = {"type": self._new_chart_type(chart_type)}
+
+            if folder_id:
+                payload["folderId"] = folder_id
+
+            r = await self._arequest("POST", "charts", json=payload)
+
+        if not r.is_success: raise DatawrapperAPIError(f"ERROR: Chart couldn't be created. Response: {r.reason_phrase}")
+
+        self._set_remote_metadata(r.json())
+        self.CHART_ID = self.metadata["publicId"]
+
+        logging.info(f"New chart created with id {self.CHART_ID}")
+
+
+
+
+    async def _load(self):
+
+        # If the caller told us what type to expect, check that locally instead of fetching the metadata.
+        if self.metadata is None and self._expected_type is not None:
+
+            if self.graphic_types is not None and self._expected_type not in self.graphic_types:
+                raise WrongGraphicTypeError(self._expected_type)
+
+            return
+
+        # New charts and copies already have their metadata from the response that created them.
+        if self.metadata is None:
+            await self._fetch_metadata()
+
+        if self.graphic_types is not None and self.metadata["type"] not in self.graphic_types:
+            raise WrongGraphicTypeError(self.metadata["type"])
+
+
+
+
+    async def _fetch_metadata(self):
+
+        r = await self._arequest("GET", f"charts/{self.CHART_ID}")
+
+        if r.is_success: self._set_remote_metadata(r.json())
+        else: raise DatawrapperAPIError(f"Couldn't fetch metadata. Response: {r.reason_phrase}")
+
+        # See Graphic.metadata. Changes queued in batch mode win over what's on Datawrapper.
+        if self._pending_patch:
+            _deep_merge(self.metadata, self._pending_patch)
+
+
+
+
+    def _set_remote_metadata(self, value: dict):
+
+        # See Graphic._set_remote_metadata().
+        self.metadata = value
+        self._remote_metadata = copy.deepcopy(value)
+
+
+
+
+    async def _patch_chart(self, payload: dict, success: str, failure: str):
+
+        # See Graphic._patch_chart().
+        if self._remote_metadata is None or _differs(payload, self._remote_metadata):
+            self._changed = True
+
+        if self._pending_patch is not None:
+            _deep_merge(self._pending_patch, payload)
+
+            if self.metadata is not None and payload is not self.metadata:
+                _deep_merge(self.metadata, payload)
+
+            logging.info(f"QUEUED: {success.replace('SUCCESS: ', '')}")
+            return
+
+        r = await self._arequest("PATCH", f"charts/{self.CHART_ID}", headers={"Content-Type": "application/json"}, content=json.dumps(payload).encode('utf-8'))
+
+        if r.is_success: logging.info(success)
+        else: raise DatawrapperAPIError(f"{failure} Response: {r.reason_phrase}")
+
+        self._set_remote_metadata(r.json())
+
+
+
+
+    async def _put_data(self, payload: bytes | JSONStream, headers: dict = None, force: bool = False):
+
+        # See Graphic._put_data(). A JSONStream is encoded in a worker thread as it's hashed and sent, so it never has to be held in memory
+        # as one big string, and encoding it doesn't hold up other graphics' requests.
+        streamed = not isinstance(payload, (bytes, bytearray))
+
+        cache = Datawrapper.upload_cache
+        digest = (await asyncio.to_thread(cache.hash, payload) if streamed else cache.hash(payload)) if cache is not None else None
+
+        if cache is not None and not force and cache.matches(self.CHART_ID, digest):
+            logging.info(f"SKIPPED: Data for chart {self.CHART_ID} is the same as the last upload.")
+            return False
+
+        content = payload
+
+        # Like requests does for the sync classes, send a stream with its length rather than in chunked encoding.
+        if streamed:
+            headers = {**(headers or {}), "Content-Length": str(await asyncio.to_thread(len, payload))}
+            content = _AsyncChunks(payload)
+
+        r = await self._arequest("PUT", f"charts/{self.CHART_ID}/data", headers=headers, content=content)
+
+        if r.is_success: logging.info(f"SUCCESS: Data added to chart.")
+        else: raise DatawrapperAPIError(f"ERROR: Chart data couldn't be added. Response: {r.reason_phrase}")
+
+        if cache is not None:
+            cache.set(self.CHART_ID, digest)
+
+        self._changed = True
+
+        return True
+
+
+
+
+    async def _flush(self):
+
+        if self._pending_patch:
+
+            pending = self._pending_patch
+            self._pending_patch = None
+
+            try: await self._patch_chart(pending, success="SUCCESS: Batched metadata changes sent.", failure="Couldn't send batched metadata changes.")
+
+            # If the PATCH fails, keep the changes queued so they're sent when it's tried again (ie. when publish() is retried).
+            except Exception:
+                self._pending_patch = _deep_merge(pending, self._pending_patch or {})
+                raise
+
+            self._pending_patch = {}
+
+
+
+
+    async def _start_batch(self):
+
+        if self._pending_patch is None:
+            self._pending_patch = {}
+
+
+
+    async def _commit(self):
+
+        if self._pending_patch is not None:
+            await self._flush()
+            self._pending_patch = None
+
+
+
+
+    def batch(self):
+
+        """Queues the start of batch mode. See Graphic.batch()."""
+
+        return self._then(self._start_batch)
+
+
+
+    def commit(self):
+
+        """Queues sending all changes collected in batch mode as a single PATCH. See Graphic.commit()."""
+
+        return self._then(self._commit)
+
+
+
+    def set_metadata(self):
+
+        """Queues sending the metadata stored in the object to the live chart. See Graphic.set_metadata()."""
+
+        async def step():
+
+            # Like Graphic.metadata, fetch the metadata first if it hasn't been yet (ie. when expected_type skipped loading it).
+            if self.metadata is None:
+                await self._fetch_metadata()
+
+            await self._patch_chart(self.metadata, success="SUCCESS: Metadata updated.", failure="Couldn't update metadata.")
+
+        return self._then(step)
+
+
+
+    def head(self, string: str):
+
+        """Queues an update of the graphic's headline. See Graphic.head()."""
+
+        return self._then(self._patch_chart, {"title": string}, success="SUCCESS: Chart head added.", failure="ERROR: Chart head was not added.")
+
+
+
+    def deck(self, deck: str):
+
+        """Queues an update of the graphic's deck. See Graphic.deck()."""
+
+        payload = {"metadata": {"describe": {"intro": deck}}}
+
+        return self._then(self._patch_chart, payload, success="SUCCESS: Chart deck added.", failure="ERROR: Chart deck was not added.")
+
+
+
+    def footer(self, *args, **kwargs):
+
+        """Queues an update of the graphic's footer. Takes the same arguments as Graphic.footer()."""
+
+        # Build the payload when the step runs, so the timestamp is as fresh as possible.
+        async def step():
+            await self._patch_chart(Graphic._build_footer(*args, **kwargs), success="SUCCESS: Chart footer (byline, notes, and source) built and added.", failure="ERROR: Couldn't build chart footer.")
+
+        return self._then(step)
+
+
+
+    def publish(self, only_if_changed: bool = False):
+
+        """Queues publishing the graphic. Anything waiting in batch mode is sent first. See Graphic.publish() for only_if_changed."""
+
+        async def step():
+
+            await self._flush()
+
+            if only_if_changed and not await self._has_changes():
+                logging.info(f"SKIPPED: Chart {self.CHART_ID} hasn't changed since it was last published.")
+                return
+
+            r = await self._arequest("POST", f"charts/{self.CHART_ID}/publish", idempotent=True)
+
+            if r.is_success: logging.info(f"SUCCESS: Chart published!")
+            else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be published. Response: {r.reason_phrase}")
+
+            self._changed = False
+            self._published = True
+
+        return self._then(step)
+
+
+
+    async def _has_changes(self):
+
+        # See Graphic.has_changes().
+        if self._changed:
+            return True
+
+        if self._published:
+            return False
+
+        if self.metadata is None:
+            await self._fetch_metadata()
+
+        return _modified_since_publish(self.metadata)
+
+
+
+    def unpublish(self):
+
+        """Queues unpublishing the graphic."""
+
+        async def step():
+
+            r = await self._arequest("POST", f"charts/{self.CHART_ID}/unpublish", idempotent=True)
+
+            if r.is_success: logging.info(f"SUCCESS: Chart unpublished.")
+            else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be unpublished. Response: {r.reason_phrase}")
+
+        return self._then(step)
+
+
+
+    def move(self, folder_id: str):
+
+        """Queues moving the graphic to the specified folder ID."""
+
+        async def step():
+
+            payload = {
+                "ids": [self.CHART_ID],
+                "patch": {"folderId": folder_id}
+                }
+
+            r = await self._arequest("PATCH", "charts", json=payload)
+
+            if r.is_success: logging.info(f"SUCCESS: Chart moved to folder ID {folder_id}!")
+            else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be moved. Response: {r.reason_phrase}")
+
+        return self._then(step)
+
+
+
+    def delete(self):
+
+        """Queues deleting the graphic."""
+
+        async def step():
+
+            logging.warning(f"Deleting chart with ID {self.CHART_ID}!")
+
+            r = await self._arequest("DELETE", f"charts/{self.CHART_ID}")
+
+            if r.is_success: logging.info(f"SUCCESS: Chart deleted.")
+            else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be deleted. Response: {r.reason_phrase}")
+
+        return self._then(step)
+
+
+
+    def export(self, format: str = "png", filename: str = "export"):
+
+        """Queues exporting the graphic. See Graphic.export()."""
+
+        VALID_FORMAT_LIST = ["png", "svg"]
+
+        if format not in VALID_FORMAT_LIST:
+            raise InvalidExportTypeError(VALID_FORMAT_LIST)
+
+        async def step():
+
+            r = await self._arequest("GET", f"charts/{self.CHART_ID}/export/{format}?unit=px&mode=rgb&plain=false&scale=1&zoom=2&download=true&fullVector=false&ligatures=true&transparent=false&logo=auto&dark=false", headers={"Accept": "image/png"})
+
+            if not r.is_success: raise DatawrapperAPIError(f"ERROR: Chart couldn't be exported as {format}. Response: {r.reason_phrase}")
+
+            with open(os.path.join(self.path, filename + "." + format), "wb") as f:
+                f.write(r.content)
+
+            logging.info(f"SUCCESS: Chart with ID {self.CHART_ID} exported and saved!")
+
+        return self._then(step)
+
+
+
+
+
+class AsyncChart(AsyncGraphic):
+
+    """The async version of Chart. See AsyncGraphic for how chaining and awaiting work."""
+
+    graphic_types = CHART_TYPES
+
+
+
+    def data(self, data: pd.DataFrame, force: bool = False):
+
+        """Queues uploading a dataframe to the chart. See Chart.data()."""
+
+        async def step():
+
+            payload = data.to_csv(sep=";")
+
+            await self._put_data(payload.encode('utf-8'), headers={"Content-Type": "text/csv"}, force=force)
+
+            self.dataset = data
+
+            if self.metadata is None:
+                await self._fetch_metadata()
+
+            await self._patch_chart(self.metadata, success="SUCCESS: Metadata updated.", failure="Couldn't update metadata.")
+
+        return self._then(step)
+
+
+
+
+
+class AsyncMap(AsyncGraphic):
+
+    """The async version of Map. See AsyncGraphic for how chaining and awaiting work."""
+
+    graphic_types = ["locator-map"]
+
+
+
+    def _new_chart_type(self, chart_type: str):
+        return "locator-map"
+
+
+
+    # The parts of Map that don't make requests are shared with it.
+    view_bounds = Map.view_bounds
+    _marker_factory = Map._marker_factory
+
+
+
+    def data(self,
+             input_data: pd.DataFrame | geopandas.GeoDataFrame,
+             append: str = None,
+             force: bool = False,
+             precision: int = None,
+             max_payload_bytes: int = None,
+             id_col: str = None,
+             diff: bool | str = False,
+             chunk_size: int = 100_000,
+             cluster: dict = None,
+             cull_to_view: bool = False,
+             margin: float = 0.1):
+
+        """Queues uploading a dataframe to the map as markers. Takes the same arguments as Map.data(), which explains the columns and options that are used."""
+
+        chunked = not isinstance(input_data, pd.DataFrame)
+
+        if chunked and (max_payload_bytes is not None or diff or cluster):
+            raise ValueError("max_payload_bytes, diff and cluster need all the data at once, so they can't be used when it's read in chunks.")
+
+        def build_chunked(bounds):
+
+            chunks = _read_chunks(input_data, chunk_size) if isinstance(input_data, (str, os.PathLike)) else input_data
+
+            if bounds is not None:
+                chunks = (Map.cull(chunk, bounds) for chunk in chunks)
+
+            return Map._chunked_payload(chunks, append, precision=precision, id_col=id_col)
+
+        def build(bounds):
+
+            data = input_data
+
+            if bounds is not None:
+                before = len(data)
+                data = Map.cull(data, bounds)
+                logging.info(f"Culled {before - len(data):,} of {before:,} markers outside the map's view.")
+
+            if cluster:
+                before = len(data)
+                data = Map.cluster(data, **cluster)
+                logging.info(f"Clustering took the map from {before:,} to {len(data):,} markers.")
+
+            if max_payload_bytes is not None:
+                data = Map.fit_to_size(data, max_payload_bytes, append=append, precision=precision)
+
+            return data, Map._marker_payload(data, append, precision=precision, id_col=id_col)
+
+        async def step():
+
+            nonlocal force
+
+            bounds = None
+
+            if cull_to_view:
+
+                if self.metadata is None:
+                    await self._fetch_metadata()
+
+                bounds = self.view_bounds(margin)
+
+            # Building markers for a big dataframe takes a while, so do it in a thread to keep other graphics' requests moving.
+            if chunked:
+
+                payload = await asyncio.to_thread(build_chunked, bounds)
+
+                try:
+                    if await self._put_data(payload, force=force):
+                        logging.info(f"Icons took up {payload.icon_bytes:,} of the {len(payload):,} bytes uploaded.")
+
+                finally:
+                    payload.close()
+
+                return
+
+            data, payload = await asyncio.to_thread(build, bounds)
+
+            if diff:
+
+                # See Map.data(). The map's current markers are fetched here, so Map.diff() never makes a request of its own.
+                snapshot = diff if isinstance(diff, str) else None
+
+                if snapshot is None:
+                    r = await self._arequest("GET", f"charts/{self.CHART_ID}/data", headers={"Accept": "text/csv"})
+                    against = r.json()["markers"]
+                else:
+                    against = snapshot if os.path.exists(snapshot) else []
+
+                changes = await asyncio.to_thread(Map.diff, self, data, against, append=append, precision=precision, id_col=id_col)
+
+                if not changes and not force:
+                    logging.info(f"SKIPPED: Markers for chart {self.CHART_ID} are the same as the {'snapshot' if snapshot else 'markers on the map'}.")
+                    return
+
+                logging.info(f"{len(changes.added):,} markers added, {len(changes.removed):,} removed and {len(changes.changed):,} changed ({changes.delta_bytes:,} bytes of new or changed markers).")
+
+                force = True
+
+            if await self._put_data(payload, force=force):
+                logging.info(f"Icons took up {payload.icon_bytes:,} of the {len(payload):,} bytes uploaded.")
+
+                if diff and snapshot is not None:
+                    await asyncio.to_thread(write_atomic, snapshot, payload)
+
+        return self._then(step)
+
+
+
+
+
+class AsyncFolder(AsyncDatawrapper):
+
+    """The async version of Folder. Await the object to fetch the IDs of all charts in it.
+
+        folder = await AsyncFolder(folder_id)
+        folder.chart_list
+
+    After the first page, the rest of the pages are fetched at the same time.
+
+    Args:
+        folder_id (str): The ID of the folder.
+        page_size (int, optional): How many charts to fetch per request. Default is 100.
+        auth_token (str, optional): The auth_token from Datawrapper.
+
+    Attributes:
+        folder_id (str): The id of the folder fetched.
+        chart_list (list): A list of the IDs of all charts in the folder. This is None until the object is awaited.
+    """
+
+    def __init__(self,
+                 folder_id: str,
+                 page_size: int = 100,
+                 auth_token: str = None):
+
+        super(AsyncFolder, self).__init__(auth_token=auth_token)
+
+        self.folder_id = folder_id
+        self.page_size = page_size
+        self.chart_list = None
+
+
+
+    def __await__(self):
+        return self._load().__await__()
+
+
+
+    async def _get_chart_page(self, offset: int):
+
+        query = {
+            "folderId": self.folder_id,
+            "order": "DESC",
+            "orderBy": "createdAt",
+            "limit": self.page_size,
+            "expand": "false",
+            "offset": offset,
+        }
+
+        r = await self._arequest("GET", "charts", params=query)
+
+        if r.is_success: return r.json()
+        else: raise DatawrapperAPIError(f"Couldn't fetch charts. Response: {r.reason_phrase}")
+
+
+
+    async def _load(self):
+
+        first_page = await self._get_chart_page(0)
+        pages = [first_page]
+
+        if len(first_page["list"]) == self.page_size and first_page.get("total") is not None:
+            pages += await asyncio.gather(*[self._get_chart_page(offset) for offset in range(self.page_size, first_page["total"], self.page_size)])
+
+        # Without a total, fall back to fetching one page after another.
+        elif len(first_page["list"]) == self.page_size:
+
+            while len(pages[-1]["list"]) == self.page_size:
+                pages.append(await self._get_chart_page(len(pages) * self.page_size))
+
+        self.chart_list = [obj["publicId"] for page in pages for obj in page["list"]]
+
+        return self
+
+
+
+
+
+async def gather_limited(*aws, limit: int = 10, return_exceptions: bool = False):
+
+    """Runs awaitables (ie. chains on async graphics) concurrently, with at most limit of them running at once.
+
+    Works like asyncio.gather(), and returns the results in the same order the awaitables were passed in.
+
+        maps = await gather_limited(*[AsyncMap(chart_id).data(df).publish() for chart_id in chart_ids], limit=20)
+
+    Args:
+        *aws: The awaitables to run.
+        limit (int, optional): The maximum number of awaitables running at the same time. Default is 10.
+        return_exceptions (bool, optional): If True, exceptions are returned in the results instead of raised. Default is False.
+
+    Returns:
+        list: The results of the awaitables.
+    """
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*[run(aw) for aw in aws], return_exceptions=return_exceptions)
@@ -0,0 +1,492 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Iterable
+from datawrappergraphics import encoding
+
+
+__all__ = ["UploadCache", "ShapeCache"]
+
+
+# By default, caches live in the user's cache folder so they're shared between scripts and survive between runs.
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "datawrappergraphics")
+
+
+
+
+def write_atomic(path: str, chunks: Iterable[bytes]):
+
+    """Writes bytes to a file by writing to a temporary file and swapping it in, so other processes never see a half-written file.
+
+    Args:
+        path (str): Where to write the file. Its folder is created if it doesn't exist.
+        chunks (Iterable[bytes]): The bytes to write, in one or more pieces (ie. a JSONStream).
+    """
+
+    folder = os.path.dirname(os.path.abspath(path))
+
+    os.makedirs(folder, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+        os.replace(temp_path, path)
+
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+
+
+def write_json_atomic(path: str, obj):
+
+    """Writes an object to a JSON file the same way as write_atomic().
+
+    Args:
+        path (str): Where to write the file. Its folder is created if it doesn't exist.
+        obj: The object to write. Has to be JSON serializable.
+    """
+
+    write_atomic(path, [json.dumps(obj).encode("utf-8")])
+
+
+
+
+class UploadCache:
+
+    """A small JSON store that remembers a hash of the last data uploaded to each chart.
+
+    Chart.data() and Map.data() use this to skip uploads that are byte-for-byte identical to the last one. Once there are more than
+    max_entries charts, the ones that were uploaded to least recently are evicted first. Entries older than max_age are ignored.
+
+    The file is re-read before every write and replaced atomically, so it can be shared by several scripts running on the same machine.
+
+    Args:
+        path (str, optional): Where to store the cache. Defaults to uploads.json in the user's cache folder.
+        max_entries (int, optional): The maximum number of charts to remember. Default is 1000.
+        max_age (float, optional): How long an entry is trusted for, in seconds. Default is None, which means forever.
+    """
+
+    def __init__(self,
+                 path: str = None,
+                 max_entries: int = 1000,
+                 max_age: float = None):
+
+        self.path = path if path else os.path.join(CACHE_DIR, "uploads.json")
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+
+
+
+
+    @staticmethod
+    def hash(payload: bytes | str | Iterable[bytes]):
+
+        """Returns the hex digest used to compare payloads.
+
+        Args:
+            payload (bytes | str | Iterable[bytes]): The payload to hash. Payloads that are streamed in chunks (ie. a JSONStream) are hashed chunk by chunk.
+
+        Returns:
+            str: The SHA-256 hex digest of the payload.
+        """
+
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+
+        if isinstance(payload, (bytes, bytearray)):
+            return hashlib.sha256(payload).hexdigest()
+
+        digest = hashlib.sha256()
+
+        for chunk in payload:
+            digest.update(chunk)
+
+        return digest.hexdigest()
+
+
+
+
+    def _read(self):
+
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+
+        # A missing, unreadable or broken cache file is treated as an empty cache.
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+
+
+
+    def _write(self, entries: dict):
+
+        # Not being able to write the cache (ie. a read-only home folder) shouldn't stop the upload, which has already been sent.
+        try:
+            write_json_atomic(self.path, entries)
+        except OSError as e:
+            logging.warning(f"Couldn't write the upload cache to {self.path}, so the next identical upload won't be skipped. {e}")
+
+
+
+
+    def get(self, chart_id: str):
+
+        """Returns the hash of the last payload uploaded to a chart, or None if there isn't one (or it's too old).
+
+        Args:
+            chart_id (str): The chart's ID.
+
+        Returns:
+            str: The hex digest of the last payload.
+        """
+
+        with self._lock:
+            entry = self._read().get(chart_id)
+
+        if entry is None:
+            return None
+
+        if self.max_age is not None and time.time() - entry["time"] > self.max_age:
+            return None
+
+        return entry["hash"]
+
+
+
+
+    def matches(self, chart_id: str, digest: str):
+
+        """Checks if a hash is the same as the hash of the last payload uploaded to a chart.
+
+        Args:
+            chart_id (str): The chart's ID.
+            digest (str): The hash of the payload about to be uploaded. See hash().
+
+        Returns:
+            bool: True if the payload is the same as the last one.
+        """
+
+        return self.get(chart_id) == digest
+
+
+
+
+    def set(self, chart_id: str, digest: str):
+
+        """Records the hash of a payload that was just uploaded to a chart.
+
+        Args:
+            chart_id (str): The chart's ID.
+            digest (str): The hash of the payload. See hash().
+        """
+
+        with self._lock:
+
+            entries = self._read()
+
+            # Re-inserting the key moves it to the end, so the dict stays ordered from oldest to newest upload.
+            entries.pop(chart_id, None)
+            entries[chart_id] = {"hash": digest, "time": time.time()}
+
+            while len(entries) > self.max_entries:
+                entries.pop(next(iter(entries)))
+
+            self._write(entries)
+
+
+
+
+    def clear(self, chart_id: str = None):
+
+        """Forgets the last upload to one chart, or to every chart if no chart_id is passed.
+
+        Args:
+            chart_id (str, optional): The chart to forget.
+        """
+
+        with self._lock:
+
+            if chart_id is None:
+                entries = {}
+            else:
+                entries = self._read()
+                entries.pop(chart_id, None)
+
+            self._write(entries)
+
+
+
+
+class ShapeFile:
+
+    """The shapes from a JSON file of extra map markers (see Map.data()'s append), encoded ahead of time.
+
+    Each shape is kept as the encoded JSON before and after its ID, so giving it an ID only takes joining three pieces of bytes. The parsed
+    shapes are only decoded if something asks for them.
+
+    Args:
+        key (tuple): What the file looked like when it was read (its modification time and size, and which JSON encoder was used).
+        parts (list): The encoded JSON before and after each shape's ID, as (before, after) tuples.
+        shapes (list, optional): The parsed shapes, if they're already around.
+    """
+
+    # Stands in for each shape's ID while it's encoded, so the encoded shape can be split where the ID goes.
+    ID_PLACEHOLDER = "\x00id\x00"
+
+    def __init__(self, key: tuple, parts: list, shapes: list = None):
+
+        self.key = key
+        self.parts = parts
+
+        self._shapes = shapes
+
+
+
+
+    @staticmethod
+    def key_for(path: str):
+
+        """Returns the key that a file's cached shapes are stored under. It changes whenever the file or the JSON encoder does.
+
+        Args:
+            path (str): The path to the shape file.
+
+        Returns:
+            tuple: The file's modification time (in nanoseconds) and size, and the name of the JSON encoder.
+        """
+
+        stat = os.stat(path)
+
+        return (stat.st_mtime_ns, stat.st_size, "json" if encoding.orjson is None else "orjson")
+
+
+
+
+    @classmethod
+    def parse(cls, path: str):
+
+        """Reads and encodes a shape file.
+
+        Args:
+            path (str): The path to the shape file. It can hold a list of shapes, or a single shape.
+
+        Returns:
+            ShapeFile: The file's shapes.
+        """
+
+        key = cls.key_for(path)
+
+        with open(path, "rb") as f:
+            shapes = encoding.loads(f.read())
+
+        # If there is only one object and it's not in a list, make it a list.
+        if type(shapes) != list:
+            shapes = [shapes]
+
+        placeholder = encoding.dumps(cls.ID_PLACEHOLDER)
+        parts = []
+
+        for shape in shapes:
+
+            # Shapes that already have an ID keep it in the same place. Otherwise it goes at the end.
+            shape = dict(shape)
+            shape["id"] = cls.ID_PLACEHOLDER
+
+            before, after = encoding.dumps(shape).split(placeholder, 1)
+            parts.append((before, after))
+
+        return cls(key, parts, shapes)
+
+
+
+
+    @property
+    def shapes(self):
+
+        # The parsed shapes. Shapes loaded from the disk cache are only decoded the first time they're needed, and their IDs are left blank
+        # since every shape is given a new one.
+        if self._shapes is None:
+            self._shapes = [encoding.loads(before + b'""' + after) for before, after in self.parts]
+
+        return self._shapes
+
+
+
+
+    def __len__(self):
+        return len(self.parts)
+
+
+
+
+    def encode(self, i: int, marker_id: str):
+
+        """Returns a shape, encoded with an ID.
+
+        Args:
+            i (int): Which shape to encode.
+            marker_id (str): The ID to give the shape.
+
+        Returns:
+            RawJSON: The encoded shape.
+        """
+
+        before, after = self.parts[i]
+
+        return encoding.RawJSON(before + encoding.dumps(marker_id) + after)
+
+
+
+
+class ShapeCache:
+
+    """Keeps the shape files passed to Map.data()'s append parsed and encoded, so each file is only read once.
+
+    Shapes are kept in memory for as long as the process runs, and on disk in a compact binary file so other processes (ie. the next run
+    of a script) don't have to parse them again. A file is read again whenever its modification time or size changes.
+
+    Args:
+        directory (str, optional): Where to store the encoded shapes. Defaults to a shapes folder in the user's cache folder. Pass False to
+            only keep them in memory.
+        max_entries (int, optional): The maximum number of files to keep in memory. The least recently used are evicted first. Default is 32.
+    """
+
+    # Every disk cache file starts with this, so files from other versions (or anything else) are ignored.
+    MAGIC = b"DWSHAPES1\n"
+
+    def __init__(self,
+                 directory: str = None,
+                 max_entries: int = 32):
+
+        self.directory = os.path.join(CACHE_DIR, "shapes") if directory is None else directory
+        self.max_entries = max_entries
+
+        self._entries = {}
+        self._lock = threading.Lock()
+
+
+
+
+    def _disk_path(self, path: str):
+        return os.path.join(self.directory, hashlib.sha256(path.encode("utf-8")).hexdigest()[:32] + ".bin")
+
+
+
+
+    def _read(self, path: str, key: tuple):
+
+        # Returns the shapes from the disk cache, or None if they're not there or out of date.
+        try:
+            with open(self._disk_path(path), "rb") as f:
+                data = f.read()
+
+        except OSError:
+            return None
+
+        if not data.startswith(self.MAGIC):
+            return None
+
+        try:
+            header_end = data.index(b"\n", len(self.MAGIC))
+            header = json.loads(data[len(self.MAGIC):header_end])
+
+            if header["path"] != path or tuple(header["key"]) != key:
+                return None
+
+            parts = []
+            position = header_end + 1
+
+            for _ in range(header["count"]):
+
+                before_length, after_length = struct.unpack_from("<II", data, position)
+                position += 8
+
+                parts.append((data[position:position + before_length], data[position + before_length:position + before_length + after_length]))
+                position += before_length + after_length
+
+            # Slicing past the end doesn't fail, so a cut-off file has to be caught here.
+            if position != len(data):
+                return None
+
+        # A broken cache file is treated as a missing one.
+        except (ValueError, KeyError, struct.error):
+            return None
+
+        return ShapeFile(key, parts)
+
+
+
+
+    def _write(self, path: str, shapes: ShapeFile):
+
+        def chunks():
+
+            yield self.MAGIC
+            yield json.dumps({"path": path, "key": list(shapes.key), "count": len(shapes)}).encode("utf-8") + b"\n"
+
+            for before, after in shapes.parts:
+                yield struct.pack("<II", len(before), len(after))
+                yield before
+                yield after
+
+        # Not being able to write the cache (ie. a read-only home folder) shouldn't stop the upload.
+        try:
+            write_atomic(self._disk_path(path), chunks())
+        except OSError:
+            pass
+
+
+
+
+    def get(self, path: str):
+
+        """Returns a shape file's shapes, from memory or the disk cache if the file hasn't changed, or by reading it if it has.
+
+        Args:
+            path (str): The path to the shape file.
+
+        Returns:
+            ShapeFile: The file's shapes.
+        """
+
+        path = os.path.abspath(path)
+        key = ShapeFile.key_for(path)
+
+        with self._lock:
+            shapes = self._entries.pop(path, None)
+
+        if shapes is None or shapes.key != key:
+
+            shapes = self._read(path, key) if self.directory else None
+
+            if shapes is None:
+
+                shapes = ShapeFile.parse(path)
+
+                if self.directory:
+                    self._write(path, shapes)
+
+        with self._lock:
+
+            # Re-inserting the key moves it to the end, so the dict stays ordered from least to most recently used.
+            self._entries.pop(path, None)
+            self._entries[path] = shapes
+
+            while len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+
+        return shapes
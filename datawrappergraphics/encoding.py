@@ -0,0 +1,254 @@
+import json
+import tempfile
+
+# orjson is much faster than the built-in json module, but it's optional.
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+__all__ = ["JSONStream", "RawJSON", "SpooledStream"]
+
+
+# The built-in encoder puts spaces after separators, so the fallback keeps them to produce the same bytes as json.dumps().
+ITEM_SEPARATOR = b"," if orjson is not None else b", "
+KEY_SEPARATOR = b":" if orjson is not None else b": "
+
+# How a fragment's placeholder starts and ends once it's encoded. Both encoders escape the null characters the same way.
+FRAGMENT_START = b'"\\u0000fragment:'
+FRAGMENT_END = b'\\u0000"'
+
+
+
+
+class RawJSON(bytes):
+
+    """Bytes that are already encoded JSON. dumps() returns them as they are, so a JSONStream can include items that were encoded ahead of time."""
+
+
+
+
+def dumps(obj, sort_keys: bool = False):
+
+    """Encodes an object as JSON, using orjson if it's installed.
+
+    Args:
+        obj: The object to encode. RawJSON is returned as it is.
+        sort_keys (bool, optional): Sort the keys of every dict, so equal objects are encoded the same way whatever order their keys are in. Default is False.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+
+    if isinstance(obj, RawJSON):
+        return obj
+
+    if orjson is not None:
+
+        # orjson can't encode a few things the built-in encoder can (ie. integers bigger than 64 bits), so fall back for those.
+        try: return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+        except TypeError: pass
+
+    return json.dumps(obj, sort_keys=sort_keys).encode("utf-8")
+
+
+
+
+def loads(data: bytes | str):
+
+    """Decodes JSON, using orjson if it's installed.
+
+    Args:
+        data (bytes | str): The JSON to decode.
+
+    Returns:
+        The decoded object.
+    """
+
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+
+
+class JSONStream:
+
+    """A JSON object holding a single array, like {"markers": [...]}, that's encoded a few items at a time as it's read.
+
+    Iterating over a JSONStream yields the encoded bytes in chunks of about chunk_size, and only one item is encoded at a time. Every new
+    iteration calls items() again and starts over, so the same stream can be hashed, uploaded, and uploaded again if the request is retried.
+    requests sends it with a Content-Length, which is worked out the first time the stream is read.
+
+    Values that repeat in many items (ie. a map marker's icon) can be passed as fragments. They're encoded once, and items refer to them
+    with a placeholder from JSONStream.fragment(name) that's swapped for the encoded fragment after each item is encoded.
+
+    Args:
+        key (str): The key that holds the array.
+        items (function): A function that returns a new iterator over the array's items each time it's called.
+        fragments (dict, optional): Values that items can refer to with placeholders, by name.
+        chunk_size (int, optional): Roughly how many bytes to yield at a time. Default is 64KB.
+    """
+
+    def __init__(self,
+                 key: str,
+                 items,
+                 fragments: dict = None,
+                 chunk_size: int = 64 * 1024):
+
+        self.key = key
+        self.items = items
+        self.chunk_size = chunk_size
+
+        self._fragments = {name.encode("utf-8"): dumps(value) for name, value in (fragments or {}).items()}
+
+        self._length = None
+
+
+
+
+    @staticmethod
+    def fragment(name: str):
+
+        """Returns the placeholder that an item uses to refer to one of the stream's fragments.
+
+        Args:
+            name (str): The fragment's name.
+
+        Returns:
+            str: The placeholder.
+        """
+
+        return f"\x00fragment:{name}\x00"
+
+
+
+
+    def __iter__(self):
+
+        buffer = bytearray(b"{" + dumps(self.key) + KEY_SEPARATOR + b"[")
+        length = 0
+
+        for i, item in enumerate(self.items()):
+
+            if i:
+                buffer += ITEM_SEPARATOR
+
+            encoded = dumps(item)
+
+            # Copy the item into the buffer piece by piece, with each placeholder swapped for its encoded fragment.
+            start = encoded.find(FRAGMENT_START) if self._fragments else -1
+            position = 0
+
+            while start != -1:
+
+                end = encoded.index(FRAGMENT_END, start + len(FRAGMENT_START))
+                fragment = self._fragments[encoded[start + len(FRAGMENT_START):end]]
+
+                buffer += encoded[position:start]
+                buffer += fragment
+
+                position = end + len(FRAGMENT_END)
+                start = encoded.find(FRAGMENT_START, position)
+
+            buffer += encoded[position:] if position else encoded
+
+            if len(buffer) >= self.chunk_size:
+                length += len(buffer)
+                yield bytes(buffer)
+                buffer.clear()
+
+        buffer += b"]}"
+        length += len(buffer)
+
+        yield bytes(buffer)
+
+        # Only a complete read tells us the length.
+        self._length = length
+
+
+
+
+    def __len__(self):
+
+        if self._length is None:
+            for _ in self:
+                pass
+
+        return self._length
+
+
+
+
+    def __bytes__(self):
+        return b"".join(self)
+
+
+
+
+class SpooledStream:
+
+    """Bytes from a stream that can only be read once (ie. a JSONStream over chunks of a file), saved so they can be read as many times as needed.
+
+    The bytes are kept in memory up to max_size, and in a temporary file on disk after that. Like a JSONStream, iterating over a
+    SpooledStream yields the bytes in chunks from the start every time, so it can be hashed, uploaded, and uploaded again if the request
+    is retried, and requests sends it with a Content-Length.
+
+    Args:
+        chunks (iterable): The bytes to save, in chunks. It's read right away.
+        max_size (int, optional): How many bytes to keep in memory before moving them to disk. Default is 16MB.
+        chunk_size (int, optional): How many bytes to yield at a time. Default is 64KB.
+    """
+
+    def __init__(self,
+                 chunks,
+                 max_size: int = 16 * 1024 * 1024,
+                 chunk_size: int = 64 * 1024):
+
+        self.chunk_size = chunk_size
+
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_size)
+
+        for chunk in chunks:
+            self._file.write(chunk)
+
+        self._length = self._file.tell()
+
+
+
+
+    def __iter__(self):
+
+        self._file.seek(0)
+
+        while True:
+
+            chunk = self._file.read(self.chunk_size)
+
+            if not chunk:
+                break
+
+            yield chunk
+
+
+
+
+    def __len__(self):
+        return self._length
+
+
+
+
+    def __bytes__(self):
+        return b"".join(self)
+
+
+
+
+    def close(self):
+
+        """Deletes the saved bytes."""
+
+        self._file.close()
@@ -4,19 +4,59 @@
 # a handful of values, or your map will error out and not display anything.
 class InvalidMarkerDataError(Exception):
     
-    def __init__(self, field: str, input_value: str | int | float | bool, allowed_values_list: list):
+    def __init__(self, field: str, input_value: str | int | float | bool | list, allowed_values_list: list, rows: list = None):
+        
+        self.field = field
+        self.rows = rows
+        
+        if isinstance(input_value, list):
+            input_value = ", ".join(str(value) for value in input_value)
         
         message = f"It looks like the {field} you provided ({input_value}) is not valid.\nPlease ensure the value is one of: {', '.join(allowed_values_list)}."
         
+        if rows is not None:
+            message += f"\nRows with invalid values: {', '.join(str(row) for row in rows)}."
+        
         super().__init__(message)
         
         
         
 class InvalidHexcodeError(Exception):
     
-    def __init__(self):
+    def __init__(self, field: str = None, rows: list = None):
+        
+        self.field = field
+        self.rows = rows
+        
+        if rows is None:
+            super().__init__(f"The color you provided for one of your rows is not a valid 6-digit hexcode.")
+        else:
+            super().__init__(f"The {field} you provided for these rows is not a valid 6-digit hexcode: {', '.join(str(row) for row in rows)}.")
+
+
+
+# Raised when more than one column of map data has invalid values, so every problem is reported at once. It's a subclass of both errors
+# above, so code that catches either one still catches it.
+class InvalidMapDataError(InvalidMarkerDataError, InvalidHexcodeError):
+    
+    def __init__(self, errors: list):
+        
+        self.errors = errors
+        self.field = [error.field for error in errors]
+        self.rows = {error.field: error.rows for error in errors}
+        
+        Exception.__init__(self, f"{len(errors)} columns have invalid values.\n" + "\n".join(str(error) for error in errors))
+
+
+
+class DuplicateMarkerIDError(Exception):
+    
+    def __init__(self, field: str, rows: list):
+        
+        self.field = field
+        self.rows = rows
         
-        super().__init__(f"The color you provided for one of your rows is not a valid 6-digit hexcode.")
+        super().__init__(f"Marker IDs have to be unique, but these rows share a {field} with another row: {', '.join(str(row) for row in rows)}.")
 
 
 
@@ -77,4 +117,11 @@ class TimezoneError(Exception):
         
     def __init__(self, msg: str = None):
         
-        super().__init__(msg)
\ No newline at end of file
+        super().__init__(msg)
+        
+        
+class PayloadTooLargeError(Exception):
+        
+    def __init__(self, msg: str = None):
+        
+        super().__init__(msg)
@@ -9,14 +9,173 @@ import datetime
 import logging
 import numpy as np
 import math
+import shapely
+import threading
+import time
+import copy
+import collections
+import itertools
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from geojson import Feature
 from datawrappergraphics.icons import dw_icons
 from datawrappergraphics.errors import *
+from datawrappergraphics.cache import UploadCache, ShapeCache, ShapeFile, write_atomic, write_json_atomic
+from datawrappergraphics.retry import RetryPolicy
+from datawrappergraphics.ratelimit import RateLimiter
+from datawrappergraphics import encoding
+from datawrappergraphics.encoding import JSONStream, SpooledStream
 from IPython.display import HTML
-from io import StringIO
-from shapely.geometry import Point
+from io import BytesIO
 from pytz import timezone
 
+# pyarrow is optional. If it's installed, it's used to parse chart data, which is much faster on big datasets.
+try:
+    import pyarrow.csv
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+# The strings pd.read_csv() reads as missing values by default (see its na_values), so pyarrow can be told to do the same.
+NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+
+
+# Marker colours have to be 6-digit hex codes, like #C42127.
+HEXCODE_PATTERN = re.compile("#[0-9A-Fa-f]{6}")
+
+
+# The chart types (other than locator maps) that can be loaded with the Chart class.
+CHART_TYPES = [
+    "d3-bars",
+    "d3-bars-split",
+    "d3-bars-stacked",
+    "d3-bars-bullet",
+    "d3-dot-plot",
+    "d3-range-plot",
+    "d3-arrow-plot",
+    "column-chart",
+    "grouped-column-chart",
+    "stacked-column-chart",
+    "d3-area",
+    "d3-lines",
+    "d3-pies",
+    "d3-donuts",
+    "d3-multiple-pies",
+    "d3-multiple-donuts",
+    "d3-scatter-plot",
+    "election-donut-chart",
+    "tables",
+    "d3-maps-choropleth",
+    "d3-maps-symbols",
+]
+
+
+
+
+# Recursively merges the update dict into the target dict, in place. Nested dicts are merged key by key, everything else is replaced.
+def _deep_merge(target: dict, update: dict):
+    
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    
+    return target
+
+
+
+
+# Checks if applying the update dict would change anything in the current dict. Nested dicts are compared key by key.
+def _differs(update: dict, current: dict):
+    
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(current.get(key), dict):
+            if _differs(value, current[key]):
+                return True
+        elif key not in current or current[key] != value:
+            return True
+    
+    return False
+
+
+
+
+def _read_chunks(path: str, chunk_size: int):
+    
+    # Reads a data file a chunk of rows at a time, for Map.data(). CSVs are read with pandas, Parquet files with pyarrow, and anything else
+    # (ie. shapefiles or GeoJSON) with pyogrio, or fiona if pyogrio or pyarrow isn't installed.
+    extension = os.path.splitext(str(path))[1].lower()
+    
+    if extension in [".csv", ".txt"]:
+        
+        # The pyarrow engine can't read in chunks. Reading floats the slow way keeps coordinates exactly as they were written.
+        yield from pd.read_csv(path, chunksize=chunk_size, float_precision="round_trip")
+    
+    elif extension == ".parquet":
+        
+        import pyarrow.parquet
+        
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    
+    else:
+        
+        # Geospatial files are streamed through a single reader, so the file is only opened and read through once. Keep in mind that GDAL
+        # reads a whole GeoJSON file into memory before handing out any features, so GeoJSONSeq, FlatGeobuf, GeoPackage or shapefiles are
+        # better for files that don't fit in memory.
+        try:
+            import pyogrio
+            import pyarrow
+        
+        except ImportError:
+            pyogrio = None
+        
+        if pyogrio is not None:
+            
+            with pyogrio.open_arrow(path, batch_size=chunk_size, use_pyarrow=True) as (meta, reader):
+                
+                geometry_name = meta["geometry_name"] or "wkb_geometry"
+                
+                for batch in reader:
+                    chunk = batch.to_pandas()
+                    geometry = shapely.from_wkb(chunk.pop(geometry_name).to_numpy(dtype=object))
+                    yield geopandas.GeoDataFrame(chunk, geometry=geometry, crs=meta["crs"])
+        
+        else:
+            
+            import fiona
+            
+            with fiona.open(path) as source:
+                
+                features = iter(source)
+                
+                while True:
+                    
+                    batch = list(itertools.islice(features, chunk_size))
+                    
+                    if not batch:
+                        break
+                    
+                    yield geopandas.GeoDataFrame.from_features(batch, crs=source.crs)
+
+
+
+
+# Checks a chart's metadata to see if it was changed after it was last published. Charts that were never published count as changed.
+def _modified_since_publish(metadata: dict):
+    
+    published = metadata.get("publishedAt")
+    modified = metadata.get("lastModifiedAt")
+    
+    if not published:
+        return True
+    
+    return bool(modified) and pd.Timestamp(modified) > pd.Timestamp(published)
+
+
+
 
 class Datawrapper:
     
@@ -24,6 +183,21 @@ class Datawrapper:
     
     This holds methods that are general to interacting with Datawrapper's API, like the authentication method. This object should not be instantiated directly.
     
+    All requests made by Datawrapper objects go through a single requests.Session that is shared by every instance in the process, so connections to
+    Datawrapper's API are pooled and kept alive between calls. Use configure_session() to tune the pool, or set_session() to inject your own session.
+    
+    Requests can be kept under a rate limit with set_rate_limit(). Limits are set per auth token and shared by all threads, and optionally by all
+    processes on the machine.
+    
+    Failed requests are retried according to retry_policy, which is also shared. Set Datawrapper.retry_policy to a different RetryPolicy to change how
+    requests are retried, or to None to turn retries off.
+    
+    Data uploads are checked against upload_cache, which is shared by all Datawrapper objects. Set Datawrapper.upload_cache to a different UploadCache
+    to change where it's stored, or to None to turn it off.
+    
+    Shape files passed to Map.data()'s append are kept parsed and encoded in shape_cache. Set Datawrapper.shape_cache to a different ShapeCache
+    to change where it's stored, or to None to read the file every time.
+    
     Args:
         auth_token (str, optional): The auth_token from Datawrapper. You can authenticate by passing this into the class instantiation, or by putting an auth.txt file in your project's root folder with the token.
 
@@ -39,6 +213,33 @@ class Datawrapper:
     global script_name
     global _os_name
     
+    API_URL = "https://api.datawrapper.de/v3"
+    
+    # Settings for the shared connection pool. The timeout is a (connect, read) tuple in seconds.
+    session_config = {
+        "pool_connections": 10,
+        "pool_maxsize": 10,
+        "pool_block": False,
+        "keep_alive": True,
+        "timeout": (10, 120),
+    }
+    
+    # Rate limiters, keyed by auth token. The "*" limiter applies to tokens that don't have their own. See set_rate_limit().
+    rate_limiters = {}
+    
+    # Decides which failed requests are retried, and how long to wait in between. Set to None to never retry.
+    retry_policy = RetryPolicy()
+    
+    # Remembers a hash of the last data uploaded to each chart, so identical uploads can be skipped. Set to None to always upload.
+    upload_cache = UploadCache()
+    
+    # Keeps the shape files appended to maps parsed and encoded, so they're only read once. Set to None to read them every time.
+    shape_cache = ShapeCache()
+    
+    # The process-wide session. It's created the first time a request is made.
+    _session = None
+    _session_lock = threading.Lock()
+    
     def __init__(self,
                  auth_token: str = None):
         
@@ -79,6 +280,250 @@ class Datawrapper:
         
         self.DW_AUTH_TOKEN = DW_AUTH_TOKEN    
         return self 
+    
+    
+    
+    
+    @classmethod
+    def configure_session(cls,
+                          pool_connections: int = None,
+                          pool_maxsize: int = None,
+                          pool_block: bool = None,
+                          keep_alive: bool = None,
+                          timeout: float | tuple = None):
+        
+        """Changes the settings of the connection pool shared by all Datawrapper objects.
+        
+        The current session is closed and a new one is built with the new settings the next time a request is made. Any argument left as None keeps its current value.
+
+        Args:
+            pool_connections (int, optional): The number of connection pools to cache.
+            pool_maxsize (int, optional): The maximum number of connections to keep open to Datawrapper's API. Set this to at least the number of threads you make requests from.
+            pool_block (bool, optional): Whether to wait for a free connection when the pool is full, instead of opening a throwaway one.
+            keep_alive (bool, optional): Whether connections are reused between requests. Default is True.
+            timeout (float | tuple, optional): The default timeout for every request, in seconds. Can be a (connect, read) tuple.
+        """
+        
+        settings = {
+            "pool_connections": pool_connections,
+            "pool_maxsize": pool_maxsize,
+            "pool_block": pool_block,
+            "keep_alive": keep_alive,
+            "timeout": timeout,
+        }
+        
+        with Datawrapper._session_lock:
+            Datawrapper.session_config = {**Datawrapper.session_config, **{key: value for key, value in settings.items() if value is not None}}
+            
+            if Datawrapper._session is not None:
+                Datawrapper._session.close()
+                Datawrapper._session = None
+    
+    
+    
+    
+    @classmethod
+    def set_session(cls, session: requests.Session = None):
+        
+        """Injects a custom session to be used by all Datawrapper objects.
+        
+        Useful if you need proxies, custom adapters or a mock session for testing. Pass None to go back to the default pooled session.
+
+        Args:
+            session (requests.Session): The session to use for all requests to Datawrapper's API.
+        """
+        
+        with Datawrapper._session_lock:
+            Datawrapper._session = session
+    
+    
+    
+    
+    @classmethod
+    def get_session(cls):
+        
+        """Returns the session shared by all Datawrapper objects, creating it if it doesn't exist yet.
+
+        Returns:
+            requests.Session: The shared session.
+        """
+        
+        with Datawrapper._session_lock:
+            
+            if Datawrapper._session is None:
+                
+                config = Datawrapper.session_config
+                
+                session = requests.Session()
+                
+                adapter = requests.adapters.HTTPAdapter(pool_connections=config["pool_connections"],
+                                                        pool_maxsize=config["pool_maxsize"],
+                                                        pool_block=config["pool_block"])
+                
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                
+                if not config["keep_alive"]:
+                    session.headers["Connection"] = "close"
+                
+                Datawrapper._session = session
+                
+            return Datawrapper._session
+    
+    
+    
+    
+    @classmethod
+    def set_rate_limit(cls,
+                       rate: float = None,
+                       burst: int = None,
+                       token: str = None,
+                       path: str = None):
+        
+        """Limits how many requests per second are sent to Datawrapper's API.
+        
+        Every request waits for its turn, so throughput stays just under the limit instead of running into 429 errors. See RateLimiter.
+
+        Args:
+            rate (float): How many requests are allowed per second, on average. Pass None to remove the limit.
+            burst (int, optional): How many requests can be sent at once after a quiet period. Defaults to rate.
+            token (str, optional): The auth token this limit applies to. By default, the limit applies to every token that doesn't have its own.
+            path (str, optional): A file to keep the limiter's state in, so the limit is shared by every process on this machine that uses the same path.
+        """
+        
+        key = token if token is not None else "*"
+        
+        if rate is None:
+            Datawrapper.rate_limiters.pop(key, None)
+        else:
+            Datawrapper.rate_limiters[key] = RateLimiter(rate=rate, burst=burst, path=path)
+    
+    
+    
+    
+    def _get_rate_limiter(self):
+        
+        # Returns the rate limiter for this object's token, or None if requests aren't limited.
+        return Datawrapper.rate_limiters.get(self.DW_AUTH_TOKEN, Datawrapper.rate_limiters.get("*"))
+    
+    
+    
+    
+    def _request(self, method: str, endpoint: str, headers: dict = None, idempotent: bool = None, **kwargs):
+        
+        """Makes a request to Datawrapper's API using the shared session.
+        
+        Every method that talks to Datawrapper should go through here. Failed requests are retried according to retry_policy. If the request
+        still fails after that, the last response is returned so the caller can raise a useful error.
+
+        Args:
+            method (str): The HTTP method (GET, POST, PATCH, PUT, DELETE).
+            endpoint (str): The endpoint, relative to the API's base URL (ie. "charts/abc12/data"). Full URLs are also accepted.
+            headers (dict, optional): Headers to send on top of the default Accept and Authorization headers.
+            idempotent (bool, optional): Whether the request is safe to repeat. Defaults to True for everything except POST. See RetryPolicy.
+            **kwargs: Passed on to requests.Session.request().
+
+        Returns:
+            requests.Response: The response from the API.
+        """
+        
+        url = endpoint if endpoint.startswith("http") else f"{self.API_URL}/{endpoint.lstrip('/')}"
+        
+        request_headers = {
+            "Accept": "*/*",
+            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
+        }
+        
+        if headers:
+            request_headers.update(headers)
+        
+        kwargs.setdefault("timeout", Datawrapper.session_config["timeout"])
+        
+        policy = Datawrapper.retry_policy
+        limiter = self._get_rate_limiter()
+        attempt = 0
+        
+        while True:
+            
+            # Every attempt counts against the rate limit, including retries.
+            if limiter is not None:
+                limiter.acquire()
+            
+            try:
+                response = self.get_session().request(method, url, headers=request_headers, **kwargs)
+            
+            # Connection errors and timeouts don't have a response to check.
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                
+                if policy is None or not policy.should_retry(method, attempt, idempotent=idempotent):
+                    raise
+                
+                reason = type(e).__name__
+                delay = policy.delay(attempt)
+            
+            else:
+                
+                if policy is None or not policy.should_retry(method, attempt, status=response.status_code, idempotent=idempotent):
+                    return response
+                
+                reason = response.status_code
+                delay = policy.delay(attempt, retry_after=response.headers.get("Retry-After"))
+                response.close()
+            
+            attempt += 1
+            
+            logging.warning(f"RETRYING: {method} {endpoint} failed ({reason}). Trying again in {delay:.1f}s (retry {attempt} of {policy.total}).")
+            
+            time.sleep(delay)
+
+
+
+
+class BulkReport:
+    
+    """The result of running an operation on many charts at once (see Folder.publish_all() and friends).
+    
+    One chart failing doesn't stop the others, so check the report to see which ones need another try.
+    
+    Attributes:
+        results (dict): The result for each chart that succeeded, keyed by chart ID.
+        errors (dict): The exception raised for each chart that failed, keyed by chart ID.
+    """
+    
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+    
+    
+    @property
+    def succeeded(self):
+        return list(self.results.keys())
+    
+    
+    @property
+    def failed(self):
+        return list(self.errors.keys())
+    
+    
+    def __bool__(self):
+        return not self.errors
+    
+    
+    def __repr__(self):
+        return f"<BulkReport: {len(self.results)} succeeded, {len(self.errors)} failed>"
+    
+    
+    def raise_for_errors(self):
+        
+        """Raises a DatawrapperAPIError listing every chart that failed, if any did. The error's report attribute holds this report, so the
+        charts that succeeded aren't lost."""
+        
+        if self.errors:
+            error = DatawrapperAPIError(f"{len(self.errors)} chart(s) failed: " + "; ".join(f"{chart_id}: {error}" for chart_id, error in self.errors.items()))
+            error.report = self
+            raise error
+        
+        return self
 
 
 
@@ -93,7 +538,7 @@ class Folder(Datawrapper):
 
     Attributes:
         folder_id (str): The id of the folder fetched.
-        chart_list (list): A list of charts in the folder.
+        chart_list (list): A list of the IDs of all charts in the folder. Fetched the first time it's used.
         num_charts (int): The number of charts in this folder.
         
     Returns:
@@ -101,8 +546,6 @@ class Folder(Datawrapper):
     """
     
     global folder_id
-    global num_charts
-    global chart_list
     
     def __init__(self,
                  folder_id: str,
@@ -113,532 +556,1704 @@ class Folder(Datawrapper):
         
         # Set folder ID from arg.
         self.folder_id = folder_id
-        self.num_charts = len(self.folder_id)
-        
-        # Run a small funtion to collect the chart IDs of charts in the folder.
-        self.chart_list = self._get_chart_list()
-        
-        
-        
         
-    def _get_chart_list(self):
+        # The list of charts is only fetched when it's first needed. See the chart_list property.
+        self._chart_list = None
+    
+    
+    
+    
+    @property
+    def chart_list(self):
         
-        headers = {
-            "Accept": "*/*",
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-        }
+        """A list of the IDs of all charts in the folder, fetched the first time it's used."""
         
-        r = requests.get(f"https://api.datawrapper.de/v3/charts?folderId={self.folder_id}&order=DESC&orderBy=createdAt&offset=0&expand=true", headers=headers)
+        if self._chart_list is None:
+            self._chart_list = list(self.iter_charts())
         
-        if r.ok: return [obj["publicId"] for obj in r.json()["list"]]
-        else: raise Exception(f"Couldn't fetch charts. Response: {r.reason}")
-
-
-
-class Graphic(Datawrapper):
+        return self._chart_list
     
-    """The base class for Datawrapper graphics.
     
-    There are two opens when creating a new Graphic object:
-        
-    1. You can create a brand new chart by specifying no chart_id and no copy_id. This is not recommended but can be used to create a large number of charts en-mass,
-    and then save their info into a csv or something.
     
-    2. You can specify a copy_id, and a new chart will be created by copying that chart. This is also not recommended but can be used for various purposes.
+    @property
+    def num_charts(self):
+        return len(self.chart_list)
     
-    3. You can specify a chart that is already made that you want to update. This is the easiest way - copy another chart in the Datawrapper app and then
-    use that chart_id.
     
-    Args:
-        chart_id (str): The ID of the chart you're bringing into the module. Providing this string value is the typical implementation of this library.
-        copy_id (str, optional): Instead of a chart_id, you can specify the id of a chart to copy. Keep in mind that this will keep making copies if you keep running code, so it's best run only once, then use chart_id.
-        auth_token (str, optional): The auth_token from Datawrapper. You can authenticate by passing this into the class instantiation, or by putting an auth.txt file in your project's root folder with the token.
-        folder_id (str, optional): If a new chart is being created because no chart_id or copy_id is passed, this is where you specify which folder to create it in.
-
-    Attributes:
-        CHART_ID (str): The CHART_ID is a unique ID that can be taken from the URL of datawrappers. It's required to use the DW api.
-        metadata (str): Holds the chart's metadata when the graphic is instantiated.
-        dataset (pd.DataFrame): Represents the data that is uploaded or will be uploaded to the graphic.
-        DW_AUTH_TOKEN (str): Token to authenticate to Datawrapper's API.
-        path (str): Path that the script is running from using this module.
-        script_name (str): Name of the script currently running using this module.
-        
-    Returns:
-        object: Returns self, the instance of the Graphic class. Can be chained with other methods.
-    """
     
-    global CHART_ID
-    global metadata
-    global dataset
-    global allowed_chart_types
     
-    def __init__(self,
-                 chart_id: str = None,
-                 copy_id: str = None,
-                 folder_id: str = None,
-                 chart_type: str = None):
+    def iter_charts(self, expand: bool = False, page_size: int = 100, prefetch: int = 0, **params):
         
+        """Iterates over every chart in the folder, one page of results at a time.
         
-        # Turn on logging of INFO level.
-        logging.basicConfig(level=logging.INFO)
+        Pages are only fetched as you iterate, so you can stop early without downloading the whole folder. Set prefetch to fetch that many
+        pages ahead at the same time, which is much faster for big folders.
+
+        Args:
+            expand (bool, optional): If True, yields each chart's full metadata as a dict. If False, yields only chart IDs, which is much lighter. Default is False.
+            page_size (int, optional): How many charts to fetch per request. Default is 100.
+            prefetch (int, optional): How many pages to fetch ahead, in parallel. Default is 0, which fetches one page at a time.
+            **params: Extra filters passed on to Datawrapper's chart list endpoint (ie. search="election" or published=True).
+
+        Yields:
+            str | dict: Chart IDs, or chart metadata if expand is True.
+        """
+        
+        query = {
+            "folderId": self.folder_id,
+            "order": "DESC",
+            "orderBy": "createdAt",
+            "limit": page_size,
+            "expand": "true" if expand else "false",
+            **{key: str(value).lower() if isinstance(value, bool) else value for key, value in params.items()},
+        }
         
+        first_page = self._get_chart_page(query, 0)
         
-        super(Graphic, self).__init__()
-        
-        self.allowed_chart_types = [
-                "d3-bars",
-                "d3-bars-split",
-                "d3-bars-stacked",
-                "d3-bars-bullet",
-                "d3-dot-plot",
-                "d3-range-plot",
-                "d3-arrow-plot",
-                "column-chart",
-                "grouped-column-chart",
-                "stacked-column-chart",
-                "d3-area",
-                "d3-lines",
-                "d3-pies",
-                "d3-donuts",
-                "d3-multiple-pies",
-                "d3-multiple-donuts",
-                "d3-scatter-plot",
-                "election-donut-chart",
-                "tables",
-                "d3-maps-choropleth",
-                "d3-maps-symbols",
-            ]
-        
-        # Define common headers for all the below options for instantiating Datawrapper graphics.
-        headers = {
-                "Accept": "*/*",
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-            }
+        yield from self._page_items(first_page, expand)
         
-        # If no chart ID is passed, and no copy id is passed, we create a new chart from scratch.
-        if chart_id == None and copy_id == None:
-            
-            logging.info(f"No chart specified. Creating new chart...")
+        if len(first_page["list"]) < page_size:
+            return
+        
+        total = first_page.get("total")
+        
+        # Prefetching needs the total number of charts to know which pages to ask for.
+        if prefetch and total is not None:
             
-            payload = {}
+            offsets = iter(range(page_size, total, page_size))
+            executor = ThreadPoolExecutor(max_workers=prefetch)
             
-            # If a folder is specified in which to create the chart, handle that here.
-            if folder_id:
-                payload["folderId"] = folder_id
-                
-            # Otherwise, just ignore folderId in the payload.  
-            else:
+            try:
+                # Keep a window of pages in flight, and yield them in order as they arrive.
+                pending = collections.deque(executor.submit(self._get_chart_page, query, offset) for offset in itertools.islice(offsets, prefetch))
                 
-                if chart_type in self.allowed_chart_types:
-                    
-                    if self.__class__ == Map: raise Exception(f"You're trying to create a type that's not locator-map. Please try again.")
-                    
-                    payload["type"] = chart_type
-                    
-                elif (chart_type in ["locator-map"]) or self.__class__ == Map:
-                    
-                    payload["type"] = "locator-map"
+                while pending:
                     
-                else:
+                    page = pending.popleft().result()
                     
-                    logging.warning(f"Invalid or no chart type specified. Creating new chart as a line chart instead.")
+                    next_offset = next(offsets, None)
+                    if next_offset is not None:
+                        pending.append(executor.submit(self._get_chart_page, query, next_offset))
                     
-                    payload["type"] = "d3-lines"
+                    yield from self._page_items(page, expand)
             
+            # If iteration stops early, don't fetch pages that haven't started yet.
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
             
+            return
+        
+        offset = page_size
+        
+        while True:
             
-            response = requests.post(f"https://api.datawrapper.de/v3/charts/", json=payload, headers=headers)
-            chart_id = response.json()["publicId"]
-
-            logging.info(f"New chart created with id {chart_id}")
-            
-            self.CHART_ID = chart_id
-        
-        # If we want to make a copy of a graphic to create the new graphic.    
-        elif chart_id == None and copy_id != None:
-            
-            logging.info(f"No chart specified. Copying chart with ID: {copy_id}...")
+            page = self._get_chart_page(query, offset)
             
-            response = requests.post(f"https://api.datawrapper.de/v3/charts/{copy_id}/copy", headers=headers)
-            chart_id = response.json()["publicId"]
-            
-            logging.info(f"New chart ({chart_id}) created as a copy of {copy_id}.")
-            
-            self.CHART_ID = chart_id
+            yield from self._page_items(page, expand)
             
-        # If we specify a chart id and no copy id, then there is a chart already made that we're altering.    
-        elif chart_id != None and copy_id == None:
+            if len(page["list"]) < page_size:
+                return
             
-            self.CHART_ID = chart_id
-        
-        # Throw exception if both copy id and chart id are input.
-        elif chart_id != None and copy_id != None:
-            raise Exception(f"Please specify either a chart_id or a copy_id, but not both.")
-
-        # Same for metadata.
-        self.metadata = self._get_metadata()
-
+            offset += page_size
     
     
     
     
-    def _check_graphic_type(self, input_type: str | list):
-        
-        """Checks if the graphic is the right type to be loaded into a class.
-        
-        Args:
-            input_type (str): The type of graphic to validate.
-            
-        Returns:
-            bool: Returns True if it's a valid map type, otherwise raises an error.
-        """
+    def _get_chart_page(self, query: dict, offset: int):
         
-        if isinstance(input_type, str):
-            input_type = [input_type]
-            
-        type = self.metadata["type"]
-        
-        if type in input_type:
-            return True
+        r = self._request("GET", "charts", params={**query, "offset": offset})
         
-        else:
-            raise WrongGraphicTypeError(type)
+        if r.ok: return r.json()
+        else: raise DatawrapperAPIError(f"Couldn't fetch charts. Response: {r.reason}")
     
     
     
+    @staticmethod
+    def _page_items(page: dict, expand: bool):
+        return page["list"] if expand else [obj["publicId"] for obj in page["list"]]
     
     
-    def show(self):
-        
-        """Returns an HTML Iframe of the datawrapper chart for showing in Jupyter notebooks.
-        
-        Args:
-            None
-            
-        Returns:
-            HTML: Returns HTML that can be loaded in Jupyter notebook output.
-        """
-        
-        try:
-            iframe_code = self.metadata["metadata"]["publish"]["embed-codes"]["embed-method-iframe"]
-        except KeyError:
-            raise NotPublishedError("No embed code found to display. Did you forget to publish your chart first?")
-        
-        return HTML(iframe_code)
-    
     
-        
     
-    def _get_metadata(self):
+    def walk(self,
+             max_depth: int = None,
+             expand: bool = False,
+             chart_type: str | list = None,
+             updated_since: str | datetime.datetime = None,
+             max_workers: int = 8,
+             page_size: int = 100,
+             **params):
         
-        """Used to collect data for the chart.
-        
-        This method is used on init to collect all the data (not just what's in the metadata object, but ALL the data from the chart)
-        into in the object for reference in the metadata property.
+        """Goes through this folder and every folder inside it, and yields each chart along with the folder it's in.
         
-        Note that it will not (as of yet) update on the live chart until you call set_metadata().
+        Folders are fetched several at a time, and charts are yielded as soon as their folder's list arrives, so the order isn't fixed.
         
-        Args: None
+        Datawrapper's chart list can't be filtered by type or by when charts were changed. Charts are sorted by when they were last
+        changed instead (unless you pass your own orderBy), so listing a folder stops as soon as it reaches charts older than updated_since,
+        and types are checked here.
+
+        Args:
+            max_depth (int, optional): How many levels of subfolders to go into. 0 is only this folder. Default is None, which has no limit.
+            expand (bool, optional): If True, yields each chart's full metadata as a dict. If False, yields only chart IDs. Default is False.
+            chart_type (str | list, optional): Only yield charts of this type, or of one of these types (ie. "locator-map").
+            updated_since (str | datetime, optional): Only yield charts changed after this time. Times without a timezone are treated as UTC.
+            max_workers (int, optional): How many requests to make at the same time. Default is 8.
+            page_size (int, optional): How many charts to fetch per request. Default is 100.
+            **params: Extra filters passed on to Datawrapper's chart list endpoint (ie. published=True).
+
+        Yields:
+            tuple: The folder's path (ie. "Elections/Ontario/Ridings") and the chart's ID, or its metadata if expand is True.
         """
         
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-        }
+        chart_types = [chart_type] if isinstance(chart_type, str) else chart_type
         
-        r = requests.get(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}", headers=headers)
+        if updated_since is not None:
+            updated_since = pd.Timestamp(updated_since)
+            if updated_since.tzinfo is None: updated_since = updated_since.tz_localize("UTC")
         
-        metadata = r.json()
+        # Filtering needs each chart's metadata, even if we only yield the IDs.
+        filtered = chart_types is not None or updated_since is not None
         
-        if r.ok: return metadata
-        else: raise Exception(f"Couldn't update metadata. Response: {r.reason}")
+        # Listing a folder can only stop at the first chart older than updated_since if the newest charts come first.
+        params.setdefault("orderBy", "lastModifiedAt")
+        newest_first = params["orderBy"] == "lastModifiedAt" and params.get("order", "DESC") == "DESC"
         
+        def list_charts(folder_id):
+            
+            folder = Folder(folder_id, auth_token=self.DW_AUTH_TOKEN)
+            charts = []
+            
+            for chart in folder.iter_charts(expand=expand or filtered, page_size=page_size, **params):
+                
+                if updated_since is not None and pd.Timestamp(chart["lastModifiedAt"]) <= updated_since:
+                    if newest_first: break
+                    continue
+                
+                if chart_types is not None and chart["type"] not in chart_types:
+                    continue
+                
+                charts.append(chart if expand or not filtered else chart["publicId"])
+            
+            return charts
         
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            
+            # Each future is either ("folder", path, depth) or ("charts", path). Folders are fetched first, then their charts and
+            # subfolders are queued, so the whole tree is in flight at once instead of one level at a time.
+            pending = {executor.submit(self._get_folder, self.folder_id): ("folder", None, 0)}
+            
+            try:
+                while pending:
+                    
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    
+                    for future in done:
+                        
+                        kind, path, *depth = pending.pop(future)
+                        
+                        if kind == "charts":
+                            for chart in future.result():
+                                yield path, chart
+                            continue
+                        
+                        folder = future.result()
+                        depth = depth[0]
+                        path = folder.get("name", str(folder["id"])) if path is None else path
+                        
+                        pending[executor.submit(list_charts, folder["id"])] = ("charts", path)
+                        
+                        if max_depth is None or depth < max_depth:
+                            for child in folder.get("children", []):
+                                child_path = path + "/" + child.get("name", str(child["id"]))
+                                pending[executor.submit(self._get_folder, child["id"])] = ("folder", child_path, depth + 1)
+            
+            # If iteration stops early, don't fetch anything that hasn't started yet.
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+    
+    
     
     
+    def _get_folder(self, folder_id: str):
+        
+        r = self._request("GET", f"folders/{folder_id}")
+        
+        if r.ok: return r.json()
+        else: raise DatawrapperAPIError(f"Couldn't fetch folder {folder_id}. Response: {r.reason}")
     
     
     
     
-    def set_metadata(self):
+    def _for_each_chart(self, action, chart_ids: list = None, max_workers: int = 8):
         
-        """A method that sends the metadata stored in the Graphics object to the live chart on Datawrapper.
-
-        Args: None
-
-        Returns:
-            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
-        """
+        # Runs action(graphic) for every chart on a thread pool, and collects what happened to each one in a BulkReport.
+        # Graphic objects don't make any requests until they're used, so building one per chart is free.
+        chart_ids = list(chart_ids) if chart_ids is not None else self.chart_list
         
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-        }
+        report = BulkReport()
         
-        r = requests.patch(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}", headers=headers, data=json.dumps(self.metadata).encode('utf-8'))
+        def run(chart_id):
+            return action(Graphic(chart_id, auth_token=self.DW_AUTH_TOKEN))
         
-        self.metadata = r.json()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            
+            futures = {chart_id: executor.submit(run, chart_id) for chart_id in chart_ids}
+            
+            for chart_id, future in futures.items():
+                try: report.results[chart_id] = future.result()
+                except Exception as e: report.errors[chart_id] = e
         
-        if r.ok: logging.info(f"SUCCESS: Metadata updated.")
-        else: raise Exception(f"Couldn't update metadata. Response: {r.reason}")
+        logging.info(f"Done with {len(chart_ids)} charts in folder {self.folder_id}: {len(report.results)} succeeded, {len(report.errors)} failed.")
         
-        return self
-    
+        return report
     
     
     
     
-    
-    # Add the chart's headline.
-    def head(self, string: str):
+    def publish_all(self, only_if_changed: bool = False, chart_ids: list = None, max_workers: int = 8):
         
-        """Updates the title -- or headline -- of your graphic.
+        """Publishes every chart in the folder, several at a time.
 
         Args:
-            string (str): The headline for your chart.
+            only_if_changed (bool, optional): Skip charts that haven't changed since they were last published. See Graphic.publish(). Default is False.
+            chart_ids (list, optional): Only publish these charts, instead of every chart in the folder.
+            max_workers (int, optional): How many charts to publish at the same time. Default is 8.
 
         Returns:
-            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+            BulkReport: What happened to each chart.
         """
-    
-        # Define headers for headline upload.
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-        }
-        
-        # Take the string input as a parameter and put it into a payload object. Then convert to JSON string.
-        data = {"title": string}
-        data = json.dumps(data)
-        
-        r = requests.patch(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}", headers=headers, data=data.encode('utf-8'))
-        
-        if r.ok: logging.info(f"SUCCESS: Chart head added.")
-        else: raise Exception(f"ERROR: Chart head was not added. Response: {r.text}")
         
-        return self
-    
-    
-    
+        return self._for_each_chart(lambda graphic: graphic.publish(only_if_changed=only_if_changed).CHART_ID, chart_ids, max_workers)
     
     
     
     
-
-    
-    def deck(self, deck: str):
+    def unpublish_all(self, chart_ids: list = None, max_workers: int = 8):
         
-        """Updates the deck -- or subheader -- of your graphic.
+        """Unpublishes every chart in the folder, several at a time.
 
         Args:
-            string (str): The subhead for your chart.
+            chart_ids (list, optional): Only unpublish these charts, instead of every chart in the folder.
+            max_workers (int, optional): How many charts to unpublish at the same time. Default is 8.
 
         Returns:
-            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+            BulkReport: What happened to each chart.
         """
         
-        headers = {
-            "Accept": "*/*", 
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-            }
-        
-        payload =  {
-            "metadata": {
-                "describe": {
-                    "intro": deck,
-                },
-            }
-        }
-        
-        r = requests.patch(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}", headers=headers, data=json.dumps(payload).encode('utf-8'))
-        
-        if r.ok: logging.info(f"SUCCESS: Chart deck added.")
-        else: raise Exception(f"ERROR: Chart deck was not added. Response: {r.text}")
-        
-        # Update the object's metadata representation.
-        self.metadata = r.json()
-        
-        return self
-    
-    
-    
-    
-    
-    
+        return self._for_each_chart(lambda graphic: graphic.unpublish().CHART_ID, chart_ids, max_workers)
     
     
     
-    ## Adds a timestamp to the "notes" section of your chart. Also allows for an additional note string that will be added before the timestamp.
     
-    def footer(self, source: str = None, byline:str = "Dexter McMillan", note: str = "", timestamp: bool = True, alt: str = "", tz: str ="America/Toronto", cbcstyle: bool = True):
+    def delete_all(self, chart_ids: list = None, max_workers: int = 8):
         
-        """Updates the footer info of your graphic.
+        """Deletes every chart in the folder, several at a time.
 
         Args:
-            source (str): The graphic's source.
-            byline (str): The graphic's byline.
-            note (str): The graphic's note (showing at the bottom of the graphic).
-            timestamp (bool): Whether a timestamp should be included or not. Timestamps are added right after whatever you specify as the note.
-            alt (str): Alt text for screen readers that should be included in the graphic.
-            tz (str): A string with a pytz timezone. You can find a complete list here: https://gist.github.com/heyalexej/8bf688fd67d7199be4a1682b3eec7568
-            cbcstyle (bool): Does this chart need to show timezones in CBC style? If so, set this to True. Default is True.
-            
+            chart_ids (list, optional): Only delete these charts, instead of every chart in the folder.
+            max_workers (int, optional): How many charts to delete at the same time. Default is 8.
+
         Returns:
-            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+            BulkReport: What happened to each chart.
         """
         
-        today = datetime.datetime.now(timezone(tz))
-        
-        # if self._os_name == "posix":
-        #     today = today - datetime.timedelta(hours=4)
-            
-        # Get day and time strings for use in the footer timestamp.
-        zone = today.strftime('%Z').replace("Eastern Summer Time", "EST").replace("Eastern Standard Time", "EST")
-        
-        if cbcstyle and len(zone) == 3: zone = zone[0] + zone[-1]
-        
-        time = today.strftime('%I:%M') + " " + ".".join(list(today.strftime('%p'))).lower() + "."
-        
-        # Replace some months. This is mostly to conform with CBC style for month abbreviations.
-        day = (today.strftime('%B %d, %Y')
-               .replace("January", "Jan.")
-               .replace("February", "Feb.")
-               .replace("August", "Aug.")
-               .replace("September", "Sept.")
-               .replace("October", "Oct.")
-               .replace("November", "Nov.")
-               .replace("December", "Dec.")
-               )
-        
-        # Use day and time values and create the string we put into the footer as a timestamp.
-        timestamp_string = f"Last updated on {day} at {time} {zone}.".replace(" 0", " ")
-        
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-        }
-        
-        # This is a template object for the structure of the patch payload that Datawrapper API accepts.
-        data =  {
-            "metadata": {
-                "describe": {
-                    "source-name": source,
-                    "byline": byline,
-                    "aria-description": alt,
-                },
-                "annotate": {
-                    "notes": f"{note} {timestamp_string if timestamp else ''}".strip(),
-                },
-            }
-        }
-
-        # Make the HTTP request to update metadata.
-        r = requests.patch(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}", headers=headers, data=json.dumps(data))
-        
-        if r.ok: logging.info(f"SUCCESS: Chart footer (byline, notes, and source) built and added.")
-        else: raise DatawrapperAPIError(f"ERROR: Couldn't build chart footer. Response: {r.reason}")
+        report = self._for_each_chart(lambda graphic: graphic.delete().CHART_ID, chart_ids, max_workers)
         
-        # Update the object's metadat representation.
-        self.metadata = r.json()
+        # The folder's list of charts is out of date now.
+        self._chart_list = None
         
-        return self
-    
-    
-    
-    
+        return report
     
     
     
     
-    
-    def publish(self):
+    def export_all(self, format: str = "png", directory: str = "", chart_ids: list = None, max_workers: int = 4):
         
-        """Publishes your graphic. Is typically called last in an implementation pattern.
+        """Exports every chart in the folder, several at a time. Each chart is saved as its chart ID (ie. AbCd1.png).
 
         Args:
-            None
+            format (str, optional): The filetype to export as. Allowed types: png, svg.
+            directory (str, optional): The folder to save the files in, relative to the script's folder.
+            chart_ids (list, optional): Only export these charts, instead of every chart in the folder.
+            max_workers (int, optional): How many charts to export at the same time. Exports are slow on Datawrapper's side, so the default is 4.
 
         Returns:
-            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+            BulkReport: What happened to each chart. Results are the paths of the saved files.
         """
-
-        headers = {
-            "Accept": "*/*", 
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-            }
-
-        r = requests.post(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}/publish", headers=headers)
         
-        if r.ok: logging.info(f"SUCCESS: Chart published!")
-        else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be published. Response: {r.reason}")
+        if directory:
+            os.makedirs(os.path.join(self.path, directory), exist_ok=True)
         
-        return self
-    
+        def export(graphic):
+            graphic.export(format=format, filename=os.path.join(directory, graphic.CHART_ID))
+            return os.path.join(graphic.path, directory, f"{graphic.CHART_ID}.{format}")
+        
+        return self._for_each_chart(export, chart_ids, max_workers)
     
     
     
     
-    def unpublish(self):
+    def move_all(self, folder_id: str, chart_ids: list = None, chunk_size: int = 100):
         
-        """Unpublishes your graphic.
+        """Moves every chart in the folder to another folder.
+        
+        Datawrapper can move many charts in one request, so this sends one request per chunk_size charts instead of one per chart.
 
         Args:
-            None
+            folder_id (str): The folder to move the charts to.
+            chart_ids (list, optional): Only move these charts, instead of every chart in the folder.
+            chunk_size (int, optional): How many charts to move per request. Default is 100.
 
         Returns:
-            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+            BulkReport: What happened to each chart. If a request fails, every chart in its chunk is marked as failed.
         """
-
-        headers = {
-            "Accept": "*/*", 
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-            }
-
-        r = requests.post(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}/unpublish", headers=headers)
         
-        if r.ok: logging.info(f"SUCCESS: Chart unpublished.")
-        else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be unpublished. Response: {r.reason}")
+        chart_ids = list(chart_ids) if chart_ids is not None else self.chart_list
         
-        return self
-    
-    
-    
-
-    
-    
-    
-    
-    # Moves your chart to a particular folder ID.
-    def move(self, folder_id: str):
+        report = BulkReport()
         
-        """Moves your graphic to the specified folder ID.
-
-        Args:
-            folder_id (str): The folder to move your chart to.
+        for start in range(0, len(chart_ids), chunk_size):
+            
+            chunk = chart_ids[start:start + chunk_size]
+            
+            payload = {
+                "ids": chunk,
+                "patch": {"folderId": folder_id}
+                }
+            
+            try:
+                r = self._request("PATCH", "charts", json=payload)
+                
+                if not r.ok: raise DatawrapperAPIError(f"ERROR: Charts couldn't be moved. Response: {r.reason}")
+                
+                report.results.update({chart_id: folder_id for chart_id in chunk})
+            
+            except Exception as e:
+                report.errors.update({chart_id: e for chart_id in chunk})
+        
+        logging.info(f"Moved {len(report.results)} of {len(chart_ids)} charts to folder {folder_id}.")
+        
+        # Whatever moved isn't in this folder anymore.
+        if folder_id != self.folder_id:
+            self._chart_list = None
+        
+        return report
+
+
+
+class Graphic(Datawrapper):
+    
+    """The base class for Datawrapper graphics.
+    
+    There are two opens when creating a new Graphic object:
+        
+    1. You can create a brand new chart by specifying no chart_id and no copy_id. This is not recommended but can be used to create a large number of charts en-mass,
+    and then save their info into a csv or something.
+    
+    2. You can specify a copy_id, and a new chart will be created by copying that chart. This is also not recommended but can be used for various purposes.
+    
+    3. You can specify a chart that is already made that you want to update. This is the easiest way - copy another chart in the Datawrapper app and then
+    use that chart_id.
+    
+    Args:
+        chart_id (str): The ID of the chart you're bringing into the module. Providing this string value is the typical implementation of this library.
+        copy_id (str, optional): Instead of a chart_id, you can specify the id of a chart to copy. Keep in mind that this will keep making copies if you keep running code, so it's best run only once, then use chart_id.
+        auth_token (str, optional): The auth_token from Datawrapper. You can authenticate by passing this into the class instantiation, or by putting an auth.txt file in your project's root folder with the token.
+        folder_id (str, optional): If a new chart is being created because no chart_id or copy_id is passed, this is where you specify which folder to create it in.
+        expected_type (str, optional): The graphic's type (ie. "locator-map" or "d3-lines"), if you already know it. Map and Chart check the type of the graphic they load,
+            which costs a request to fetch its metadata. If you pass the type here, that check is done locally instead.
+
+    Attributes:
+        CHART_ID (str): The CHART_ID is a unique ID that can be taken from the URL of datawrappers. It's required to use the DW api.
+        metadata (dict): Holds the chart's metadata. It's fetched from Datawrapper the first time it's used, not when the graphic is instantiated.
+        dataset (pd.DataFrame): Represents the data that is uploaded or will be uploaded to the graphic.
+        DW_AUTH_TOKEN (str): Token to authenticate to Datawrapper's API.
+        path (str): Path that the script is running from using this module.
+        script_name (str): Name of the script currently running using this module.
+        
+    Returns:
+        object: Returns self, the instance of the Graphic class. Can be chained with other methods.
+    """
+    
+    global CHART_ID
+    global allowed_chart_types
+    
+    def __init__(self,
+                 chart_id: str = None,
+                 copy_id: str = None,
+                 folder_id: str = None,
+                 chart_type: str = None,
+                 expected_type: str = None,
+                 auth_token: str = None):
+        
+        
+        # Turn on logging of INFO level.
+        logging.basicConfig(level=logging.INFO)
+        
+        
+        super(Graphic, self).__init__(auth_token=auth_token)
+        
+        self.allowed_chart_types = list(CHART_TYPES)
+        
+        # The chart's metadata is only fetched when it's first needed. See the metadata property.
+        self._metadata = None
+        self._expected_type = expected_type
+        
+        # A copy of the metadata as it was last seen on Datawrapper, to tell which changes are actually new.
+        self._remote_metadata = None
+        
+        # Whether anything about the chart has changed since it was last published by this object. See publish().
+        self._changed = False
+        self._published = False
+        
+        # If no chart ID is passed, and no copy id is passed, we create a new chart from scratch.
+        if chart_id == None and copy_id == None:
+            
+            logging.info(f"No chart specified. Creating new chart...")
+            
+            payload = {}
+            
+            # If a folder is specified in which to create the chart, handle that here.
+            if folder_id:
+                payload["folderId"] = folder_id
+                
+            # Otherwise, just ignore folderId in the payload.  
+            else:
+                
+                if chart_type in self.allowed_chart_types:
+                    
+                    if self.__class__ == Map: raise Exception(f"You're trying to create a type that's not locator-map. Please try again.")
+                    
+                    payload["type"] = chart_type
+                    
+                elif (chart_type in ["locator-map"]) or self.__class__ == Map:
+                    
+                    payload["type"] = "locator-map"
+                    
+                else:
+                    
+                    logging.warning(f"Invalid or no chart type specified. Creating new chart as a line chart instead.")
+                    
+                    payload["type"] = "d3-lines"
+            
+            
+            
+            response = self._request("POST", "charts", json=payload)
+            
+            if not response.ok: raise DatawrapperAPIError(f"ERROR: Chart couldn't be created. Response: {response.reason}")
+            
+            chart_id = response.json()["publicId"]
+            
+            # The response holds the new chart's metadata, so there's no need to fetch it again.
+            self._set_remote_metadata(response.json())
+
+            logging.info(f"New chart created with id {chart_id}")
+            
+            self.CHART_ID = chart_id
+        
+        # If we want to make a copy of a graphic to create the new graphic.    
+        elif chart_id == None and copy_id != None:
+            
+            logging.info(f"No chart specified. Copying chart with ID: {copy_id}...")
+            
+            response = self._request("POST", f"charts/{copy_id}/copy", headers={"Content-Type": "application/json"})
+            
+            if not response.ok: raise DatawrapperAPIError(f"ERROR: Chart {copy_id} couldn't be copied. Response: {response.reason}")
+            
+            chart_id = response.json()["publicId"]
+            
+            self._set_remote_metadata(response.json())
+            
+            logging.info(f"New chart ({chart_id}) created as a copy of {copy_id}.")
+            
+            self.CHART_ID = chart_id
+            
+        # If we specify a chart id and no copy id, then there is a chart already made that we're altering.    
+        elif chart_id != None and copy_id == None:
+            
+            self.CHART_ID = chart_id
+        
+        # Throw exception if both copy id and chart id are input.
+        elif chart_id != None and copy_id != None:
+            raise Exception(f"Please specify either a chart_id or a copy_id, but not both.")
+
+        # While this is a dict, changes to the chart's metadata are collected here instead of being sent right away. See batch().
+        self._pending_patch = None
+    
+    
+    
+    
+    @classmethod
+    def bulk_copy(cls,
+                  copy_id: str,
+                  specs: int | list,
+                  folder_id: str = None,
+                  manifest: str = None,
+                  max_workers: int = 8,
+                  auth_token: str = None):
+        
+        """Makes many copies of one graphic at the same time, and sets up each copy's headline, deck, metadata and data.
+        
+        Each copy is moved, titled and updated with a single PATCH (see batch()), plus a data upload if it has data. Copying isn't retried
+        if it fails, since the copy might have gone through anyway.
+        
+        If a manifest file is passed, the ID of each copy is saved there as soon as it's made. Running the same code again reuses the copies in
+        the manifest instead of making new ones, so a run that failed halfway can be finished without duplicating charts. Without a manifest,
+        the error raised when a copy fails holds the copies that were made (see Raises), so they can be reused or cleaned up.
+
+        Args:
+            copy_id (str): The ID of the graphic to copy.
+            specs (int | list): How many copies to make, or a list of dicts, one per copy. Each dict can have a "key" that identifies the copy
+                in the manifest (defaults to its position in the list), a "title", a "deck", a "metadata" dict to merge into the chart's metadata,
+                and "data" to upload with data().
+            folder_id (str, optional): The folder to put the copies in.
+            manifest (str, optional): Path to a JSON file that keeps track of the copies that have been made.
+            max_workers (int, optional): How many copies to make at the same time. Default is 8.
+            auth_token (str, optional): The auth_token from Datawrapper.
+
+        Raises:
+            DatawrapperAPIError: If any copy fails. The others are still made. The error's report attribute is a BulkReport with the copies that
+                succeeded, and its copies attribute has the chart ID of every copy that was made (including ones that failed after copying), by key.
+
+        Returns:
+            list: The copies, in the same order as specs.
+        """
+        
+        specs = [{} for _ in range(specs)] if isinstance(specs, int) else list(specs)
+        keys = [str(spec.get("key", i)) for i, spec in enumerate(specs)]
+        
+        if len(set(keys)) != len(keys):
+            raise Exception("Every spec needs a different key.")
+        
+        # Check this before making any copies, rather than failing after each one is made.
+        if getattr(cls, "data", None) is None and any("data" in spec for spec in specs):
+            raise Exception(f"{cls.__name__} can't upload data. Use Chart.bulk_copy() or Map.bulk_copy() for specs with data.")
+        
+        manifest_lock = threading.Lock()
+        
+        # The manifest holds the copies made from each template, keyed by spec.
+        entries = {}
+        
+        if manifest is not None and os.path.exists(manifest):
+            with open(manifest, "r") as f:
+                entries = json.load(f)
+        
+        copies = entries.setdefault(copy_id, {})
+        
+        def make_copy(key, spec):
+            
+            if key in copies:
+                graphic = cls(chart_id=copies[key], auth_token=auth_token)
+                logging.info(f"SKIPPED: Copy {key} of {copy_id} already exists as chart {graphic.CHART_ID}.")
+            
+            else:
+                graphic = cls(copy_id=copy_id, auth_token=auth_token)
+                
+                with manifest_lock:
+                    copies[key] = graphic.CHART_ID
+                    if manifest is not None: write_json_atomic(manifest, entries)
+            
+            with graphic.batch():
+                
+                if folder_id is not None: graphic._patch_chart({"folderId": folder_id}, success=f"SUCCESS: Chart moved to folder ID {folder_id}!", failure="ERROR: Chart couldn't be moved.")
+                if "title" in spec: graphic.head(spec["title"])
+                if "deck" in spec: graphic.deck(spec["deck"])
+                if "metadata" in spec: graphic._patch_chart(spec["metadata"], success="SUCCESS: Metadata updated.", failure="Couldn't update metadata.")
+                if "data" in spec: graphic.data(spec["data"])
+            
+            return graphic
+        
+        report = BulkReport()
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            
+            futures = {key: executor.submit(make_copy, key, spec) for key, spec in zip(keys, specs)}
+            
+            for key, future in futures.items():
+                try: report.results[key] = future.result()
+                except Exception as e: report.errors[key] = e
+        
+        logging.info(f"Made {len(report.results)} of {len(specs)} copies of chart {copy_id}.")
+        
+        try:
+            report.raise_for_errors()
+        
+        except DatawrapperAPIError as error:
+            error.copies = {key: copies[key] for key in keys if key in copies}
+            logging.warning(f"Copies of chart {copy_id} made before the error: {error.copies}")
+            raise
+        
+        return [report.results[key] for key in keys]
+
+    
+    
+    
+    
+    @property
+    def metadata(self):
+        
+        """The chart's metadata, fetched from Datawrapper the first time it's used."""
+        
+        if self._metadata is None:
+            self._set_remote_metadata(self._get_metadata())
+            
+            # Changes queued in batch mode before the metadata was fetched are newer than what's on Datawrapper, so they win.
+            if self._pending_patch:
+                _deep_merge(self._metadata, self._pending_patch)
+        
+        return self._metadata
+    
+    
+    @metadata.setter
+    def metadata(self, value: dict):
+        self._metadata = value
+    
+    
+    
+    def _set_remote_metadata(self, value: dict):
+        
+        # Stores metadata that just came from Datawrapper, along with a copy to compare future changes against.
+        self._metadata = value
+        self._remote_metadata = copy.deepcopy(value)
+    
+    
+    
+    
+    
+    def _check_graphic_type(self, input_type: str | list):
+        
+        """Checks if the graphic is the right type to be loaded into a class.
+        
+        Args:
+            input_type (str): The type of graphic to validate.
+            
+        Returns:
+            bool: Returns True if it's a valid map type, otherwise raises an error.
+        """
+        
+        if isinstance(input_type, str):
+            input_type = [input_type]
+        
+        # If the caller told us what type to expect, trust that rather than fetching the metadata just to check it.
+        if self._metadata is None and self._expected_type is not None:
+            type = self._expected_type
+        else:
+            type = self.metadata["type"]
+        
+        if type in input_type:
+            return True
+        
+        else:
+            raise WrongGraphicTypeError(type)
+    
+    
+    
+    
+    
+    def show(self):
+        
+        """Returns an HTML Iframe of the datawrapper chart for showing in Jupyter notebooks.
+        
+        Args:
+            None
+            
+        Returns:
+            HTML: Returns HTML that can be loaded in Jupyter notebook output.
+        """
+        
+        try:
+            iframe_code = self.metadata["metadata"]["publish"]["embed-codes"]["embed-method-iframe"]
+        except KeyError:
+            raise NotPublishedError("No embed code found to display. Did you forget to publish your chart first?")
+        
+        return HTML(iframe_code)
+    
+    
+        
+    
+    def _get_metadata(self):
+        
+        """Used to collect data for the chart.
+        
+        This method is used on init to collect all the data (not just what's in the metadata object, but ALL the data from the chart)
+        into in the object for reference in the metadata property.
+        
+        Note that it will not (as of yet) update on the live chart until you call set_metadata().
+        
+        Args: None
+        """
+        
+        r = self._request("GET", f"charts/{self.CHART_ID}")
+        
+        metadata = r.json()
+        
+        if r.ok: return metadata
+        else: raise Exception(f"Couldn't update metadata. Response: {r.reason}")
+        
+        
+    
+    
+    
+    
+    
+    
+    def set_metadata(self):
+        
+        """A method that sends the metadata stored in the Graphics object to the live chart on Datawrapper.
+
+        Args: None
+
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+        
+        self._patch_chart(self.metadata, success="SUCCESS: Metadata updated.", failure="Couldn't update metadata.")
+        
+        return self
+    
+    
+    
+    
+    
+    
+    def _patch_chart(self, payload: dict, success: str, failure: str):
+        
+        """Sends a PATCH to the chart with the payload, or queues it up if the graphic is in batch mode.
+        
+        In batch mode, the payload is deep-merged into the pending patch and into the local metadata, and nothing is sent until commit() or publish() is called.
+
+        Args:
+            payload (dict): The part of the chart's metadata to update.
+            success (str): Message to log when the PATCH is successful.
+            failure (str): Message for the error raised when the PATCH fails.
+        """
+        
+        # Only count this as a change if it's different from what's on Datawrapper. If we don't know what's there, assume it is.
+        if self._remote_metadata is None or _differs(payload, self._remote_metadata):
+            self._changed = True
+        
+        if self._pending_patch is not None:
+            _deep_merge(self._pending_patch, payload)
+            
+            # Keep the local metadata up to date, but don't fetch it just for that.
+            if self._metadata is not None and payload is not self._metadata:
+                _deep_merge(self._metadata, payload)
+            
+            logging.info(f"QUEUED: {success.replace('SUCCESS: ', '')}")
+            return
+        
+        r = self._request("PATCH", f"charts/{self.CHART_ID}", headers={"Content-Type": "application/json"}, data=json.dumps(payload).encode('utf-8'))
+        
+        if r.ok: logging.info(success)
+        else: raise DatawrapperAPIError(f"{failure} Response: {r.reason}")
+        
+        # Update the object's metadata representation.
+        self._set_remote_metadata(r.json())
+    
+    
+    
+    
+    
+    
+    def _put_data(self, payload: bytes | JSONStream, headers: dict = None, force: bool = False):
+        
+        """Uploads a payload to the chart's data endpoint, unless it's identical to the last payload uploaded to this chart.
+
+        Args:
+            payload (bytes | JSONStream): The data to upload. A JSONStream is encoded as it's sent, and again to hash it and if the upload is retried.
+            headers (dict, optional): Extra headers for the upload, ie. the Content-Type.
+            force (bool, optional): Upload even if the payload hasn't changed. Default is False.
+
+        Returns:
+            bool: True if the data was uploaded, False if the upload was skipped.
+        """
+        
+        cache = Datawrapper.upload_cache
+        digest = cache.hash(payload) if cache is not None else None
+        
+        if cache is not None and not force and cache.matches(self.CHART_ID, digest):
+            logging.info(f"SKIPPED: Data for chart {self.CHART_ID} is the same as the last upload.")
+            return False
+        
+        r = self._request("PUT", f"charts/{self.CHART_ID}/data", headers=headers, data=payload)
+
+        if r.ok: logging.info(f"SUCCESS: Data added to chart.")
+        else: raise DatawrapperAPIError(f"ERROR: Chart data couldn't be added. Response: {r.reason}")
+        
+        if cache is not None:
+            cache.set(self.CHART_ID, digest)
+        
+        self._changed = True
+        
+        return True
+    
+    
+    
+    
+    
+    
+    def batch(self):
+        
+        """Puts the graphic in batch mode, where changes to the chart's metadata are collected locally instead of being sent one by one.
+        
+        head(), deck(), footer() and set_metadata() all PATCH the same chart. In batch mode, they are merged together and sent as a single
+        PATCH when commit() or publish() is called, or when a with block ends. Data uploads are still sent right away.
+        
+        Can be used in a chain or as a context manager:
+        
+            with Map(chart_id).batch() as m:
+                m.data(df).head("Headline").deck("Deck").footer(source="Source")
+
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+        
+        if self._pending_patch is None:
+            self._pending_patch = {}
+        
+        return self
+    
+    
+    
+    
+    def _flush(self):
+        
+        # Sends any pending changes as a single PATCH, and stays in batch mode.
+        if self._pending_patch:
+            
+            pending = self._pending_patch
+            self._pending_patch = None
+            
+            try: self._patch_chart(pending, success="SUCCESS: Batched metadata changes sent.", failure="Couldn't send batched metadata changes.")
+            
+            # If the PATCH fails, keep the changes queued so they're sent when it's tried again (ie. when publish() is retried).
+            except Exception:
+                self._pending_patch = _deep_merge(pending, self._pending_patch or {})
+                raise
+            
+            self._pending_patch = {}
+    
+    
+    
+    
+    def commit(self):
+        
+        """Sends all changes collected in batch mode as a single PATCH, and leaves batch mode.
+
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+        
+        if self._pending_patch is not None:
+            self._flush()
+            self._pending_patch = None
+        
+        return self
+    
+    
+    
+    
+    def __enter__(self):
+        return self.batch()
+    
+    
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        
+        # Only send the changes if the block finished without an error.
+        if exc_type is None:
+            self.commit()
+        else:
+            logging.warning(f"Discarding batched changes to chart {self.CHART_ID} because of an error.")
+            self._pending_patch = None
+    
+    
+    
+    
+    
+    
+    # Add the chart's headline.
+    def head(self, string: str):
+        
+        """Updates the title -- or headline -- of your graphic.
+
+        Args:
+            string (str): The headline for your chart.
+
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+    
+        # Take the string input as a parameter and put it into a payload object.
+        data = {"title": string}
+        
+        self._patch_chart(data, success="SUCCESS: Chart head added.", failure="ERROR: Chart head was not added.")
+        
+        return self
+    
+    
+    
+    
+    
+    
+    
+
+    
+    def deck(self, deck: str):
+        
+        """Updates the deck -- or subheader -- of your graphic.
+
+        Args:
+            string (str): The subhead for your chart.
+
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+        
+        payload =  {
+            "metadata": {
+                "describe": {
+                    "intro": deck,
+                },
+            }
+        }
+        
+        self._patch_chart(payload, success="SUCCESS: Chart deck added.", failure="ERROR: Chart deck was not added.")
+        
+        return self
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    @staticmethod
+    def _build_footer(source: str = None, byline:str = "Dexter McMillan", note: str = "", timestamp: bool = True, alt: str = "", tz: str ="America/Toronto", cbcstyle: bool = True):
+        
+        # Builds the PATCH payload for footer(). See footer() for what each argument does.
+        
+        today = datetime.datetime.now(timezone(tz))
+        
+        # if self._os_name == "posix":
+        #     today = today - datetime.timedelta(hours=4)
+            
+        # Get day and time strings for use in the footer timestamp.
+        zone = today.strftime('%Z').replace("Eastern Summer Time", "EST").replace("Eastern Standard Time", "EST")
+        
+        if cbcstyle and len(zone) == 3: zone = zone[0] + zone[-1]
+        
+        time = today.strftime('%I:%M') + " " + ".".join(list(today.strftime('%p'))).lower() + "."
+        
+        # Replace some months. This is mostly to conform with CBC style for month abbreviations.
+        day = (today.strftime('%B %d, %Y')
+               .replace("January", "Jan.")
+               .replace("February", "Feb.")
+               .replace("August", "Aug.")
+               .replace("September", "Sept.")
+               .replace("October", "Oct.")
+               .replace("November", "Nov.")
+               .replace("December", "Dec.")
+               )
+        
+        # Use day and time values and create the string we put into the footer as a timestamp.
+        timestamp_string = f"Last updated on {day} at {time} {zone}.".replace(" 0", " ")
+        
+        # This is a template object for the structure of the patch payload that Datawrapper API accepts.
+        data =  {
+            "metadata": {
+                "describe": {
+                    "source-name": source,
+                    "byline": byline,
+                    "aria-description": alt,
+                },
+                "annotate": {
+                    "notes": f"{note} {timestamp_string if timestamp else ''}".strip(),
+                },
+            }
+        }
+        
+        return data
+    
+    
+    
+    
+    
+    
+    ## Adds a timestamp to the "notes" section of your chart. Also allows for an additional note string that will be added before the timestamp.
+    
+    def footer(self, source: str = None, byline:str = "Dexter McMillan", note: str = "", timestamp: bool = True, alt: str = "", tz: str ="America/Toronto", cbcstyle: bool = True):
+        
+        """Updates the footer info of your graphic.
+
+        Args:
+            source (str): The graphic's source.
+            byline (str): The graphic's byline.
+            note (str): The graphic's note (showing at the bottom of the graphic).
+            timestamp (bool): Whether a timestamp should be included or not. Timestamps are added right after whatever you specify as the note.
+            alt (str): Alt text for screen readers that should be included in the graphic.
+            tz (str): A string with a pytz timezone. You can find a complete list here: https://gist.github.com/heyalexej/8bf688fd67d7199be4a1682b3eec7568
+            cbcstyle (bool): Does this chart need to show timezones in CBC style? If so, set this to True. Default is True.
+            
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+        
+        data = self._build_footer(source=source, byline=byline, note=note, timestamp=timestamp, alt=alt, tz=tz, cbcstyle=cbcstyle)
+
+        # Make the HTTP request to update metadata.
+        self._patch_chart(data, success="SUCCESS: Chart footer (byline, notes, and source) built and added.", failure="ERROR: Couldn't build chart footer.")
+        
+        return self
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    def publish(self, only_if_changed: bool = False):
+        
+        """Publishes your graphic. Is typically called last in an implementation pattern.
+        
+        Publishing is slow and clears Datawrapper's cache of the graphic, so it can be skipped when nothing has changed. A graphic has changed if
+        this object uploaded new data or sent metadata (head, deck, footer etc.) that's different from what was on Datawrapper. If nothing changed
+        here, the chart's lastModifiedAt and publishedAt dates are compared, to catch changes made by earlier runs or in the Datawrapper app.
+
+        Args:
+            only_if_changed (bool, optional): Skip publishing if nothing has changed since the graphic was last published. Default is False.
+
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+
+        # Send anything still waiting in batch mode first, so it's included in what gets published.
+        self._flush()
+        
+        if only_if_changed and not self.has_changes():
+            logging.info(f"SKIPPED: Chart {self.CHART_ID} hasn't changed since it was last published.")
+            return self
+        
+        r = self._request("POST", f"charts/{self.CHART_ID}/publish", idempotent=True)
+        
+        if r.ok: logging.info(f"SUCCESS: Chart published!")
+        else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be published. Response: {r.reason}")
+        
+        self._changed = False
+        self._published = True
+        
+        return self
+    
+    
+    
+    
+    
+    def has_changes(self):
+        
+        """Checks if the graphic has changed since it was last published. See publish().
+
+        Returns:
+            bool: True if the graphic has unpublished changes.
+        """
+        
+        if self._changed:
+            return True
+        
+        # Once this object has published the graphic, the publish dates in its metadata are out of date, and only its own changes count.
+        if self._published:
+            return False
+        
+        return _modified_since_publish(self.metadata)
+    
+    
+    
+    
+    
+    def unpublish(self):
+        
+        """Unpublishes your graphic.
+
+        Args:
+            None
+
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+
+        r = self._request("POST", f"charts/{self.CHART_ID}/unpublish", idempotent=True)
+        
+        if r.ok: logging.info(f"SUCCESS: Chart unpublished.")
+        else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be unpublished. Response: {r.reason}")
+        
+        return self
+    
+    
+    
+
+    
+    
+    
+    
+    # Moves your chart to a particular folder ID.
+    def move(self, folder_id: str):
+        
+        """Moves your graphic to the specified folder ID.
+
+        Args:
+            folder_id (str): The folder to move your chart to.
+
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+        
+        payload = {
+            "ids": [self.CHART_ID],
+            "patch": {"folderId": folder_id}
+            }
+
+        r = self._request("PATCH", "charts", json=payload)
+        
+        if r.ok: logging.info(f"SUCCESS: Chart moved to folder ID {folder_id}!")
+        else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be moved. Response: {r.reason}")
+        
+        return self
+    
+    
+    
+    
+    
+    
+    def delete(self):
+        
+        """Deletes your graphic.
+
+        Args:
+            None
+
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+        
+        logging.warning(f"Deleting chart with ID {self.CHART_ID}!")
+        
+        r = self._request("DELETE", f"charts/{self.CHART_ID}")
+        
+        if r.ok: logging.info(f"SUCCESS: Chart published!")
+        else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be deleted. Response: {r.reason}")
+        
+        return self
+    
+    
+    
+    
+    def export(self, format: str = "png", filename: str = "export"):
+        
+        """Exports your graphic.
+
+        Args:
+            format (str, optional): The filetype to export as. Allowed types: png, svg.
+            filename (str, optional): The name for the exported file, relative to project root. Defaults to: export.png. Do not specify a file suffix here.
+
+        Returns:
+            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+        """
+        
+        VALID_FORMAT_LIST = ["png", "svg"]
+        
+        if format not in VALID_FORMAT_LIST:
+            raise InvalidExportTypeError(VALID_FORMAT_LIST)
+        
+        file_path = os.path.join(self.path, filename + "." + format)
+        
+        export_chart_response = self._request("GET", f"charts/{self.CHART_ID}/export/{format}?unit=px&mode=rgb&plain=false&scale=1&zoom=2&download=true&fullVector=false&ligatures=true&transparent=false&logo=auto&dark=false", headers={"Accept": "image/png"})
+            
+        
+        if export_chart_response.ok:
+            logging.info(f"SUCCESS: Chart with ID {self.CHART_ID} exported and saved!")
+            
+            with open(file_path, "wb") as response:
+                response.write(export_chart_response.content)
+                
+        else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be exported as {format}. Response: {export_chart_response.reason}")
+        
+        return self
+
+
+
+
+
+class Chart(Graphic):
+    
+    """Defines methods and variables for uploading data to datawrapper charts (scatter plots, tables etc).
+    
+    Use this class to create a new, copy, or to manage a currently existing Datawrapper chart (ie. not a map!).
+    
+    Args:
+        load_data (bool, optional): Whether the chart's existing data should be fetched when dataset is first used. Set this to False if you're going to
+            replace the data anyway, and dataset will start out as an empty dataframe instead. Default is True.
+    
+    """
+    
+    def __init__(self,
+                 *args,
+                 load_data: bool = True,
+                 **kwargs
+                 ):
+        
+        super(Chart, self).__init__(*args, **kwargs)
+        
+        self._check_graphic_type(self.allowed_chart_types)
+        
+        # The chart's existing data is only fetched when it's first needed. See the dataset property.
+        self._dataset = None if load_data else pd.DataFrame()
+    
+    
+    
+    
+    @property
+    def dataset(self):
+        
+        """The chart's data as a dataframe. Fetched from Datawrapper the first time it's used, unless data has already been set."""
+        
+        if self._dataset is None:
+            self._dataset = self._get_dataset()
+        
+        return self._dataset
+    
+    
+    @dataset.setter
+    def dataset(self, value: pd.DataFrame):
+        self._dataset = value
+    
+    
+    
+    
+    def _get_dataset(self):
+        
+        # Grab data from already existing chart. The body is streamed straight into a bytes buffer and parsed from there,
+        # rather than decoded into one big string first.
+        r = self._request("GET", f"charts/{self.CHART_ID}/data", stream=True)
+        
+        if not r.ok: raise Exception(f"Couldn't get data from existing chart. Response: {r.reason}")
+        
+        buffer = BytesIO()
+        
+        try:
+            for chunk in r.iter_content(chunk_size=1024 * 64):
+                buffer.write(chunk)
+        finally:
+            r.close()
+        
+        buffer.seek(0)
+        
+        try:
+            if CSV_ENGINE != "pyarrow":
+                return pd.read_csv(buffer, sep=";", engine=CSV_ENGINE)
+            
+            # pyarrow turns columns that look like dates into date objects, which the C engine leaves as text. Those columns are found from
+            # the types pyarrow infers for the start of the file, and read as text instead so the data comes back the same either way.
+            # (pandas' own pyarrow engine only converts them back after parsing, which doesn't give the original text back.) Missing values
+            # are the same ones pandas uses.
+            parse_options = pyarrow.csv.ParseOptions(delimiter=";")
+            nulls = {"null_values": NA_VALUES, "strings_can_be_null": True}
+            
+            schema = pyarrow.csv.open_csv(buffer, parse_options=parse_options, convert_options=pyarrow.csv.ConvertOptions(**nulls)).schema
+            buffer.seek(0)
+            
+            text = {field.name: pyarrow.string() for field in schema if pyarrow.types.is_temporal(field.type)}
+            dataset = pyarrow.csv.read_csv(buffer, parse_options=parse_options, convert_options=pyarrow.csv.ConvertOptions(column_types=text, **nulls)).to_pandas()
+            
+            # The C engine names columns without a header (ie. the index) "Unnamed: 0", while pyarrow leaves them blank.
+            dataset.columns = [column if column != "" else f"Unnamed: {i}" for i, column in enumerate(dataset.columns)]
+            
+            return dataset
+        
+        except: return pd.DataFrame()
+        
+    
+
+        
+        
+        
+    def disable_grid(self):
+        
+        # Set a few visualization properties that control the grid visibility on charts.
+        self.metadata["metadata"]['visualize']["y-grid"] = "off"
+        self.metadata["metadata"]['visualize']["x-grid"] = "off"
+        
+        self.metadata["metadata"]['visualize']["y-grid-lines"] = "off"
+        self.metadata["metadata"]['visualize']["x-grid-lines"] = "off"
+        
+        # Send the metadata representation in this class to the datawrapper graphic.
+        self.set_metadata()
+        
+        return self
+        
+        
+        
+        
+        
+    
+    @classmethod
+    def plan(cls,
+             data: pd.DataFrame,
+             max_payload_bytes: int = None,
+             metadata_loaded: bool = True,
+             batch: bool = False):
+        
+        """Works out how big the upload for data() would be and which columns the bytes go to, without connecting to Datawrapper.
+
+        Args:
+            data (pd.DataFrame): The dataframe to plan for.
+            max_payload_bytes (int, optional): If passed, the plan says whether the payload fits in this many bytes.
+            metadata_loaded (bool, optional): Whether the chart's metadata has already been fetched. It has unless the chart was loaded with
+                expected_type and nothing has used its metadata yet. Default is True.
+            batch (bool, optional): Whether the chart is in batch mode, where the metadata update is queued instead of sent. Default is False.
+
+        Returns:
+            dict: The plan, with:
+                bytes (int): The size of the upload.
+                requests (int): How many requests data() sends at most: the upload, fetching the metadata if it hasn't been yet, and the
+                    metadata update unless it's batched.
+                breakdown (dict): Roughly how many bytes go to each column (and the index), measured from each value's text without building the CSV again.
+                rows (int): The number of rows.
+                fits (bool): Whether the upload fits in max_payload_bytes. Only there if max_payload_bytes is passed.
+        """
+        
+        size = len(data.to_csv(sep=";").encode('utf-8'))
+        
+        def column_size(values, name):
+            lengths = values.astype(str).str.len().where(pd.notna(values), 0)
+            return int(lengths.sum()) + len(str(name)) + len(values)
+        
+        breakdown = {"index": column_size(data.index.to_series(), data.index.name or "")}
+        
+        for column in data.columns:
+            breakdown[column] = column_size(data[column], column)
+        
+        plan = {
+            "bytes": size,
+            "requests": 1 + (not metadata_loaded) + (not batch),
+            "breakdown": breakdown,
+            "rows": len(data),
+        }
+        
+        if max_payload_bytes is not None:
+            plan["fits"] = size <= max_payload_bytes
+        
+        return plan
+    
+    
+    
+    
+    def data(self, data: pd.DataFrame, force: bool = False):
+        
+        """Uploads a dataframe to the chart.
+        
+        The upload is skipped if it's identical to the last data uploaded to this chart (see Datawrapper.upload_cache).
+
+        Args:
+            data (pd.DataFrame): The dataframe to upload.
+            force (bool, optional): Upload even if the data hasn't changed since the last upload. Default is False.
+
+        Returns:
+            object: Returns the datawrapper graphic object so methods can be chained.
+        """
+        
+        payload = data.to_csv(sep=";")
+        
+        self._put_data(payload.encode('utf-8'), headers={"Content-Type": "text/csv"}, force=force)
+        
+        self.set_metadata()
+        
+        return self
+    
+
+
+
+
+class MarkerDiff:
+    
+    """How a map's markers differ from an earlier set of markers (see Map.diff()).
+    
+    Markers are matched by ID, so pass id_col to Map.data() to give each marker an ID that stays the same from one run to the next.
+    A MarkerDiff is falsy if nothing changed.
+    
+    Attributes:
+        added (list): IDs of the markers that are new.
+        removed (list): IDs of the markers that are gone.
+        changed (list): IDs of the markers that are in both sets, but different.
+        delta_bytes (int): How many bytes the added and changed markers take up.
+    """
+    
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.changed = []
+        self.delta_bytes = 0
+    
+    
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+    
+    
+    def __repr__(self):
+        return f"<MarkerDiff: {len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed>"
+
+
+
+
+
+
+# This class defines methods and variables for Datawrapper locator maps.
+# It is also extended by the hurricane map class below.
+class Map(Graphic):
+    
+    # Script_name variable is used to pull the right icon templates from the assets folder, and is set on init.
+    global script_name
+    
+    icon_list = dw_icons
+    
+    def __init__(self,
+                 *args,
+                 **kwargs
+                 ):
+        super(Map, self).__init__(*args, **kwargs)
+        
+        self._check_graphic_type("locator-map")
+        
+        self.icon_list = dw_icons
+        
+        # This bit of code tries to load in data from the map in the DW app, but is not working currently.
+        # markers = [self.get_markers()]
+        
+        # dfs = []
+        
+        # for marker in markers:
+        #     df = pd.DataFrame({'id': [marker["id"]]})
+            
+        #     df["type"] = marker["type"]
+                          
+        #     for property in ["id", "title", "icon", "scale", "markerColor", "markerSymbol", "anchor", "visible"]:
+        #         df[property] = marker[property] if hasattr(marker, property) else np.nan
+            
+        #     if marker["type"] == "point":
+                
+        #         df["tooltip"] = marker["tooltip"]["text"]
+        #         df["latitude"] = marker["coordinates"][1]
+        #         df["longitude"] = marker["coordinates"][0]
+        #         df["icon"] = marker["icon"]["id"]
+                
+        #     else:
+        #         try: df["geometry"] = shape(marker["feature"]["geometry"]).wkt
+        #         except KeyError: df["geometry"] = shape(marker["features"]["feature"])
+            
+        #     dfs.append(df)
+            
+        # self.dataset = pd.concat(dfs)
+     
+     
+     
+     
+    # Check markerColor to make sure it's a valid hex code.
+    @staticmethod
+    def _check_if_valid_hexcode(string):
+        match = HEXCODE_PATTERN.fullmatch(string)
+        if match is None:
+            return False
+        else:
+            return True
+     
+     
+     
+     
+     
+    
+    @classmethod
+    def validate(cls, input_data: pd.DataFrame | geopandas.GeoDataFrame, raise_errors: bool = True):
+        
+        """Checks a dataframe's marker properties before it's uploaded, without connecting to Datawrapper.
+        
+        Every value is checked, a whole column at a time, and errors list every row that's wrong rather than stopping at the first one.
+        data() runs these same checks before building any markers.
+
+        Args:
+            input_data (pd.DataFrame): The dataframe to check. See data() for the columns that are used.
+            raise_errors (bool, optional): If True, raises an error listing every invalid value. If False, returns every problem instead. Default is True.
+
+        Raises:
+            InvalidMarkerDataError: If a type, anchor or icon isn't one of the allowed values.
+            InvalidHexcodeError: If a colour isn't a 6-digit hex code (fill and stroke can also be True or False).
+            InvalidMapDataError: If more than one column has invalid values. It lists every column and row, and is caught by either of the above.
 
         Returns:
-            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+            dict: The index of every row with an invalid value, keyed by column. Empty if everything is valid.
         """
         
-        headers = {
-            "Accept": "*/*", 
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-            }
+        # Define a list of marker values that are allowed for various marker properties.
+        ALLOWED_VALUES = {
+            "type": ["point", "area"],
+            "anchor": ["middle-left", "middle-center", "middle-right", "bottom-left", "bottom-center", "bottom-right", "top-left", "top-center", "top-right"],
+            "icon": list(cls.icon_list.keys())
+        }
         
-        payload = {
-            "ids": [self.CHART_ID],
-            "patch": {"folderId": folder_id}
-            }
+        problems = {}
+        errors = []
+        
+        for marker_property, _list in ALLOWED_VALUES.items():
+            
+            if marker_property in input_data:
+                
+                values = input_data[marker_property]
+                invalid = values.notna() & ~values.isin(_list)
+                
+                if invalid.any():
+                    
+                    problems[marker_property] = values.index[invalid].tolist()
+                    errors.append(InvalidMarkerDataError(marker_property, values[invalid].drop_duplicates().astype(str).tolist(), _list, rows=problems[marker_property]))
+        
+        # Check colours to make sure they're valid hex codes. Fill and stroke can also be booleans, to turn them on or off.
+        for property in ["markerColor", "fill", "stroke", "markerTextColor"]:
+            
+            if property in input_data:
+                
+                values = input_data[property]
+                invalid = values.notna() & ~values.astype(str).str.fullmatch(HEXCODE_PATTERN)
+                
+                # Only the few values that aren't hex codes need to be checked one by one.
+                if property in ["fill", "stroke"] and invalid.any():
+                    invalid[invalid] = ~values[invalid].map(lambda value: isinstance(value, (bool, np.bool_))).astype(bool)
+                
+                if invalid.any():
+                    
+                    problems[property] = values.index[invalid].tolist()
+                    errors.append(InvalidHexcodeError(property, rows=problems[property]))
+        
+        # Every column is checked before raising, so one error can list all of the problems.
+        if raise_errors and errors:
+            raise errors[0] if len(errors) == 1 else InvalidMapDataError(errors)
+        
+        return problems
+     
+     
+     
+     
+     
+    
+    def data(self,
+             input_data: pd.DataFrame | geopandas.GeoDataFrame,
+             append: str = None,
+             force: bool = False,
+             precision: int = None,
+             max_payload_bytes: int = None,
+             id_col: str = None,
+             diff: bool | str = False,
+             chunk_size: int = 100_000,
+             cluster: dict = None,
+             cull_to_view: bool = False,
+             margin: float = 0.1):
+        
+        """Uploads your data the map as markers.
+        
+        This method handles the majority of the heavy lifting for map data. In essence, it converts either a pd.DataFrame or a geopandas.GeoDataFrame to a GEOJson object, then replaces values in a template with custom values specified in the dataframe.
+        
+        Args:
+            input_data (pd.DataFrame | Iterable[pd.DataFrame] | str): The dataframe that you ultimately want to upload. For data too big to load
+                all at once, this can also be an iterator of dataframes (ie. from pd.read_csv(..., chunksize=...)), or the path to a CSV, Parquet
+                or geospatial file to read in chunks. Each chunk is turned into markers and encoded before the next one is read.
+            append (str, optional): Path to a JSON file of extra markers (ie. province outlines) to add after the markers built from input_data.
+            force (bool, optional): Upload even if the markers haven't changed since the last upload. Default is False.
+            precision (int, optional): How many decimals to round coordinates to. 5 decimals is about 1 metre. Vertices that end up in the same
+                place after rounding are merged. Area coordinates are always rounded to at most 6 decimals. Default is None, which doesn't round.
+            max_payload_bytes (int, optional): If the upload would be bigger than this, areas are simplified just enough to fit (see fit_to_size()).
+                Default is None, which uploads the areas as they are.
+            id_col (str, optional): A column with a unique key for each row (ie. a fire's ID), used to give each marker an ID that doesn't change
+                when rows are added, removed or reordered. Default is None, which numbers the markers in order.
+            diff (bool | str, optional): Compare the markers with the map's current markers first (True), or with a local snapshot file (a path),
+                and skip the upload if nothing changed. A snapshot file is written after every upload. Best used with id_col. Default is False.
+            chunk_size (int, optional): How many rows to read at a time when input_data is a path. Default is 100,000.
+            cluster (dict, optional): Combine points that are close together into one marker first, ie. {"cell_km": 10} or {"zoom": 6}.
+                The keys are passed to cluster(). Default is None, which uploads every point.
+            cull_to_view (bool, optional): Drop the points and areas that are outside the map's saved view (see view_bounds() and cull()) before
+                anything else is done with them. Default is False.
+            margin (float, optional): How much extra to keep around the view when culling, as a share of its width and height. Default is 0.1.
 
-        r = requests.patch(f"https://api.datawrapper.de/v3/charts", json=payload, headers=headers)
+        Returns:
+            object: Returns the datawrapper graphic object so methods can be chained.
+        """
         
-        if r.ok: logging.info(f"SUCCESS: Chart moved to folder ID {folder_id}!")
-        else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be moved. Response: {r.reason}")
+        bounds = self.view_bounds(margin) if cull_to_view else None
+        
+        # Anything other than a dataframe is read, turned into markers and encoded one chunk at a time.
+        if not isinstance(input_data, pd.DataFrame):
+            
+            if max_payload_bytes is not None or diff or cluster:
+                raise ValueError("max_payload_bytes, diff and cluster need all the data at once, so they can't be used when it's read in chunks.")
+            
+            chunks = _read_chunks(input_data, chunk_size) if isinstance(input_data, (str, os.PathLike)) else input_data
+            
+            if bounds is not None:
+                chunks = (self.cull(chunk, bounds) for chunk in chunks)
+            payload = self._chunked_payload(chunks, append, precision=precision, id_col=id_col)
+            
+            try:
+                if self._put_data(payload, force=force):
+                    logging.info(f"Icons took up {payload.icon_bytes:,} of the {len(payload):,} bytes uploaded.")
+            
+            finally:
+                payload.close()
+            
+            return self
+        
+        if bounds is not None:
+            before = len(input_data)
+            input_data = self.cull(input_data, bounds)
+            logging.info(f"Culled {before - len(input_data):,} of {before:,} markers outside the map's view.")
+        
+        if cluster:
+            before = len(input_data)
+            input_data = self.cluster(input_data, **cluster)
+            logging.info(f"Clustering took the map from {before:,} to {len(input_data):,} markers.")
+        
+        if max_payload_bytes is not None:
+            input_data = self.fit_to_size(input_data, max_payload_bytes, append=append, precision=precision)
+        
+        # Change layout of the markers to match what Datawrapper likes to receive. The payload is encoded a few markers at a time as it's
+        # uploaded, rather than built up as one big string first. Every marker carries a full icon, so each icon is encoded once and reused.
+        payload = self._marker_payload(input_data, append, precision=precision, id_col=id_col)
+        
+        # Measuring the upload before rounding means encoding every marker twice more, so it's only done when debugging.
+        if precision is not None and logging.getLogger().isEnabledFor(logging.DEBUG):
+            before = len(self._marker_payload(input_data, append, id_col=id_col))
+            logging.debug(f"Rounding coordinates to {precision} decimals took the upload from {before:,} to {len(payload):,} bytes.")
+        
+        if diff:
+            
+            # A snapshot that doesn't exist yet (ie. on the first run) counts as a map with no markers.
+            snapshot = diff if isinstance(diff, str) else None
+            against = [] if snapshot is not None and not os.path.exists(snapshot) else snapshot
+            
+            changes = self.diff(input_data, against, append=append, precision=precision, id_col=id_col)
+            
+            if not changes and not force:
+                logging.info(f"SKIPPED: Markers for chart {self.CHART_ID} are the same as the {'snapshot' if snapshot else 'markers on the map'}.")
+                return self
+            
+            logging.info(f"{len(changes.added):,} markers added, {len(changes.removed):,} removed and {len(changes.changed):,} changed ({changes.delta_bytes:,} bytes of new or changed markers).")
+            
+            # The diff has already shown the markers are different, so there's no need to check the upload cache too.
+            force = True
+        
+        # Make the HTTP request to the Datawrapper API to upload the data.
+        if self._put_data(payload, force=force):
+            logging.info(f"Icons took up {payload.icon_bytes:,} of the {len(payload):,} bytes uploaded.")
+            
+            if diff and snapshot is not None:
+                write_atomic(snapshot, payload)
         
         return self
     
@@ -647,294 +2262,934 @@ class Graphic(Datawrapper):
     
     
     
-    def delete(self):
+    def diff(self,
+             input_data: pd.DataFrame | geopandas.GeoDataFrame,
+             against: list | str = None,
+             append: str = None,
+             precision: int = None,
+             id_col: str = None):
         
-        """Deletes your graphic.
+        """Compares the markers data() would upload with an earlier set of markers, without uploading anything.
+        
+        Markers are matched by ID and compared by their contents, whatever order their keys are in, so pass the same id_col you use with data().
 
         Args:
-            None
+            input_data (pd.DataFrame): The dataframe to compare. See data() for the columns that are used.
+            against (list | str, optional): The markers to compare with: a list of marker dicts, or the path to a JSON file of them (ie. a
+                snapshot written by data(), or a file saved by get_markers(save=True)). Default is None, which fetches the map's current markers.
+            append (str, optional): Path to a JSON file of extra markers to add. See data().
+            precision (int, optional): How many decimals to round coordinates to. See data().
+            id_col (str, optional): The column to take marker IDs from. See data().
 
         Returns:
-            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+            MarkerDiff: The IDs of the markers that were added, removed and changed.
+        """
+        
+        if against is None:
+            against = self.get_markers()
+        
+        elif isinstance(against, str):
+            with open(against, 'r') as f:
+                against = json.load(f)
+        
+        # Snapshots hold the whole payload, and get_markers(save=True) saves just the list.
+        if isinstance(against, dict):
+            against = against["markers"]
+        
+        # Only a short hash of each old marker is kept, rather than the markers themselves. Keys are sorted first, since markers saved by
+        # Datawrapper or by another version of this library can have the same keys in a different order.
+        def digest(marker):
+            return hashlib.blake2b(encoding.dumps(marker, sort_keys=True), digest_size=16).digest()
+        
+        old = {marker.get("id"): digest(marker) for marker in against}
+        
+        changes = MarkerDiff()
+        
+        for marker in self._marker_factory(input_data, append, precision=precision, id_col=id_col)():
+            
+            previous = old.pop(marker["id"], None)
+            
+            if previous is None:
+                changes.added.append(marker["id"])
+            elif previous != digest(marker):
+                changes.changed.append(marker["id"])
+            else:
+                continue
+            
+            changes.delta_bytes += len(encoding.dumps(marker))
+        
+        changes.removed = list(old)
+        
+        return changes
+    
+    
+    
+    
+    
+    
+    @classmethod
+    def plan(cls,
+             input_data: pd.DataFrame | geopandas.GeoDataFrame,
+             append: str = None,
+             precision: int = None,
+             max_payload_bytes: int = None,
+             id_col: str = None,
+             diff: bool | str = False,
+             cull_to_view: bool = False,
+             metadata_loaded: bool = True):
+        
+        """Works out how big the upload for data() would be and where the bytes go, without connecting to Datawrapper.
+        
+        Each marker is encoded once, with its icon, geometry, coordinates, title and tooltip measured separately, so this costs about the
+        same as encoding the payload (and nothing is uploaded or kept in memory). Icons are only measured once each.
+
+        Args:
+            input_data (pd.DataFrame): The dataframe to plan for. See data() for the columns that are used.
+            append (str, optional): Path to a JSON file of extra markers to add. See data().
+            precision (int, optional): How many decimals to round coordinates to. See data().
+            max_payload_bytes (int, optional): If passed, the plan says whether the payload fits in this many bytes.
+            id_col (str, optional): The column to take marker IDs from. See data().
+            diff (bool | str, optional): The diff that will be passed to data(). Comparing with the map's current markers (True) fetches them first.
+            cull_to_view (bool, optional): The cull_to_view that will be passed to data(). It needs the map's metadata for the view. The markers
+                aren't culled here, since that needs the view too.
+            metadata_loaded (bool, optional): Whether the map's metadata has already been fetched. It has unless the map was loaded with
+                expected_type and nothing has used its metadata yet. Default is True.
+
+        Returns:
+            dict: The plan, with:
+                bytes (int): The size of the upload.
+                requests (int): How many requests data() sends at most: the upload, fetching the map's markers if diff is True, and fetching the
+                    metadata if cull_to_view needs it and it hasn't been fetched yet. The upload is skipped if the markers haven't changed.
+                breakdown (dict): How many bytes go to icons, geometry (areas), coordinates (points), titles, tooltips, and everything else.
+                markers (pd.Series): The size of each marker, by marker ID.
+                fits (bool): Whether the upload fits in max_payload_bytes. Only there if max_payload_bytes is passed.
+        """
+        
+        markers = cls._marker_factory(input_data, append, precision=precision, id_col=id_col)
+        
+        breakdown = dict.fromkeys(["icon", "geometry", "coordinates", "title", "tooltip", "other"], 0)
+        sizes = {}
+        
+        # Icons are shared between markers, so each one only needs to be measured once.
+        icon_sizes = {}
+        
+        def icon_size(icon):
+            if id(icon) not in icon_sizes:
+                icon_sizes[id(icon)] = (icon, len(encoding.dumps(icon)))
+            return icon_sizes[id(icon)][1]
+        
+        for marker in markers():
+            
+            # Measure each part on its own and swap it for null, then measure what's left. None of the markers' nested dicts are changed,
+            # since appended markers may be shared.
+            parts = {}
+            rest = dict(marker)
+            
+            if "icon" in rest:
+                parts["icon"] = icon_size(rest["icon"])
+                rest["icon"] = None
+            
+            for field in ["coordinates", "title"]:
+                if field in rest:
+                    parts[field] = len(encoding.dumps(rest[field]))
+                    rest[field] = None
+            
+            if isinstance(rest.get("tooltip"), dict) and "text" in rest["tooltip"]:
+                parts["tooltip"] = len(encoding.dumps(rest["tooltip"]["text"]))
+                rest["tooltip"] = {**rest["tooltip"], "text": None}
+            
+            if isinstance(rest.get("feature"), dict) and "geometry" in rest["feature"]:
+                parts["geometry"] = len(encoding.dumps(rest["feature"]["geometry"]))
+                rest["feature"] = {**rest["feature"], "geometry": None}
+            
+            other = len(encoding.dumps(rest)) - len(b"null") * len(parts)
+            
+            for field, size in parts.items():
+                breakdown[field] += size
+            
+            breakdown["other"] += other
+            sizes[marker.get("id")] = other + sum(parts.values())
+        
+        # The markers are wrapped in {"markers": [...]} and separated by commas.
+        wrapper = len(bytes(JSONStream("markers", lambda: iter([]))))
+        separators = len(encoding.ITEM_SEPARATOR) * max(0, len(sizes) - 1)
+        
+        breakdown["other"] += wrapper + separators
+        
+        plan = {
+            "bytes": sum(breakdown.values()),
+            "requests": 1 + (bool(diff) and not isinstance(diff, str)) + (cull_to_view and not metadata_loaded),
+            "breakdown": breakdown,
+            "markers": pd.Series(sizes, name="bytes", dtype=int),
+        }
+        
+        if max_payload_bytes is not None:
+            plan["fits"] = plan["bytes"] <= max_payload_bytes
+        
+        return plan
+    
+    
+    
+    
+    @staticmethod
+    def _locations(input_data: pd.DataFrame):
+        
+        # Works out where every row is, a whole column at a time, for cluster() and cull(). Returns each row's longitude and latitude (NaN if
+        # it doesn't have one), its geometry (None if it doesn't have one), and whether it's a point. Points can have a latitude and longitude,
+        # or a Point geometry, and rows without a type are points if they have a point location, like in _marker_factory().
+        n = len(input_data)
+        
+        # These are filled in below, so they have to be copies.
+        longitude = pd.to_numeric(input_data["longitude"], errors="coerce").to_numpy(dtype=float, copy=True) if "longitude" in input_data else np.full(n, np.nan)
+        latitude = pd.to_numeric(input_data["latitude"], errors="coerce").to_numpy(dtype=float, copy=True) if "latitude" in input_data else np.full(n, np.nan)
+        
+        geometry = input_data["geometry"].to_numpy(dtype=object) if "geometry" in input_data else np.full(n, None, dtype=object)
+        has_geometry = shapely.is_geometry(geometry)
+        
+        if not has_geometry.all():
+            geometry = np.where(has_geometry, geometry, None)
+        
+        is_point = shapely.get_type_id(geometry) == 0
+        
+        # shapely reads every point's x and y straight from the geometry array. Empty points give NaN.
+        from_geometry = is_point & (np.isnan(longitude) | np.isnan(latitude))
+        
+        if from_geometry.all():
+            longitude, latitude = shapely.get_x(geometry), shapely.get_y(geometry)
+        
+        elif from_geometry.any():
+            longitude[from_geometry] = shapely.get_x(geometry[from_geometry])
+            latitude[from_geometry] = shapely.get_y(geometry[from_geometry])
+        
+        typed_point = (input_data["type"] == "point").to_numpy(dtype=bool) if "type" in input_data else np.zeros(n, dtype=bool)
+        missing_type = input_data["type"].isna().to_numpy(dtype=bool) if "type" in input_data else np.ones(n, dtype=bool)
+        
+        located = ~np.isnan(longitude) & ~np.isnan(latitude)
+        points = located & (typed_point | (missing_type & (is_point | ~has_geometry)))
+        
+        return longitude, latitude, geometry, points
+    
+    
+    
+    
+    def view_bounds(self, margin: float = 0, width: int = 600):
+        
+        """Returns the bounding box of the area the map shows, from the view saved in its metadata.
+        
+        Datawrapper saves the edges of the view when a map is fitted to an area, and those are used if they're there. Otherwise the box is
+        worked out from the view's centre and zoom. Datawrapper doesn't save how wide the map is, so this assumes width pixels.
+
+        Args:
+            margin (float, optional): How much to grow the box by on each side, as a share of its width and height. Default is 0.
+            width (int, optional): How wide to assume the map is, in pixels, when working the box out from the zoom. Default is 600.
+
+        Raises:
+            MissingDataError: If the map doesn't have a view saved.
+
+        Returns:
+            tuple: The box's west, south, east and north edges, in degrees. West is bigger than east if the box crosses the antimeridian.
+        """
+        
+        view = self.metadata.get("metadata", {}).get("visualize", {}).get("view") or {}
+        fit = view.get("fit") or {}
+        
+        if all(side in fit for side in ["top", "right", "bottom", "left"]):
+            west, east = fit["left"][0], fit["right"][0]
+            south, north = fit["bottom"][1], fit["top"][1]
+        
+        elif "center" in view and "zoom" in view:
+            
+            # In Web Mercator pixels at the view's zoom level. The view's height is saved as a percentage of its width.
+            world = 256 * 2 ** view["zoom"]
+            height = width * view.get("height", 100) / 100
+            
+            longitude, latitude = view["center"]
+            sin = np.sin(np.radians(np.clip(latitude, -85.0511, 85.0511)))
+            y = (0.5 - np.log((1 + sin) / (1 - sin)) / (4 * np.pi)) * world
+            
+            def to_latitude(y):
+                return float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.clip(y, 0, world) / world)))))
+            
+            west = longitude - width / 2 / world * 360
+            east = longitude + width / 2 / world * 360
+            north, south = to_latitude(y - height / 2), to_latitude(y + height / 2)
+        
+        else:
+            raise MissingDataError(f"Map {self.CHART_ID} doesn't have a view saved in its metadata. Save the map's view in Datawrapper first.")
+        
+        # Boxes that cross the antimeridian have a west edge bigger than their east edge.
+        span = (east - west) % 360
+        
+        west = (west - span * margin + 180) % 360 - 180
+        east = (east + span * margin + 180) % 360 - 180
+        
+        if span * (1 + 2 * margin) >= 360:
+            west, east = -180, 180
+        
+        extent = north - south
+        
+        south = max(-90, south - extent * margin)
+        north = min(90, north + extent * margin)
+        
+        return west, south, east, north
+    
+    
+    
+    
+    @classmethod
+    def cull(cls,
+             input_data: pd.DataFrame | geopandas.GeoDataFrame,
+             bounds: tuple):
+        
+        """Drops the points and areas that are outside of a bounding box, ie. the map's view (see view_bounds()).
+        
+        Points are checked a whole column at a time. Areas are looked up in a spatial index of their bounding boxes first, and only the ones
+        whose boxes overlap are checked exactly. Rows that don't have a location are kept. This doesn't touch the network.
+
+        Args:
+            input_data (pd.DataFrame): The dataframe with the markers. See data() for the columns that are used.
+            bounds (tuple): The box's west, south, east and north edges, in degrees. West can be bigger than east if the box crosses the antimeridian.
+
+        Returns:
+            pd.DataFrame: The rows of the dataframe that are inside the box, in the same order.
+        """
+        
+        if isinstance(input_data, geopandas.GeoDataFrame):
+            input_data = input_data.to_crs("EPSG:4326")
+        
+        west, south, east, north = bounds
+        
+        # A box that crosses the antimeridian is checked as two boxes, one on each side.
+        boxes = [(west, east)] if west <= east else [(west, 180), (-180, east)]
+        
+        longitude, latitude, geometry, points = cls._locations(input_data)
+        keep = np.ones(len(input_data), dtype=bool)
+        
+        inside = np.zeros(len(input_data), dtype=bool)
+        for box_west, box_east in boxes:
+            inside |= (longitude >= box_west) & (longitude <= box_east) & (latitude >= south) & (latitude <= north)
+        
+        keep[points] = inside[points]
+        
+        areas = np.flatnonzero(~points & shapely.is_geometry(geometry))
+        
+        if len(areas):
+            
+            index = shapely.STRtree(geometry[areas])
+            hits = index.query(shapely.box([box[0] for box in boxes], south, [box[1] for box in boxes], north), predicate="intersects")[1]
+            
+            keep[areas] = False
+            keep[areas[hits]] = True
+        
+        return input_data.iloc[np.flatnonzero(keep)]
+    
+    
+    
+    
+    @classmethod
+    def cluster(cls,
+                input_data: pd.DataFrame | geopandas.GeoDataFrame,
+                cell_km: float = None,
+                zoom: float = None,
+                cell_px: int = 60,
+                max_items: int = 5,
+                label: str = "{count} markers",
+                title: str = None,
+                max_scale: float = 3):
+        
+        """Combines points that are close together into one marker, so maps with thousands of points upload and draw faster.
+        
+        Points are grouped on a grid, either of cells cell_km across, or of cells cell_px pixels across at a zoom level (the same cells as
+        the map's tiles, split up as a quadtree). Each group becomes one marker in the middle of its points, which keeps the first point's other
+        properties (icon, colour, ID etc.) and is scaled up by how many points it holds. Its tooltip starts with label and lists the first
+        max_items tooltips. Points on their own and areas are left as they are. Everything is worked out on whole columns at once, so a million
+        points take a fraction of a second. This doesn't touch the network.
+
+        Args:
+            input_data (pd.DataFrame): The dataframe with the markers. See data() for the columns that are used.
+            cell_km (float, optional): How big each cell of the grid is, in kilometres.
+            zoom (float, optional): The zoom level to cluster for, instead of cell_km. Bigger zoom levels give smaller clusters.
+            cell_px (int, optional): How big each cell of the grid is in pixels, when clustering for a zoom level. Default is 60.
+            max_items (int, optional): How many of a cluster's tooltips (or titles, if there's no tooltip column) to list in its tooltip. Default is 5.
+            label (str, optional): The start of a cluster's tooltip. {count} is replaced with the number of points. Default is "{count} markers".
+            title (str, optional): The title for clusters, also with {count}. Default is None, which keeps the first point's title.
+            max_scale (float, optional): The biggest scale a cluster can have. Default is 3.
+
+        Returns:
+            pd.DataFrame: The dataframe with one row for each cluster and area, in the order of their first row. The cluster_size column
+            has how many points are in each cluster.
         """
         
-        logging.warning(f"Deleting chart with ID {self.CHART_ID}!")
+        if (cell_km is None) == (zoom is None):
+            raise ValueError("Pass either cell_km or zoom to cluster points.")
+        
+        if isinstance(input_data, geopandas.GeoDataFrame):
+            input_data = input_data.to_crs("EPSG:4326")
+        
+        longitude, latitude, geometry, clustered = cls._locations(input_data)
+        points = np.flatnonzero(clustered)
+        
+        if len(points) == 0:
+            return input_data
+        
+        x, y = longitude[points], latitude[points]
+        
+        if zoom is not None:
+            
+            # Web Mercator pixels at this zoom level, which is what the map draws with.
+            world = 256 * 2 ** zoom
+            sin = np.sin(np.radians(np.clip(y, -85.0511, 85.0511)))
+            
+            column = np.floor((x + 180) / 360 * world / cell_px)
+            row = np.floor((0.5 - np.log((1 + sin) / (1 - sin)) / (4 * np.pi)) * world / cell_px)
+        
+        else:
+            
+            # Rows of cells are cell_km tall, and each row's cells are cell_km wide at the middle of the row.
+            height = cell_km / 111.32
+            row = np.floor(y / height)
+            width = height / np.maximum(np.cos(np.radians((row + 0.5) * height)), 1e-6)
+            column = np.floor((x + 180) / width)
+        
+        # Sort the points by cell once, and work out everything about the clusters from that. The sort is stable, so each cluster's points
+        # stay in their original order. Each cell is numbered first, so the numbers can be sorted 15 bits at a time: numpy sorts 16-bit
+        # integers with a radix sort, which is several times faster than sorting the 64-bit cell keys.
+        cells = pd.factorize(row.astype(np.int64) * 2 ** 32 + column.astype(np.int64))[0]
+        order = np.argsort((cells & 0x7FFF).astype(np.int16), kind="stable")
+        
+        if cells.max() > 0x7FFF:
+            order = order[np.argsort((cells[order] >> 15).astype(np.int16), kind="stable")]
+        
+        sorted_cells = cells[order]
+        new_cell = np.concatenate([[True], sorted_cells[1:] != sorted_cells[:-1]])
+        
+        starts = np.flatnonzero(new_cell)
+        counts = np.diff(np.append(starts, len(cells)))
+        
+        by_cell = np.cumsum(new_cell) - 1
+        inverse = np.empty(len(cells), dtype=np.int64)
+        inverse[order] = by_cell
+        
+        first = order[starts]
+        rank = np.arange(len(cells)) - starts[by_cell]
+        
+        # Each cluster goes in the middle of its points.
+        centre_x = np.bincount(inverse, weights=x) / counts
+        centre_y = np.bincount(inverse, weights=y) / counts
+        
+        # Keep the first row of each cluster and every row that isn't a point, in their original order.
+        kept = np.sort(np.concatenate([points[first], np.flatnonzero(~clustered)]))
+        
+        output = input_data.iloc[kept].copy()
+        output["cluster_size"] = 1
+        
+        # Only clusters with more than one point change. Everything else keeps its row as it is.
+        grouped = counts > 1
+        
+        if not grouped.any():
+            return output
+        
+        rows = np.searchsorted(kept, points[first][grouped])
+        size = counts[grouped]
+        
+        def set_values(name, values, dtype):
+            
+            # Columns that can't hold the new values (ie. integer coordinates, or a tooltip column that's all NaN) are converted first.
+            if name not in output:
+                output[name] = pd.Series(None, index=output.index, dtype=object)
+            
+            elif dtype is float and not pd.api.types.is_float_dtype(output[name]) and not pd.api.types.is_object_dtype(output[name]):
+                output[name] = output[name].astype(float)
+            
+            elif dtype is object and not pd.api.types.is_object_dtype(output[name]):
+                output[name] = output[name].astype(object)
+            
+            output.iloc[rows, output.columns.get_loc(name)] = values
+        
+        set_values("cluster_size", size, int)
+        
+        if "longitude" in output and "latitude" in output:
+            set_values("longitude", centre_x[grouped], float)
+            set_values("latitude", centre_y[grouped], float)
+        
+        if "geometry" in output:
+            set_values("geometry", shapely.points(centre_x[grouped], centre_y[grouped]), None)
         
-        headers = {
-            "Accept": "*/*", 
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-            }
-
-        r = requests.delete(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}", headers=headers)
+        # Bigger clusters get bigger markers, starting from the average scale of their points.
+        scale = pd.to_numeric(input_data["scale"], errors="coerce").to_numpy(dtype=float)[points] if "scale" in input_data else np.full(len(points), np.nan)
+        scale = np.where(np.isnan(scale), 1.1, scale)
+        scale = np.bincount(inverse, weights=scale)[grouped] / size
         
-        if r.ok: logging.info(f"SUCCESS: Chart published!")
-        else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be deleted. Response: {r.reason}")
+        set_values("scale", np.minimum(scale * (1 + np.log10(size)), max_scale), float)
         
-        return self
+        # Text with {count} in it is filled in for every cluster at once, by adding up arrays of strings.
+        def with_count(text, counts):
+            parts = text.split("{count}")
+            counts = counts.astype(str).astype(object)
+            return functools.reduce(lambda filled, part: filled + counts + part, parts[1:], np.full(len(counts), parts[0], dtype=object))
+        
+        # List the first few items in each cluster's tooltip. The nth point of every cluster is added at once.
+        text_column = "tooltip" if "tooltip" in input_data else "title" if "title" in input_data else None
+        tooltips = with_count(label, size)
+        
+        if text_column is not None:
+            
+            # Only the points that are listed need their text, which is at most max_items for each cluster.
+            listed = (rank < max_items) & grouped[by_cell]
+            members, member_rank = order[listed], rank[listed]
+            
+            texts = input_data[text_column].iloc[points[members]]
+            texts = ("<br>" + texts.where(texts.notna(), "").astype(str)).to_numpy(dtype=object)
+            
+            # Where each cluster with more than one point is in the list of clusters that change.
+            changed = (np.cumsum(grouped) - 1)[inverse[members]]
+            
+            for i in range(max_items):
+                tooltips[changed[member_rank == i]] += texts[member_rank == i]
+        
+        more = size > max_items
+        tooltips[more] += with_count("<br>and {count} more", size[more] - max_items)
+        
+        set_values("tooltip", tooltips, object)
+        
+        if title is not None:
+            set_values("title", with_count(title, size), object)
+        
+        return output
     
     
     
     
-    def export(self, format: str = "png", filename: str = "export"):
+    @classmethod
+    def fit_to_size(cls,
+                    input_data: pd.DataFrame | geopandas.GeoDataFrame,
+                    max_payload_bytes: int,
+                    append: str = None,
+                    precision: int = None):
         
-        """Exports your graphic.
+        """Simplifies a dataframe's areas just enough for its markers to fit in a payload size (ie. Datawrapper's 2MB upload limit).
+        
+        If the markers already fit, the dataframe is returned as it is. Otherwise, the simplification tolerance is found with a binary search,
+        stopping at the smallest tolerance that fits, so as much detail as possible is kept. Only the areas' part of the payload changes with
+        the tolerance, so each step of the search only re-measures the areas. Simplifying preserves each shape's topology (no self-intersections
+        or collapsed holes). If the polygons tile without overlapping (ie. provinces), they're simplified together so neighbours keep sharing
+        their borders. Otherwise each shape is simplified on its own, which can open small gaps or overlaps between neighbouring areas. This
+        doesn't touch the network.
 
         Args:
-            format (str, optional): The filetype to export as. Allowed types: png, svg.
-            filename (str, optional): The name for the exported file, relative to project root. Defaults to: export.png. Do not specify a file suffix here.
+            input_data (pd.DataFrame): The dataframe with the markers. See data() for the columns that are used.
+            max_payload_bytes (int): The largest payload allowed, in bytes.
+            append (str, optional): Path to a JSON file of extra markers that will be uploaded too. See data().
+            precision (int, optional): How many decimals coordinates will be rounded to. See data().
+
+        Raises:
+            PayloadTooLargeError: If the markers don't fit even with the areas simplified as much as possible.
 
         Returns:
-            object: Returns self, the instance of the Graphics class. Can be chained with other methods.
+            pd.DataFrame: The dataframe, with its areas simplified if needed.
         """
         
-        VALID_FORMAT_LIST = ["png", "svg"]
-        
-        if format not in VALID_FORMAT_LIST:
-            raise InvalidExportTypeError(f"Invalid export type specified.", VALID_FORMAT_LIST)
-        
-        file_path = self.path + filename + "." + format
+        if isinstance(input_data, geopandas.GeoDataFrame):
+            input_data = input_data.to_crs("EPSG:4326")
         
-        headers = {
-            "Accept": "image/png", 
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-            }
-
-        export_chart_response = requests.get(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}/export/{format}?unit=px&mode=rgb&plain=false&scale=1&zoom=2&download=true&fullVector=false&ligatures=true&transparent=false&logo=auto&dark=false", headers=headers)
-            
+        size = len(cls._marker_payload(input_data, append, precision=precision))
         
-        if export_chart_response.ok:
-            logging.info(f"SUCCESS: Chart with ID {self.CHART_ID} exported and saved!")
-            
-            with open(file_path, "wb") as response:
-                response.write(export_chart_response.content)
-                
-        else: raise DatawrapperAPIError(f"ERROR: Chart couldn't be exported as {format}. Response: {export_chart_response.reason}")
+        if size <= max_payload_bytes or "geometry" not in input_data:
+            return input_data
         
-        return self
-
-
-
-
-
-class Chart(Graphic):
-    
-    """Defines methods and variables for uploading data to datawrapper charts (scatter plots, tables etc).
-    
-    Use this class to create a new, copy, or to manage a currently existing Datawrapper chart (ie. not a map!).
-    
-    """
-    
-    def __init__(self,
-                 *args,
-                 **kwargs
-                 ):
+        # Only shapes other than points can be simplified.
+        geometry = input_data["geometry"].to_numpy(dtype=object)
+        geometry = np.where(shapely.is_geometry(geometry), geometry, None)
+        areas = np.flatnonzero(shapely.is_geometry(geometry) & (shapely.get_type_id(geometry) != 0))
         
-        super(Chart, self).__init__(*args, **kwargs)
+        def prepare(shapes):
+            # Rounds the areas the same way _marker_factory() does.
+            return shapely.set_precision(shapes, 10 ** -precision) if precision is not None else shapes
         
-        self._check_graphic_type(self.allowed_chart_types)
+        def area_bytes(shapes):
+            return sum(len(encoding.dumps(Feature(geometry=shape, properties={})["geometry"])) for shape in prepare(shapes))
         
-        headers = {
-            "Accept": "*/*",
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-        }
+        # Everything except the areas stays the same size whatever the tolerance is.
+        area_size = area_bytes(geometry[areas])
+        fixed = size - area_size
         
-        # Grab data from already existing chart and store it in this object.
-        r = requests.get(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}/data", headers=headers)
+        # Encoding every area at every step of the search would be slow, so the search estimates the areas' size from how many vertices
+        # are left, which shapely counts without encoding anything. The result is then measured exactly, and the search runs again with
+        # a smaller budget if the estimate was off.
+        bytes_per_vertex = area_size / max(1, shapely.get_num_coordinates(prepare(geometry[areas])).sum())
         
-        if r.ok: 
-            try: self.dataset = pd.read_csv(StringIO(r.text), sep=";")
-            except: self.dataset = pd.DataFrame()
-        else: raise Exception(f"Couldn't get data from existing chart. Response: {r.reason}")
+        # Simplifying neighbouring areas one by one can move the two copies of their shared border differently. If the polygons form a
+        # coverage (no overlaps, and neighbours share the same vertices), coverage_simplify() simplifies each shared border once instead.
+        # It needs shapely 2.1 and GEOS 3.12.
+        polygons = np.isin(shapely.get_type_id(geometry[areas]), [3, 6])
         
-    
-
+        try: as_coverage = polygons.sum() > 1 and bool(shapely.coverage_is_valid(geometry[areas][polygons]))
+        except (AttributeError, shapely.errors.UnsupportedGEOSVersionError, shapely.errors.GEOSException): as_coverage = False
         
+        def simplify(tolerance):
+            
+            if not as_coverage:
+                return shapely.simplify(geometry[areas], tolerance, preserve_topology=True)
+            
+            simplified = geometry[areas].copy()
+            simplified[polygons] = shapely.coverage_simplify(geometry[areas][polygons], tolerance)
+            simplified[~polygons] = shapely.simplify(geometry[areas][~polygons], tolerance, preserve_topology=True)
+            
+            return simplified
         
+        def estimate(tolerance):
+            simplified = simplify(tolerance)
+            return fixed + shapely.get_num_coordinates(prepare(simplified)).sum() * bytes_per_vertex, simplified
         
-    def disable_grid(self):
+        # No tolerance needs to be bigger than the biggest area, which simplifies every shape about as far as it'll go.
+        bounds = shapely.bounds(geometry[areas])
+        highest = float(np.nanmax(np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1]))) if len(areas) else 0.0
         
-        # Set a few visualization properties that control the grid visibility on charts.
-        self.metadata["metadata"]['visualize']["y-grid"] = "off"
-        self.metadata["metadata"]['visualize']["x-grid"] = "off"
+        if not len(areas) or estimate(highest)[0] > max_payload_bytes:
+            raise PayloadTooLargeError(f"The markers won't fit in {max_payload_bytes:,} bytes, even with every area simplified as far as it'll go.")
         
-        self.metadata["metadata"]['visualize']["y-grid-lines"] = "off"
-        self.metadata["metadata"]['visualize']["x-grid-lines"] = "off"
+        budget = max_payload_bytes
         
-        # Send the metadata representation in this class to the datawrapper graphic.
-        self.set_metadata()
+        for attempt in range(5):
+            
+            # Tolerances can be anywhere from a millionth of the biggest area up to all of it, so search halfway between them on a log scale.
+            # Stop once the tolerance is known to within 2%.
+            low, high = highest * 1e-6, highest
+            
+            while high / low > 1.02:
+                
+                middle = math.sqrt(low * high)
+                
+                if estimate(middle)[0] <= budget: high = middle
+                else: low = middle
+            
+            simplified = simplify(high)
+            size = fixed + area_bytes(simplified)
+            
+            if size <= max_payload_bytes:
+                break
+            
+            budget -= size - max_payload_bytes
         
-        return self
+        else:
+            raise PayloadTooLargeError(f"The markers won't fit in {max_payload_bytes:,} bytes, even with the areas simplified. The closest was {size:,} bytes.")
         
+        logging.info(f"Simplified areas with a tolerance of {high:.6g} to fit the upload in {size:,} bytes.")
         
+        geometry[areas] = simplified
         
+        input_data = input_data.copy()
         
+        if isinstance(input_data, geopandas.GeoDataFrame):
+            input_data["geometry"] = geopandas.GeoSeries(geometry, index=input_data.index, crs=input_data.crs)
+        else:
+            input_data["geometry"] = pd.Series(geometry, index=input_data.index, dtype=object)
         
+        return input_data
     
-    def data(self, data: pd.DataFrame):
+    
+    
+    
+    @classmethod
+    def _marker_payload(cls,
+                        input_data: pd.DataFrame | geopandas.GeoDataFrame,
+                        append: str = None,
+                        **options):
         
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "text/csv",
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-        }
-
-        payload = data.to_csv(sep=";")
+        # Builds the JSONStream that data() uploads. With the built-in encoder, each icon is swapped for a fragment that's only encoded once.
+        # orjson encodes an icon faster than the fragment can be spliced back in, so then the icons are left as they are.
+        # Appended shapes are always encoded ahead of time.
+        if encoding.orjson is None:
+            icons = {name: JSONStream.fragment(name) for name in cls.icon_list}
+            markers = cls._marker_factory(input_data, append, icons=icons, pre_encoded=True, **options)
+            payload = JSONStream("markers", markers, fragments=cls.icon_list)
         
-        r = requests.put(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}/data", headers=headers, data=payload.encode('utf-8'))
-
-        if r.ok: logging.info(f"SUCCESS: Data added to chart.")
-        else: raise DatawrapperAPIError(f"Chart data couldn't be added. Response: {r.reason}")
+        else:
+            markers = cls._marker_factory(input_data, append, pre_encoded=True, **options)
+            payload = JSONStream("markers", markers)
         
-        self.set_metadata()
+        # How many bytes of the payload are icons, worked out from how many times each one is used.
+        payload.icon_bytes = sum(count * len(encoding.dumps(cls.icon_list[name])) for name, count in markers.icon_counts.items())
         
-        return self
+        return payload
     
-
-
-
-
-# This class defines methods and variables for Datawrapper locator maps.
-# It is also extended by the hurricane map class below.
-class Map(Graphic):
     
-    # Script_name variable is used to pull the right icon templates from the assets folder, and is set on init.
-    global script_name
-    global icon_list
     
-    def __init__(self,
-                 *args,
-                 **kwargs
-                 ):
-        super(Map, self).__init__(*args, **kwargs)
-        
-        self._check_graphic_type("locator-map")
-        
-        self.icon_list = dw_icons
+    
+    @classmethod
+    def _chunked_payload(cls,
+                         chunks,
+                         append: str = None,
+                         id_col: str = None,
+                         **options):
         
-        # This bit of code tries to load in data from the map in the DW app, but is not working currently.
-        # markers = [self.get_markers()]
+        # Builds the payload that data() uploads from chunks of a dataframe, one chunk at a time. The chunks can only be read once, so the
+        # encoded payload is spooled (to disk once it's big) where it can be read again to hash, upload and retry.
+        fragments = cls.icon_list if encoding.orjson is None else None
+        icons = {name: JSONStream.fragment(name) for name in cls.icon_list} if fragments else None
         
-        # dfs = []
+        icon_counts = collections.Counter()
         
-        # for marker in markers:
-        #     df = pd.DataFrame({'id': [marker["id"]]})
+        def markers():
             
-        #     df["type"] = marker["type"]
-                          
-        #     for property in ["id", "title", "icon", "scale", "markerColor", "markerSymbol", "anchor", "visible"]:
-        #         df[property] = marker[property] if hasattr(marker, property) else np.nan
+            start = 0
+            seen = set()
             
-        #     if marker["type"] == "point":
+            for chunk in chunks:
                 
-        #         df["tooltip"] = marker["tooltip"]["text"]
-        #         df["latitude"] = marker["coordinates"][1]
-        #         df["longitude"] = marker["coordinates"][0]
-        #         df["icon"] = marker["icon"]["id"]
+                if len(chunk) == 0:
+                    continue
                 
-        #     else:
-        #         try: df["geometry"] = shape(marker["feature"]["geometry"]).wkt
-        #         except KeyError: df["geometry"] = shape(marker["features"]["feature"])
+                factory = cls._marker_factory(chunk, icons=icons, id_col=id_col, start=start, pre_encoded=True, **options)
+                
+                # IDs from id_col have to be unique across all the chunks, not just within each one.
+                if id_col is not None:
+                    
+                    repeated = [row for row, marker_id in zip(chunk.index, factory.ids) if marker_id in seen]
+                    
+                    if repeated:
+                        raise DuplicateMarkerIDError(id_col, repeated)
+                    
+                    seen.update(factory.ids)
+                
+                icon_counts.update(factory.icon_counts)
+                start += len(chunk)
+                
+                yield from factory()
             
-        #     dfs.append(df)
+            # The appended shapes go at the end, with the same IDs _marker_factory() would give them.
+            shapes = cls._shape_file(append)
             
-        # self.dataset = pd.concat(dfs)
-     
-     
-     
-     
-    # Check markerColor to make sure it's a valid hex code.
-    def _check_if_valid_hexcode(self, string):
-        match = re.search("#[A-Za-z0-9]{6}", string)
-        if match is None:
-            return False
-        else:
-            return True
-     
-     
-     
-     
-     
+            for i in range(len(shapes)):
+                yield shapes.encode(i, "s" + str(i) if id_col is not None else "m" + str(start + i))
+        
+        payload = SpooledStream(JSONStream("markers", markers, fragments=fragments))
+        payload.icon_bytes = sum(count * len(encoding.dumps(cls.icon_list[name])) for name, count in icon_counts.items())
+        
+        return payload
     
-    def data(self,
-             input_data: pd.DataFrame | geopandas.GeoDataFrame,
-             append: str = None):
+    
+    
+    
+    @staticmethod
+    def _shape_file(append: str = None):
         
-        """Uploads your data the map as markers.
+        # The shapes to append, from the shape cache if the file hasn't changed since it was last read.
+        if not append:
+            return ShapeFile(None, [])
         
-        This method handles the majority of the heavy lifting for map data. In essence, it converts either a pd.DataFrame or a geopandas.GeoDataFrame to a GEOJson object, then replaces values in a template with custom values specified in the dataframe.
+        if Datawrapper.shape_cache is not None:
+            return Datawrapper.shape_cache.get(append)
         
+        return ShapeFile.parse(append)
+    
+    
+    
+    
+    @classmethod
+    def _build_markers(cls,
+                       input_data: pd.DataFrame | geopandas.GeoDataFrame,
+                       append: str = None,
+                       **options):
+        
+        """Converts a dataframe into the list of marker objects that Datawrapper expects for a locator map.
+        
+        This doesn't touch the network, so it can be used by any class that needs to build map markers. See data() for the columns that are used.
+
         Args:
-            input_data (pd.DataFrame): The dataframe that you ultimately want to upload.
+            input_data (pd.DataFrame): The dataframe to convert.
+            append (str, optional): Path to a JSON file of extra markers to add to the end of the list.
+            **options: Options that change how markers are built (ie. precision). See data().
 
         Returns:
-            object: Returns the datawrapper graphic object so methods can be chained.
+            list: The list of marker dicts, with IDs assigned.
         """
         
-        # New list for storing the altered geojson.
-        new_features = []
+        return list(cls._marker_factory(input_data, append, **options)())
+    
+    
+    
+    
+    @classmethod
+    def _marker_factory(cls,
+                        input_data: pd.DataFrame | geopandas.GeoDataFrame,
+                        append: str = None,
+                        icons: dict = None,
+                        precision: int = None,
+                        id_col: str = None,
+                        pre_encoded: bool = False,
+                        start: int = 0):
+        
+        """Does all the checks and column-wide work for _build_markers(), and returns a function that yields the marker dicts one at a time.
+        
+        The function can be called as many times as needed (ie. once to hash the payload and again to upload it), and only one marker
+        is held in memory at a time.
+
+        Args:
+            input_data (pd.DataFrame): The dataframe to convert.
+            append (str, optional): Path to a JSON file of extra markers to add to the end of the list.
+            icons (dict, optional): What to put in each marker's icon, by icon name. Defaults to icon_list. data() passes JSONStream
+                fragments here, so each icon is only encoded once.
+            precision (int, optional): How many decimals to round coordinates to. See data().
+            id_col (str, optional): The column to take marker IDs from. See data().
+            pre_encoded (bool, optional): Yield the appended shapes as RawJSON that was encoded ahead of time, rather than as dicts. Only
+                useful for encoding, so data() passes this. Default is False.
+            start (int, optional): The number to start numbering markers from, when input_data is one chunk of a bigger dataframe. Default is 0.
+
+        Returns:
+            function: Returns a new iterator over the marker dicts, with IDs assigned, each time it's called.
+        """
         
         # If the input data is a GeoDataFrame (rather than a pandas DataFrame), then change the CRS.
         if isinstance(input_data, geopandas.GeoDataFrame):
             input_data = input_data.to_crs("EPSG:4326")
         
-        # Define a list of marker values that are allowed for various marker properties.
-        ALLOWED_VALUES = {
-            "marker": ["point", "area"],
-            "anchor": ["middle-left", "middle-center", "middle-right", "bottom-left", "bottom-center", "bottom-right", "top-left", "top-center", "top-right"],
-            "icon": [key for key, value in self.icon_list.items()]
-        }
+        # Check to make sure values that have an allowed list are correctly entered, and throw an error if they're not.
+        cls.validate(input_data)
+        
+        # Everything below is worked out one column at a time rather than one row at a time, and the marker dicts are only put together at the end.
+        n = len(input_data)
         
-        # This loops through each row in the dataframe that was input and turns it into the properly formatted JSON object.
-        for i, feature in input_data.iterrows():
+        if icons is None:
+            icons = cls.icon_list
+        
+        def column(name, default, keep=None):
             
-            # Check if a marker type is specified. Throw an error if it's not provided.
-            try: marker_type = feature["type"]
+            # Returns a column's values as plain Python objects, with the default wherever a value is missing (or the whole column is).
+            # keep can narrow down which values are used, ie. only the booleans in a column that mixes booleans and colours.
+            if name not in input_data:
+                return [default] * n
             
-            # This bit of code checks a few things to define default marker types (points or areas).
-            except: 
-                # If there's a defined geometry property that's not a point, it's an area.
-                if "geometry" in feature and not pd.isna(feature["geometry"]) and not isinstance(feature["geometry"], Point):
-                    marker_type = "area"
-                    
-                # If there's a latitude column and a longitude value, OR if there's a Point feature provided, it's a point.
-                elif ("latitude" in feature and "longitude" in feature and not pd.isna(feature["latitude"]) and not pd.isna(feature["longitude"])) or "geometry" in feature and isinstance(feature["geometry"], Point):
-                    marker_type = "point"
-                    
-                    feature["longitude"] = float(feature["geometry"].x)
-                    feature["latitude"] = float(feature["geometry"].y)
-                # If none of these things, then the marker type cannot be inferred, and we raise an error.    
-                else:
-                    raise MissingDataError(f"Type of marker cannot be inferred from data provided. Please specify a marker type for all rows in your Dataframe.")
+            values = input_data[name].to_numpy(dtype=object)
+            mask = pd.notna(values)
             
-            # Check to make sure values that have an allowed list above are correctly entered, and throw an error if they're not.
-            for marker_property, _list in ALLOWED_VALUES.items():
-                if marker_property in feature and not pd.isna(feature[marker_property]) and feature[marker_property] not in _list:
-                    raise InvalidMarkerDataError(marker_property, feature[marker_property], _list)
+            if keep is not None:
+                mask &= keep(values)
             
-            for property in ["markerColor", "fill", "stroke", "markerTextColor"]:
-                
-                if property in feature and not pd.isna(feature[property]):
-                    is_hexcode = self._check_if_valid_hexcode(str(feature[property]))
-                    
-                    if property in ["fill", "stroke"] and not is_hexcode and not isinstance(feature[property], bool):
-                        raise InvalidHexcodeError()
-                    elif property not in ["fill", "stroke"] and not is_hexcode:
-                        raise InvalidHexcodeError()
+            return [value if ok else default for value, ok in zip(values, mask)]
+        
+        def is_bool(values): return np.array([isinstance(value, bool) for value in values], dtype=bool)
+        def is_str(values): return np.array([isinstance(value, str) for value in values], dtype=bool)
+        def is_truthy(values): return values.astype(bool)
+        
+        # Anything in the geometry column that isn't a shape (ie. NaN) is treated as missing.
+        geometry = input_data["geometry"].to_numpy(dtype=object) if "geometry" in input_data else np.full(n, None, dtype=object)
+        has_geometry = shapely.is_geometry(geometry)
+        geometry = np.where(has_geometry, geometry, None)
+        is_point = shapely.get_type_id(geometry) == 0
+        
+        # Rows without a marker type are areas if they have a geometry that's not a point, and points if they have a point or a latitude and longitude.
+        types = np.array(column("type", None), dtype=object)
+        missing_type = pd.isna(types)
+        
+        has_coordinates = np.zeros(n, dtype=bool)
+        if "latitude" in input_data and "longitude" in input_data:
+            has_coordinates = (input_data["latitude"].notna() & input_data["longitude"].notna()).to_numpy()
+        
+        inferred_area = missing_type & has_geometry & ~is_point
+        inferred_point = missing_type & ~inferred_area & (has_coordinates | is_point)
+        
+        # If none of these things, then the marker type cannot be inferred, and we raise an error.
+        if (missing_type & ~inferred_area & ~inferred_point).any():
+            raise MissingDataError(f"Type of marker cannot be inferred from data provided. Please specify a marker type for all rows in your Dataframe.")
+        
+        types[inferred_area] = "area"
+        types[inferred_point] = "point"
+        
+        invalid_type = ~np.isin(types, ["point", "area"])
+        if invalid_type.any():
+            raise InvalidMarkerDataError("type", types[invalid_type][0], ["point", "area"])
+        
+        points = types == "point"
+        
+        # For coordinates for point markers, users can specify either points in WKT Point form, or latitude and longitude columns.
+        # Points whose type was inferred from a Point take their coordinates from it, as do all points if there's no latitude column.
+        from_geometry = points & ((inferred_point & is_point) | ("latitude" not in input_data))
         
+        if (from_geometry & ~is_point).any():
+            if "geometry" not in input_data: raise MissingDataError(f'No geometry or latitude and longitude columns found in input data.')
+            raise GeometryError(f"There was an issue with converting geometry column coordinates into coordinates. Please ensure geometry for point markers is a WKT of type Point.")
+        
+        if (points & ~from_geometry).any() and "longitude" not in input_data:
+            raise MissingDataError(f'No geometry or latitude and longitude columns found in input data.')
+        
+        # These are filled in below, so they have to be copies rather than views of the dataframe.
+        longitude = input_data["longitude"].to_numpy(dtype=object, copy=True) if "longitude" in input_data else np.full(n, None, dtype=object)
+        latitude = input_data["latitude"].to_numpy(dtype=object, copy=True) if "latitude" in input_data else np.full(n, None, dtype=object)
+        
+        if from_geometry.any():
+            longitude[from_geometry] = shapely.get_x(geometry[from_geometry]).tolist()
+            latitude[from_geometry] = shapely.get_y(geometry[from_geometry]).tolist()
+        
+        if precision is not None:
             
-            # Load the template feature object depending on the type of each marker (area or point). Throw an error if the file can't be found.
-            if marker_type == "point":
+            # Round every point's coordinates at once. Coordinates given as text are rounded too, as long as they're numbers.
+            for coordinates in (longitude, latitude):
                 
-                new_feature = {
+                rounded = np.round(pd.to_numeric(pd.Series(coordinates[points], dtype=object), errors="coerce").to_numpy(dtype=float), precision)
+                is_number = ~np.isnan(rounded)
+                
+                coordinates[np.flatnonzero(points)[is_number]] = rounded[is_number].tolist()
+            
+            # Snap area vertices to a grid of that size. This also drops vertices that end up on top of the one before them.
+            areas = ~points & has_geometry
+            geometry[areas] = shapely.set_precision(geometry[areas].astype(object), 10 ** -precision)
+        
+        # Marker IDs are either taken from a column of unique keys, or numbered in order.
+        if id_col is not None:
+            
+            if id_col not in input_data:
+                raise MissingDataError(f"There's no {id_col} column in your data to take marker IDs from.")
+            
+            keys = input_data[id_col]
+            
+            if keys.isna().any():
+                raise MissingDataError(f"Every row needs a {id_col} to use it for marker IDs. Rows without one: {', '.join(str(row) for row in keys.index[keys.isna()])}.")
+            
+            keys = keys.astype(str)
+            duplicated = keys.duplicated(keep=False)
+            
+            if duplicated.any():
+                raise DuplicateMarkerIDError(id_col, keys.index[duplicated].tolist())
+            
+            ids = ("m" + keys).tolist()
+        
+        else:
+            ids = ["m" + str(i) for i in range(start, start + n)]
+        
+        # Properties shared by both marker types.
+        title = column("title", "")
+        visible = column("visible", True)
+        marker_color = column("markerColor", "#C42127")
+        
+        if points.any():
+            icon = column("icon", "circle")
+            scale = column("scale", 1.1)
+            marker_symbol = column("markerSymbol", "")
+            anchor = column("anchor", "middle-left")
+            tooltip = column("tooltip", "")
+        
+        if not points.all():
+            fill = column("fill", True, keep=is_bool)
+            fill_color = column("fill", "#C42127", keep=is_str)
+            stroke = column("stroke", True, keep=is_bool)
+            stroke_color = column("stroke", "#000000", keep=is_str)
+            fill_opacity = column("fill-opacity", 0.3, keep=is_truthy)
+            stroke_width = column("stroke-width", 1, keep=is_truthy)
+            stroke_opacity = column("stroke-opacity", 0.7, keep=is_truthy)
+            stroke_dasharray = column("stroke-dasharray", "100000")
+        
+        def point_marker(i):
+            return {
                 "type": "point",
-                "title": feature["title"] if "title" in input_data and not pd.isna(feature["title"]) else "",
-                "icon": self.icon_list[feature["icon"]] if "icon" in input_data and not pd.isna(feature["icon"]) else self.icon_list["circle"],
-                "scale": feature["scale"] if "scale" in input_data and not pd.isna(feature["scale"]) else 1.1,
+                "title": title[i],
+                "icon": icons[icon[i]],
+                "scale": scale[i],
                 "textPosition": True,
-                "markerColor": feature["markerColor"] if "markerColor" in input_data and not pd.isna(feature["markerColor"]) else "#C42127",
-                "markerSymbol": feature["markerSymbol"] if "markerSymbol" in input_data and not pd.isna(feature["markerSymbol"]) else "",
+                "markerColor": marker_color[i],
+                "markerSymbol": marker_symbol[i],
                 "markerTextColor": "#333333",
-                "anchor": feature["anchor"] if "anchor" in input_data and not pd.isna(feature["anchor"]) else "middle-left",
+                "anchor": anchor[i],
                 "offsetY": 0,
                 "offsetX": 0,
                 "labelStyle": "plain",
@@ -949,15 +3204,15 @@ class Map(Graphic):
                 },
                 "class": "",
                 "rotate": 0,
-                "visible": feature["visible"] if "visible" in input_data and not pd.isna(feature["visible"]) else True,
+                "visible": visible[i],
                 "locked": False,
                 "preset": "-",
                 "visibility": {
-                    "desktop": feature["visible"] if "visible" in input_data and not pd.isna(feature["visible"]) else True,
-                    "mobile": feature["visible"] if "visible" in input_data and not pd.isna(feature["visible"]) else True,
+                    "desktop": visible[i],
+                    "mobile": visible[i],
                 },
                 "tooltip": {
-                    "text": feature["tooltip"] if "tooltip" in input_data and not pd.isna(feature["tooltip"]) else ""
+                    "text": tooltip[i]
                 },
                 "connectorLine": {
                     "enabled": False,
@@ -967,98 +3222,73 @@ class Map(Graphic):
                     "stroke": 1,
                     "lineLength": 0
                 },
-                }
-
-                # For coordinates for point markers, users can specify either points in WKY Point form,
-                # or latitude and longitude columns. This logic handles the creation of the coordinates
-                # list differently depending on which columns are present.
-                if "longitude" and "latitude" in feature:
-                    new_feature["coordinates"] = [feature["longitude"], feature["latitude"]]
-                elif hasattr(feature, "geometry"):
-                    try: new_feature["coordinates"] = [float(feature["geometry"].x), float(feature["geometry"].y)]
-                    except: raise GeometryError(f"There was an issue with converting geometry column coordinates into coordinates. Please ensure geometry for point markers is a WKT of type Point.")
-                else:
-                    raise MissingDataError(f'No geometry or latitude and longitude columns found in input data.')
-            
-            
-            
-            elif marker_type == "area":
-                    
-                new_feature = {
-                    "type": "area",
-                    "title": feature["title"] if "title" in input_data and not pd.isna(feature["title"]) else "",
-                    "visible": feature["visible"] if "visible" in input_data and not pd.isna(feature["visible"]) else True,
-                    "fill": feature["fill"] if "fill" in input_data and not pd.isna(feature["fill"])and isinstance(feature["fill"], bool) else True,
-                    "stroke": feature["stroke"] if "stroke" in input_data and not pd.isna(feature["stroke"]) and isinstance(feature["stroke"], bool) else True,
-                    "exactShape": False,
-                    "highlight": False,
-                    "markerColor": feature["markerColor"] if "markerColor" in input_data and not pd.isna(feature["markerColor"]) else "#C42127",
-                    "properties": {
-                        "fill": feature["fill"] if "fill" in input_data and not pd.isna(feature["fill"]) and isinstance(feature["fill"], str) else "#C42127",
-                        "fill-opacity": feature["fill-opacity"] if ("fill-opacity" in feature and feature["fill-opacity"] and not pd.isna(feature["fill-opacity"])) else 0.3,
-                        "stroke": feature["stroke"] if "stroke" in input_data and not pd.isna(feature["stroke"]) and isinstance(feature["stroke"], str) else "#000000",
-                        "stroke-width": feature["stroke-width"] if ("stroke-width" in feature and feature["stroke-width"] and not pd.isna(feature["stroke-width"])) else 1,
-                        "stroke-opacity": feature["stroke-opacity"] if ("stroke-opacity" in feature and feature["stroke-opacity"] and not pd.isna(feature["stroke-opacity"])) else 0.7,
-                        "stroke-dasharray": feature["stroke-dasharray"] if "stroke-dasharray" in input_data and not pd.isna(feature["stroke-dasharray"]) else "100000",
-                        "pattern": "solid",
-                        "pattern-line-width": 2,
-                        "pattern-line-gap": 2
-                    },
-                    "icon": {"id": "area",
-                        "path": "M225-132a33 33 0 0 0-10 1 38 38 0 0 0-27 28l-187 798a39 39 0 0 0 9 34 37 37 0 0 0 33 12l691-93 205 145a38 38 0 0 0 40 2 38 38 0 0 0 20-36l-54-653a38 38 0 0 0-17-28 38 38 0 0 0-32-5l-369 108-274-301a39 39 0 0 0-28-12z",
-                        "horiz-adv-x": 1000,
-                        "scale": 1.1,
-                        "outline": "2px"},
-                    "visibility": {
-                        "desktop": feature["visible"] if "visible" in input_data and not pd.isna(feature["visible"]) else True,
-                        "mobile": feature["visible"] if "visible" in input_data and not pd.isna(feature["visible"]) else True,
-                    },
-                    "feature": {
-                        "type": "Feature",
-                        "properties": {},
-                        "geometry": Feature(geometry=feature["geometry"], properties={})["geometry"]
-                        }
-                }
-            
-            
-            
-            new_features.append(new_feature)
-
+                "coordinates": [longitude[i], latitude[i]],
+            }
+        
+        def area_marker(i):
+            return {
+                "type": "area",
+                "title": title[i],
+                "visible": visible[i],
+                "fill": fill[i],
+                "stroke": stroke[i],
+                "exactShape": False,
+                "highlight": False,
+                "markerColor": marker_color[i],
+                "properties": {
+                    "fill": fill_color[i],
+                    "fill-opacity": fill_opacity[i],
+                    "stroke": stroke_color[i],
+                    "stroke-width": stroke_width[i],
+                    "stroke-opacity": stroke_opacity[i],
+                    "stroke-dasharray": stroke_dasharray[i],
+                    "pattern": "solid",
+                    "pattern-line-width": 2,
+                    "pattern-line-gap": 2
+                },
+                "icon": icons["area"],
+                "visibility": {
+                    "desktop": visible[i],
+                    "mobile": visible[i],
+                },
+                "feature": {
+                    "type": "Feature",
+                    "properties": {},
+                    "geometry": Feature(geometry=geometry[i], properties={})["geometry"]
+                    }
+            }
         
         # If there are other shapes to be added (ie. highlights of provinces, etc.) then this will use a naming convention to grab them from the shapes folder.
-        # Check if there are any extra shapes to add.
+        # Check if there are any extra shapes to add. They come from the shape cache if the file hasn't changed since it was last read.
+        extra_shapes = cls._shape_file(append)
         
-        if append:
+        def markers():
+            
+            # Datawrapper uses a convention to ID features following m0, m1, m2 etc. The extra shapes are numbered after the markers so there are no duplicates.
+            # With id_col, they're numbered on their own (s0, s1, s2 etc.) instead, so their IDs don't change when the number of rows does.
+            for i, is_point_marker in enumerate(points):
+                marker = point_marker(i) if is_point_marker else area_marker(i)
+                marker["id"] = ids[i]
+                yield marker
             
-            # Open the shape file.
-            with open(append, 'r') as f:
-                extra_shapes = json.load(f)
+            for i in range(len(extra_shapes)):
                 
-                # If there is only one object and it's not in a list, make it a list.
-                if type(extra_shapes) != list:
-                    extra_shapes = [extra_shapes]
-                    
-                # Iterate through the list and add it to our markers list.
-                for shape in extra_shapes:
-                    new_features.append(shape)
-        
-        # Datawrapper uses a convention to ID features following m0, m1, m2 etc. Add these in once we have all the markers in a list so there are no duplicates.
-        for i, feature in enumerate(new_features):
-            feature["id"] = "m" + str(i)
-        
-        # Change layout of the markers to match what Datawrapper likes to receive.    
-        payload = {"markers": new_features}
-        payload = json.dumps(payload)
-        
-        # Make the HTTP request to the Datawrapper API to upload the data.
-        headers = {"Authorization": f"Bearer {self.DW_AUTH_TOKEN}"}
-        r = requests.put(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}/data", headers=headers, data=payload)
-
-        if r.ok: logging.info(f"SUCCESS: Data added to chart.")
-        else: raise Exception(f"ERROR: Chart data couldn't be added. Response: {r.reason}")
+                marker_id = "s" + str(i) if id_col is not None else "m" + str(start + n + i)
+                
+                if pre_encoded:
+                    yield extra_shapes.encode(i, marker_id)
+                    continue
+                
+                shape = dict(extra_shapes.shapes[i])
+                shape["id"] = marker_id
+                yield shape
         
+        # How many markers use each icon, so the size of the icons in the payload can be reported without encoding them.
+        markers.icon_counts = collections.Counter(np.array(icon, dtype=object)[points].tolist()) if points.any() else collections.Counter()
+        markers.icon_counts["area"] += int((~points).sum())
+        markers.ids = ids
         
-        return self
+        return markers
     
     
     
@@ -1072,12 +3302,7 @@ class Map(Graphic):
     # so it can be easily inspected.
     def get_markers(self, save: bool = False):
         
-        headers = {
-            "Accept": "text/csv",
-            "Authorization": f"Bearer {self.DW_AUTH_TOKEN}"
-            }
-        
-        response = requests.get(f"https://api.datawrapper.de/v3/charts/{self.CHART_ID}/data", headers=headers)
+        response = self._request("GET", f"charts/{self.CHART_ID}/data", headers={"Accept": "text/csv"})
         markers = response.json()["markers"]
         
         if save:
@@ -1100,7 +3325,7 @@ class FibonacciChart(Chart):
 
     Attributes:
         CHART_ID (str): The CHART_ID is a unique ID that can be taken from the URL of datawrappers. It's required to use the DW api.
-        metadata (str): Holds the chart's metadata when the graphic is instantiated.
+        metadata (dict): Holds the chart's metadata. It's fetched from Datawrapper the first time it's used, not when the graphic is instantiated.
         dataset (pd.DataFrame): Represents the data that is uploaded or will be uploaded to the graphic.
         DW_AUTH_TOKEN (str): Token to authenticate to Datawrapper's API.
         path (str): Path that the script is running from using this module.
@@ -1110,17 +3335,18 @@ class FibonacciChart(Chart):
         object: Returns self, the instance of the Graphic class. Can be chained with other methods.
     """
     
-    def __init__(self, chart_id: str = None, copy_id: str = None, folder_id: str = None):
+    def __init__(self, chart_id: str = None, copy_id: str = None, folder_id: str = None, **kwargs):
         
-        super().__init__(chart_id, copy_id, folder_id)
+        super().__init__(chart_id, copy_id, folder_id, **kwargs)
         
         
-    def data(self, input_data: pd.DataFrame):
+    def data(self, input_data: pd.DataFrame, force: bool = False):
         
         """Uploads your data and applies fibonacci coordinates to each point.
         
         Args:
             input_data (pd.DataFrame): The dataframe that you ultimately want to plat on a fibonacci chart.
+            force (bool, optional): Upload even if the data hasn't changed since the last upload. Default is False.
 
         Returns:
             object: Returns the datawrapper graphic object so methods can be chained.
@@ -1148,7 +3374,7 @@ class FibonacciChart(Chart):
         self.disable_grid()
         
         # Pass the new dataframe with the two new columns into Chart's data method to finish things off.
-        return super(self.__class__, self).data(self.dataset)
+        return super(self.__class__, self).data(self.dataset, force=force)
     
     
     
@@ -1164,7 +3390,7 @@ class CircleChart(Chart):
     
     
         
-    def data(self, input_data: pd.DataFrame):
+    def data(self, input_data: pd.DataFrame, force: bool = False):
         
         # One point will be plotted for each row. It's advisable to keep your dataset small.
         # For calendar plots, you should have one row for each month.
@@ -1191,7 +3417,7 @@ class CircleChart(Chart):
         self.disable_grid()
         
         # Pass the new dataframe with the two new columns into Chart's data method to finish things off.
-        return super(self.__class__, self).data(self.dataset)
+        return super(self.__class__, self).data(self.dataset, force=force)
     
     
 
@@ -1208,7 +3434,7 @@ class CalendarChart(Chart):
         
 
     
-    def data(self, input_data: pd.DataFrame, date_col: str, timeframe: str = "month", density: int = "15"):
+    def data(self, input_data: pd.DataFrame, date_col: str, timeframe: str = "month", density: int = "15", force: bool = False):
         
         # Convert the specified date column into pd.datetime.
         try: input_data[date_col] = pd.to_datetime(input_data[date_col])
@@ -1270,4 +3496,4 @@ class CalendarChart(Chart):
         self.set_metadata()
         
         # Pass the new dataframe with the two new columns into Chart's data method to finish things off.
-        return super(self.__class__, self).data(self.dataset)
\ No newline at end of file
+        return super(self.__class__, self).data(self.dataset, force=force)
\ No newline at end of file
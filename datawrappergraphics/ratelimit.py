@@ -0,0 +1,164 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+# File locks work differently on Windows and everywhere else.
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt
+
+
+__all__ = ["RateLimiter"]
+
+
+
+
+class RateLimiter:
+
+    """A token bucket that keeps requests to Datawrapper's API under a rate limit.
+
+    The bucket holds up to burst tokens and refills at rate tokens per second. Every request takes a token, and waits for one if the bucket
+    is empty. This lets short bursts through right away while keeping the average rate at or under the limit.
+
+    By default the bucket lives in memory and is shared by every thread in the process. If you pass a path, the bucket is kept in that file
+    instead and is shared by every process on the machine that uses the same path, so several scripts running at once share one limit.
+
+    Args:
+        rate (float): How many requests are allowed per second, on average.
+        burst (int, optional): How many requests can be sent at once after a quiet period. Defaults to rate (and at least 1).
+        path (str, optional): A file to keep the bucket in, to share it between processes.
+    """
+
+    def __init__(self,
+                 rate: float,
+                 burst: int = None,
+                 path: str = None):
+
+        if rate <= 0:
+            raise ValueError("The rate has to be more than 0 requests per second.")
+
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._state = {"tokens": self.burst, "time": time.time()}
+
+
+
+
+    def _take(self, state: dict, tokens: int):
+
+        # Refill the bucket for the time since it was last used, then take the tokens. The balance can go below zero, which reserves
+        # tokens that haven't been refilled yet. The caller waits until they have been.
+        now = time.time()
+
+        state["tokens"] = min(self.burst, state["tokens"] + (now - state["time"]) * self.rate) - tokens
+        state["time"] = now
+
+        return max(0.0, -state["tokens"] / self.rate)
+
+
+
+
+    def _reserve(self, tokens: int = 1):
+
+        # Takes tokens from the bucket and returns how long to wait before using them. Locks are only held while the bucket is updated,
+        # never while waiting, so other threads and processes can reserve their own tokens in the meantime.
+        with self._lock:
+
+            if self.path is None:
+                return self._take(self._state, tokens)
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+            with open(self.path, "a+") as f:
+
+                self._lock_file(f)
+
+                try:
+                    f.seek(0)
+
+                    try: state = json.loads(f.read())
+                    except json.JSONDecodeError: state = {"tokens": self.burst, "time": time.time()}
+
+                    wait = self._take(state, tokens)
+
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+
+                finally:
+                    self._unlock_file(f)
+
+            return wait
+
+
+
+
+    @staticmethod
+    def _lock_file(f):
+
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:  # pragma: no cover
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+
+    @staticmethod
+    def _unlock_file(f):
+
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:  # pragma: no cover
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+
+
+    def acquire(self, tokens: int = 1):
+
+        """Waits until a request can be sent without going over the limit.
+
+        Args:
+            tokens (int, optional): How many tokens to take. Default is 1.
+
+        Returns:
+            float: How long the call waited, in seconds.
+        """
+
+        wait = self._reserve(tokens)
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+
+
+
+    async def aacquire(self, tokens: int = 1):
+
+        """The async version of acquire(). Waits without blocking the event loop.
+
+        Args:
+            tokens (int, optional): How many tokens to take. Default is 1.
+
+        Returns:
+            float: How long the call waited, in seconds.
+        """
+
+        wait = self._reserve(tokens)
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        return wait
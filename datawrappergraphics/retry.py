@@ -0,0 +1,124 @@
+import email.utils
+import random
+import time
+
+
+__all__ = ["RetryPolicy"]
+
+
+
+
+class RetryPolicy:
+
+    """Decides which failed requests to Datawrapper's API are retried, and how long to wait before each retry.
+
+    Requests are retried when the API answers with one of the statuses in retry_statuses, or when the connection fails. The wait doubles
+    after each attempt (backoff_factor, 2 x backoff_factor, 4 x backoff_factor...) up to max_backoff, and is randomized so that many
+    scripts hitting the API at once don't all retry at the same moment. If the API sends a Retry-After header, that wait is used instead.
+
+    Only idempotent requests (GET, PUT, PATCH, DELETE, and POSTs that are marked as idempotent, like publishing) are retried after a
+    server error or a dropped connection, since a POST that creates or copies a chart may have gone through even if the response didn't.
+    A 429 (Too Many Requests) means the request wasn't processed at all, so those are always retried.
+
+    Args:
+        total (int, optional): The maximum number of retries for each request. Default is 5.
+        backoff_factor (float, optional): The wait before the first retry, in seconds. Default is 0.5.
+        max_backoff (float, optional): The longest wait between two attempts, in seconds. Also caps waits asked for with Retry-After. Default is 60.
+        retry_statuses (list, optional): The response statuses that are retried. Default is 429, 500, 502, 503 and 504.
+        respect_retry_after (bool, optional): Whether to wait as long as the Retry-After header asks. Default is True.
+        jitter (bool, optional): Whether to randomize the wait. Default is True.
+    """
+
+    IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"]
+
+    def __init__(self,
+                 total: int = 5,
+                 backoff_factor: float = 0.5,
+                 max_backoff: float = 60,
+                 retry_statuses: list = None,
+                 respect_retry_after: bool = True,
+                 jitter: bool = True):
+
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_statuses = retry_statuses if retry_statuses is not None else [429, 500, 502, 503, 504]
+        self.respect_retry_after = respect_retry_after
+        self.jitter = jitter
+
+
+
+
+    def should_retry(self, method: str, attempt: int, status: int = None, idempotent: bool = None):
+
+        """Checks if a request should be retried.
+
+        Args:
+            method (str): The HTTP method of the request.
+            attempt (int): How many retries have already been made for this request (0 after the first try).
+            status (int, optional): The response status. None if the request failed without a response (ie. the connection dropped).
+            idempotent (bool, optional): Whether the request is safe to repeat. If None, this is decided from the method.
+
+        Returns:
+            bool: True if the request should be retried.
+        """
+
+        if attempt >= self.total:
+            return False
+
+        if status == 429:
+            return True
+
+        if status is not None and status not in self.retry_statuses:
+            return False
+
+        if idempotent is None:
+            idempotent = method.upper() in self.IDEMPOTENT_METHODS
+
+        return idempotent
+
+
+
+
+    def delay(self, attempt: int, retry_after: str = None):
+
+        """Returns how long to wait before the next retry.
+
+        Args:
+            attempt (int): How many retries have already been made for this request.
+            retry_after (str, optional): The value of the response's Retry-After header, either in seconds or as an HTTP date.
+
+        Returns:
+            float: The wait in seconds.
+        """
+
+        if retry_after and self.respect_retry_after:
+
+            seconds = self._parse_retry_after(retry_after)
+
+            if seconds is not None:
+                return min(seconds, self.max_backoff)
+
+        backoff = min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+
+        # "Full jitter": wait a random time between 0 and the backoff.
+        if self.jitter:
+            backoff = random.uniform(0, backoff)
+
+        return backoff
+
+
+
+
+    @staticmethod
+    def _parse_retry_after(value: str):
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
@@ -22,6 +22,10 @@ setup(
         "geojson",
         "IPython"
         ],
+    extras_require={
+        "async": ["httpx"],
+        "fast": ["pyarrow", "orjson"],
+        },
     setup_requires=[
         'pytest-runner'],
     tests_require=[
@@ -6,10 +6,15 @@ import geopandas
 import glob
 import re
 import numpy
+import shapely
 import requests
 import json
 import logging
 import pytest
+import asyncio
+import io
+import email.utils
+import time
 from disasters import *
 
 
@@ -33,6 +38,113 @@ test_calendar_year_chart_data = pd.DataFrame({"date": pd.date_range("2022-01-01"
 test_calendar_year_chart_data["value"] = numpy.random.randint(1, 20)
 
 
+# A stand-in for requests.Session that answers requests locally, for tests that don't need Datawrapper. Each route maps "METHOD endpoint" to
+# a JSON body, a (status, body) tuple, or a function that takes the request and returns either. Every request is kept in calls.
+class MockSession(requests.Session):
+    
+    def __init__(self, routes: dict = None):
+        super().__init__()
+        self.routes = routes or {}
+        self.calls = []
+    
+    def request(self, method, url, headers=None, params=None, data=None, json=None, **kwargs):
+        
+        call = {"method": method, "endpoint": url.replace(datawrappergraphics.Datawrapper.API_URL + "/", "").split("?")[0], "params": params or {}, "body": json}
+        
+        # Streamed payloads (ie. a JSONStream) are read like requests would send them.
+        if data is not None:
+            data = data if isinstance(data, bytes) else b"".join(data)
+            try: call["body"] = globals()["json"].loads(data)
+            except ValueError: call["body"] = data
+        
+        status, body = self.respond(call)
+        
+        response = requests.Response()
+        response.status_code = status
+        response.reason = "OK" if status < 400 else "Error"
+        response.url = url
+        response._content = body
+        response._content_consumed = True
+        
+        return response
+    
+    def respond(self, call: dict):
+        
+        # Records a request and returns the status and body of the answer to it.
+        self.calls.append(call)
+        
+        route = self.routes.get(f"{call['method']} {call['endpoint']}")
+        answer = route(call) if callable(route) else route if route is not None else (404, {})
+        status, body = answer if isinstance(answer, tuple) else (200, answer)
+        
+        return status, body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+    
+    def sent(self, method: str, endpoint: str = None):
+        return [call for call in self.calls if call["method"] == method and endpoint in (None, call["endpoint"])]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    
+    # Nothing is cached between tests or retried, so every request a test expects is made exactly once.
+    monkeypatch.setattr(datawrappergraphics.Datawrapper, "upload_cache", None)
+    monkeypatch.setattr(datawrappergraphics.Datawrapper, "retry_policy", None)
+    
+    session = MockSession()
+    datawrappergraphics.Datawrapper.set_session(session)
+    
+    yield session
+    
+    datawrappergraphics.Datawrapper.set_session(None)
+
+
+@pytest.fixture
+def async_api(monkeypatch):
+    
+    # The same as api, for the async classes. Requests go through an httpx.MockTransport and are answered by a MockSession's routes.
+    httpx = pytest.importorskip("httpx")
+    
+    monkeypatch.setattr(datawrappergraphics.Datawrapper, "upload_cache", None)
+    monkeypatch.setattr(datawrappergraphics.Datawrapper, "retry_policy", None)
+    
+    session = MockSession()
+    
+    class Transport(httpx.MockTransport):
+        
+        # MockTransport reads the whole body before the handler sees it, so note whether it was streamed first.
+        async def handle_async_request(self, request):
+            request.extensions = {**request.extensions, "streamed": not isinstance(request.stream, httpx.ByteStream)}
+            return await super().handle_async_request(request)
+    
+    async def handler(request):
+        
+        call = {"method": request.method, "endpoint": request.url.path.replace("/v3/", "", 1), "params": dict(request.url.params),
+                "headers": request.headers, "streamed": request.extensions["streamed"]}
+        
+        data = await request.aread()
+        try: call["body"] = json.loads(data) if data else None
+        except ValueError: call["body"] = data
+        
+        status, body = session.respond(call)
+        
+        return httpx.Response(status, content=body)
+    
+    datawrappergraphics.AsyncDatawrapper.set_client(httpx.AsyncClient(transport=Transport(handler), base_url=datawrappergraphics.Datawrapper.API_URL))
+    
+    yield session
+    
+    datawrappergraphics.AsyncDatawrapper.set_client(None)
+
+
+def run_chain(chain):
+    
+    # asyncio.run() only takes a coroutine, and a chain of async graphic methods is just awaitable.
+    async def wait():
+        return await chain
+    
+    return asyncio.run(wait())
+
+
 @pytest.mark.folder
 def test_get_folder():
     assert datawrappergraphics.Folder(API_TEST_FOLDER).chart_list
@@ -86,6 +198,865 @@ def test_wrong_chart_type():
     assert wrong_type and right_type
 
 
+def test_build_markers():
+    
+    points = geopandas.GeoDataFrame({"title": ["Point 1", None]}, geometry=geopandas.points_from_xy([-90.7, -75.1], [50.2, 45.4]), crs="EPSG:4326")
+    markers = datawrappergraphics.Map._build_markers(points)
+    
+    assert [marker["type"] for marker in markers] == ["point", "point"]
+    assert markers[0]["coordinates"] == [-90.7, 50.2]
+    assert markers[1]["title"] == "" and markers[1]["scale"] == 1.1
+    assert [marker["id"] for marker in markers] == ["m0", "m1"]
+
+
+def test_validate():
+    data = test_map_data.copy()
+    data["markerColor"] = "#C42127"
+    data = pd.concat([data, data.assign(icon="not an icon", markerColor="red")], ignore_index=True)
+    
+    assert datawrappergraphics.Map.validate(data, raise_errors=False) == {"icon": [1], "markerColor": [1]}
+    
+    with pytest.raises(InvalidMapDataError) as error:
+        datawrappergraphics.Map.validate(data)
+    
+    assert error.value.rows == {"icon": [1], "markerColor": [1]}
+    assert "not an icon" in str(error.value) and "markerColor" in str(error.value)
+    assert isinstance(error.value, InvalidMarkerDataError) and isinstance(error.value, InvalidHexcodeError)
+    
+    with pytest.raises(InvalidMarkerDataError):
+        datawrappergraphics.Map.validate(data.drop(columns="markerColor"))
+
+
+def test_plan():
+    data = test_map_data.copy()
+    
+    plan = datawrappergraphics.Map.plan(data, max_payload_bytes=10)
+    
+    assert plan["bytes"] == len(datawrappergraphics.Map._marker_payload(data))
+    assert plan["bytes"] == sum(plan["breakdown"].values())
+    assert len(plan["markers"]) == len(data)
+    assert not plan["fits"]
+    assert plan["requests"] == 1
+    
+    assert datawrappergraphics.Map.plan(data, diff=True, cull_to_view=True, metadata_loaded=False)["requests"] == 3
+    assert datawrappergraphics.Map.plan(data, diff="snapshot.json", cull_to_view=True)["requests"] == 1
+    
+    assert datawrappergraphics.Chart.plan(data[["title"]])["requests"] == 2
+    assert datawrappergraphics.Chart.plan(data[["title"]], metadata_loaded=False, batch=True)["requests"] == 2
+    assert datawrappergraphics.Chart.plan(data[["title"]], metadata_loaded=False)["requests"] == 3
+
+
+def test_marker_ids():
+    data = test_map_data.copy()
+    data["key"] = [f"row{i}" for i in range(len(data))]
+    
+    ids = [marker["id"] for marker in datawrappergraphics.Map._build_markers(data, id_col="key")]
+    reversed_ids = [marker["id"] for marker in datawrappergraphics.Map._build_markers(data.iloc[::-1], id_col="key")]
+    
+    assert ids == [f"mrow{i}" for i in range(len(data))]
+    assert reversed_ids == ids[::-1]
+    
+    with pytest.raises(DuplicateMarkerIDError):
+        datawrappergraphics.Map._build_markers(pd.concat([data, data]), id_col="key")
+
+
+def test_chunked_payload():
+    data = test_map_data.copy()
+    
+    chunks = (data.iloc[i:i + 2] for i in range(0, len(data), 2))
+    payload = datawrappergraphics.Map._chunked_payload(chunks)
+    
+    assert bytes(payload) == bytes(datawrappergraphics.Map._marker_payload(data))
+    
+    payload.close()
+
+
+def test_cluster():
+    data = pd.DataFrame({
+        "title": ["A", "B", "C"],
+        "tooltip": ["A", "B", "C"],
+        "latitude": [50, 50.01, 10],
+        "longitude": [-100, -100.01, -80],
+    })
+    
+    clustered = datawrappergraphics.Map.cluster(data, cell_km=10)
+    
+    assert clustered["cluster_size"].tolist() == [2, 1]
+    assert clustered["tooltip"].tolist() == ["2 markers<br>A<br>B", "C"]
+    assert clustered["latitude"].round(3).tolist() == [50.005, 10]
+    
+    # Points given as geometry are clustered the same way.
+    points = geopandas.GeoDataFrame(data.drop(columns=["latitude", "longitude"]), geometry=geopandas.points_from_xy(data["longitude"], data["latitude"]), crs="EPSG:4326")
+    clustered = datawrappergraphics.Map.cluster(points, cell_km=10)
+    
+    assert clustered["cluster_size"].tolist() == [2, 1]
+    assert clustered.geometry.y.round(3).tolist() == [50.005, 10]
+
+
+def test_cull():
+    data = pd.DataFrame({
+        "latitude": [50, 50, 10],
+        "longitude": [-100, 175, -80],
+    })
+    
+    assert datawrappergraphics.Map.cull(data, (-110, 40, -90, 60))["longitude"].tolist() == [-100]
+    assert datawrappergraphics.Map.cull(data, (170, 40, -170, 60))["longitude"].tolist() == [175]
+
+
+def test_view_bounds():
+    graphic = datawrappergraphics.Map(chart_id=TEST_MAP_ID, expected_type="locator-map", auth_token="test")
+    
+    graphic.metadata = {"type": "locator-map", "metadata": {"visualize": {"view": {"fit": {"top": [-100, 60], "right": [-90, 50], "bottom": [-100, 40], "left": [-110, 50]}}}}}
+    assert graphic.view_bounds(margin=0.1) == pytest.approx((-112, 38, -88, 62))
+    
+    graphic.metadata = {"type": "locator-map", "metadata": {"visualize": {"view": {"center": [-100, 50], "zoom": 5, "height": 100}}}}
+    west, south, east, north = graphic.view_bounds()
+    assert west < -100 < east and south < 50 < north
+    
+    graphic.metadata = {"type": "locator-map", "metadata": {"visualize": {}}}
+    with pytest.raises(MissingDataError):
+        graphic.view_bounds()
+
+
+def test_retry_policy():
+    policy = datawrappergraphics.RetryPolicy(total=3, backoff_factor=1, max_backoff=10, jitter=False)
+    
+    assert policy.should_retry("POST", 0, status=429)
+    assert not policy.should_retry("POST", 0, status=503)
+    assert policy.should_retry("POST", 0, status=503, idempotent=True)
+    assert policy.should_retry("GET", 0) and not policy.should_retry("POST", 0)
+    assert not policy.should_retry("GET", 0, status=404)
+    assert policy.should_retry("GET", 2, status=503) and not policy.should_retry("GET", 3, status=503)
+    assert not policy.should_retry("POST", 3, status=429)
+    
+    assert [policy.delay(attempt) for attempt in range(5)] == [1, 2, 4, 8, 10]
+    assert policy.delay(0, retry_after="7") == 7
+    assert policy.delay(0, retry_after="120") == 10
+    assert policy.delay(0, retry_after="not a date") == 1
+    
+    retry_date = email.utils.formatdate(time.time() + 5, usegmt=True)
+    assert 3 < policy.delay(0, retry_after=retry_date) <= 5
+    assert policy.delay(0, retry_after=email.utils.formatdate(time.time() - 60, usegmt=True)) == 0
+    
+    assert datawrappergraphics.RetryPolicy(respect_retry_after=False, jitter=False).delay(0, retry_after="7") == 0.5
+    assert 0 <= datawrappergraphics.RetryPolicy(backoff_factor=1).delay(2) <= 4
+
+
+def test_rate_limiter(monkeypatch, tmp_path):
+    clock = [1000.0]
+    monkeypatch.setattr(datawrappergraphics.ratelimit.time, "time", lambda: clock[0])
+    
+    limiter = datawrappergraphics.RateLimiter(rate=2, burst=3)
+    
+    assert [limiter._reserve() for _ in range(3)] == [0, 0, 0]
+    assert limiter._reserve() == pytest.approx(0.5)
+    assert limiter._reserve() == pytest.approx(1)
+    
+    # After two seconds, four tokens have refilled, paying back the two that were reserved.
+    clock[0] += 2
+    assert limiter._reserve() == 0
+    assert limiter._state["tokens"] == pytest.approx(1)
+    
+    # A long quiet period only refills the bucket up to burst.
+    clock[0] += 60
+    assert limiter._reserve(4) == pytest.approx(0.5)
+    
+    with pytest.raises(ValueError):
+        datawrappergraphics.RateLimiter(rate=0)
+    
+    # Two limiters using the same file share one bucket.
+    path = str(tmp_path / "limits" / "bucket.json")
+    first = datawrappergraphics.RateLimiter(rate=1, burst=2, path=path)
+    second = datawrappergraphics.RateLimiter(rate=1, burst=2, path=path)
+    
+    assert first._reserve() == 0 and second._reserve() == 0
+    assert first._reserve() == pytest.approx(1)
+    assert second._reserve() == pytest.approx(2)
+    
+    with open(path) as f:
+        assert json.load(f) == {"tokens": pytest.approx(-2), "time": clock[0]}
+    
+    # A file that can't be read starts a full bucket.
+    with open(path, "w") as f:
+        f.write("not json")
+    assert first._reserve() == 0
+
+
+def test_upload_cache(monkeypatch, tmp_path):
+    clock = [1000.0]
+    monkeypatch.setattr(datawrappergraphics.cache.time, "time", lambda: clock[0])
+    
+    cache = datawrappergraphics.UploadCache(path=str(tmp_path / "uploads.json"), max_entries=2, max_age=60)
+    monkeypatch.setattr(datawrappergraphics.Datawrapper, "upload_cache", cache)
+    
+    uploads = []
+    chart = datawrappergraphics.Chart(chart_id=TEST_CHART_ID, expected_type="d3-lines", auth_token="test")
+    chart._request = lambda method, endpoint, **kwargs: uploads.append(kwargs["data"]) or type("Response", (), {"ok": True})()
+    
+    # A miss uploads, the same payload again is a hit, and force=True uploads anyway.
+    assert chart._put_data(b"a;b\n1;2")
+    assert not chart._put_data(b"a;b\n1;2")
+    assert chart._put_data(b"a;b\n1;2", force=True)
+    assert chart._put_data(b"a;b\n1;3")
+    assert len(uploads) == 3
+    
+    assert cache.matches(TEST_CHART_ID, cache.hash(b"a;b\n1;3"))
+    assert cache.hash("a;b") == cache.hash(b"a;b") == cache.hash([b"a", b";b"])
+    
+    # Entries older than max_age are ignored.
+    clock[0] += 61
+    assert cache.get(TEST_CHART_ID) is None
+    assert chart._put_data(b"a;b\n1;3")
+    
+    # Once there are more than max_entries charts, the least recently uploaded is evicted first.
+    cache.set("chart2", "hash2")
+    cache.set(TEST_CHART_ID, "hash1")
+    cache.set("chart3", "hash3")
+    assert cache.get("chart2") is None
+    assert cache.get(TEST_CHART_ID) == "hash1" and cache.get("chart3") == "hash3"
+    
+    cache.clear(TEST_CHART_ID)
+    assert cache.get(TEST_CHART_ID) is None and cache.get("chart3") == "hash3"
+
+
+def test_shape_cache(tmp_path):
+    shapes = [{"type": "area", "title": "Zone", "feature": {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]}}},
+              {"id": "old", "type": "text", "title": "Café"}]
+    
+    path = tmp_path / "shapes.json"
+    path.write_text(json.dumps(shapes))
+    
+    # encode() gives the same JSON as dumping the shape with its ID, whether or not it already had one.
+    shape_file = datawrappergraphics.cache.ShapeFile.parse(str(path))
+    for i, shape in enumerate(shapes):
+        assert json.loads(bytes(shape_file.encode(i, f"m{i}"))) == {**shape, "id": f"m{i}"}
+    assert bytes(shape_file.encode(1, "m1")) == json.dumps({**shapes[1], "id": "m1"}, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    
+    # A second cache in the same folder (ie. the next run of a script) reads the binary file instead of the shape file.
+    directory = tmp_path / "cache"
+    first = datawrappergraphics.ShapeCache(directory=str(directory)).get(str(path))
+    [disk_file] = directory.glob("*.bin")
+    
+    data = disk_file.read_bytes()
+    assert data.startswith(datawrappergraphics.ShapeCache.MAGIC)
+    header_end = data.index(b"\n", len(datawrappergraphics.ShapeCache.MAGIC))
+    header = json.loads(data[len(datawrappergraphics.ShapeCache.MAGIC):header_end])
+    assert header == {"path": str(path), "key": list(first.key), "count": 2}
+    
+    second = datawrappergraphics.ShapeCache(directory=str(directory)).get(str(path))
+    assert second.parts == first.parts and second._shapes is None
+    assert second.shapes == [{**shape, "id": ""} for shape in shapes]
+    
+    # A broken cache file is ignored.
+    disk_file.write_bytes(data[:-5])
+    assert datawrappergraphics.ShapeCache(directory=str(directory)).get(str(path)).shapes == shapes
+    assert datawrappergraphics.ShapeCache(directory=str(directory)).get(str(path))._shapes is None
+    
+    # Changing the file's size or modification time makes the cache read it again.
+    cache = datawrappergraphics.ShapeCache(directory=str(directory))
+    cache.get(str(path))
+    
+    path.write_text(json.dumps(shapes[:1]))
+    assert len(cache.get(str(path))) == 1
+    
+    # Same size, only the modification time tells them apart.
+    path.write_text(json.dumps([{"type": "text", "title": "Before"}]))
+    os.utime(path, ns=(0, 0))
+    assert cache.get(str(path)).shapes == [{"type": "text", "title": "Before"}]
+    
+    path.write_text(json.dumps([{"type": "text", "title": "After!"}]))
+    os.utime(path, ns=(0, 0))
+    assert cache.get(str(path)).shapes == [{"type": "text", "title": "Before"}]
+    
+    os.utime(path, ns=(10**9, 10**9))
+    assert cache.get(str(path)).shapes == [{"type": "text", "title": "After!"}]
+
+
+def test_fit_to_size():
+    
+    # Two areas that share a wiggly border.
+    border = [(1 + 0.02 * numpy.sin(40 * y), y) for y in numpy.linspace(0, 1, 2000)]
+    areas = geopandas.GeoDataFrame({"title": ["West", "East"]},
+                                   geometry=[shapely.geometry.Polygon([(0, 0)] + border + [(0, 1)]), shapely.geometry.Polygon(border + [(2, 1), (2, 0)])],
+                                   crs="EPSG:4326")
+    
+    size = len(datawrappergraphics.Map._marker_payload(areas))
+    
+    assert datawrappergraphics.Map.fit_to_size(areas, size).geometry.equals(areas.geometry)
+    
+    fitted = datawrappergraphics.Map.fit_to_size(areas, size // 4)
+    fitted_size = len(datawrappergraphics.Map._marker_payload(fitted))
+    
+    assert size // 8 < fitted_size <= size // 4
+    assert shapely.get_num_coordinates(fitted.geometry.values).sum() < shapely.get_num_coordinates(areas.geometry.values).sum()
+    
+    # The areas still meet along their border, without gaps or overlaps.
+    west, east = fitted.geometry
+    assert west.intersection(east).area == pytest.approx(0, abs=1e-12)
+    assert west.union(east).area == pytest.approx(2)
+    
+    with pytest.raises(PayloadTooLargeError):
+        datawrappergraphics.Map.fit_to_size(areas, 100)
+
+
+def test_get_dataset(monkeypatch):
+    pytest.importorskip("pyarrow")
+    
+    csv = b";date;time;value;code;label\n0;2022-01-03;2022-01-03 10:00;1.5;007;x\n1;2022-01-04;2022-01-04 11:00;NA;008;\n"
+    
+    class Response:
+        ok = True
+        def iter_content(self, chunk_size): yield csv
+        def close(self): pass
+    
+    chart = datawrappergraphics.Chart(chart_id=TEST_CHART_ID, expected_type="d3-lines", auth_token="test")
+    chart._request = lambda method, endpoint, **kwargs: Response()
+    
+    # pyarrow and the C engine read the data the same way.
+    monkeypatch.setattr(datawrappergraphics.graphics, "CSV_ENGINE", "pyarrow")
+    fast = chart._get_dataset()
+    monkeypatch.setattr(datawrappergraphics.graphics, "CSV_ENGINE", "c")
+    pd.testing.assert_frame_equal(fast, chart._get_dataset())
+    
+    assert list(fast.columns) == ["Unnamed: 0", "date", "time", "value", "code", "label"]
+    assert fast["time"].tolist() == ["2022-01-03 10:00", "2022-01-04 11:00"]
+    
+    # The missing values given to pyarrow are the ones pandas uses. Quoted so the empty string isn't skipped as a blank line.
+    values = pd.read_csv(io.StringIO("value\n" + "\n".join(f'"{value}"' for value in datawrappergraphics.graphics.NA_VALUES)))["value"]
+    assert values.isna().all()
+
+
+def test_batch_before_metadata(api):
+    api.routes["GET charts/abc"] = {"publicId": "abc", "type": "d3-lines", "title": "Old", "metadata": {"describe": {"intro": "Old deck"}}}
+    api.routes["PUT charts/abc/data"] = {}
+    api.routes["PATCH charts/abc"] = lambda call: call["body"]
+    
+    chart = datawrappergraphics.Chart(chart_id="abc", expected_type="d3-lines", auth_token="test")
+    
+    # data() fetches the metadata partway through the batch. The headline queued before that still has to be sent.
+    with chart.batch():
+        chart.head("New")
+        chart.data(pd.DataFrame({"value": [1, 2]}))
+    
+    [patch] = api.sent("PATCH")
+    assert patch["body"]["title"] == "New"
+    assert patch["body"]["metadata"]["describe"]["intro"] == "Old deck"
+    assert chart.metadata["title"] == "New"
+
+
+def test_upload_cache_read_only(api, monkeypatch, caplog):
+    cache = datawrappergraphics.UploadCache(path="/proc/nope/uploads.json")
+    monkeypatch.setattr(datawrappergraphics.Datawrapper, "upload_cache", cache)
+    api.routes["PUT charts/abc/data"] = {}
+    
+    # The upload still goes through, and the cache just doesn't remember it.
+    chart = datawrappergraphics.Chart(chart_id="abc", expected_type="d3-lines", auth_token="test")
+    
+    assert chart._put_data(b"a;b\n1;2")
+    assert chart._put_data(b"a;b\n1;2")
+    assert len(api.sent("PUT")) == 2
+    assert cache.get("abc") is None
+    assert "Couldn't write the upload cache" in caplog.text
+
+
+def test_batch(api):
+    api.routes["GET charts/abc"] = {"publicId": "abc", "type": "d3-lines", "title": "Old", "metadata": {"describe": {"intro": ""}}}
+    api.routes["PATCH charts/abc"] = lambda call: call["body"]
+    api.routes["POST charts/abc/publish"] = {}
+    
+    chart = datawrappergraphics.Chart(chart_id="abc", auth_token="test")
+    
+    # Changes made in batch mode are merged into a single PATCH, sent when the block ends.
+    with chart.batch():
+        chart.head("Headline").deck("Deck").head("New headline")
+        assert not api.sent("PATCH")
+    
+    [patch] = api.sent("PATCH")
+    assert patch["body"] == {"title": "New headline", "metadata": {"describe": {"intro": "Deck"}}}
+    
+    # publish() sends what's queued before publishing.
+    api.calls.clear()
+    chart.batch().head("Published headline").publish()
+    
+    assert [call["method"] for call in api.calls] == ["PATCH", "POST"]
+    assert api.calls[0]["body"] == {"title": "Published headline"}
+    
+    # Changes are discarded if the block raises.
+    api.calls.clear()
+    with pytest.raises(ValueError):
+        with chart.batch():
+            chart.head("Never sent")
+            raise ValueError()
+    
+    assert not api.calls and chart._pending_patch is None
+
+
+def test_batch_failed_patch(api):
+    api.routes["GET charts/abc"] = {"publicId": "abc", "type": "d3-lines", "title": "Old", "metadata": {}}
+    api.routes["PATCH charts/abc"] = (500, {})
+    api.routes["POST charts/abc/publish"] = {}
+    
+    chart = datawrappergraphics.Chart(chart_id="abc", auth_token="test").batch().head("Headline")
+    
+    with pytest.raises(DatawrapperAPIError):
+        chart.publish()
+    
+    # The changes stay queued, along with anything queued since, and are sent when publish() is tried again.
+    assert not api.sent("POST")
+    chart.deck("Deck")
+    
+    api.routes["PATCH charts/abc"] = lambda call: call["body"]
+    chart.publish()
+    
+    assert api.sent("PATCH")[-1]["body"] == {"title": "Headline", "metadata": {"describe": {"intro": "Deck"}}}
+    assert len(api.sent("PATCH")) == 2 and len(api.sent("POST")) == 1
+    assert chart._pending_patch == {}
+
+
+def test_precision():
+    data = pd.DataFrame({"type": ["point", "point", "area", "area"],
+                         "latitude": [50.123456, "45.98765", None, None],
+                         "longitude": [-90.654321, -75.5, None, None],
+                         "geometry": [None, None,
+                                      shapely.geometry.Polygon([(0, 0), (1, 0), (1.00001, 0.00001), (1, 1), (0.0004, 1.0004), (0, 1)]),
+                                      shapely.geometry.MultiPolygon([shapely.geometry.box(0, 0, 1, 1), shapely.geometry.box(5, 5, 5.0001, 5.0001)])]})
+    
+    markers = [json.loads(datawrappergraphics.encoding.dumps(marker)) for marker in datawrappergraphics.Map._build_markers(data, precision=3)]
+    
+    # Point coordinates are rounded, including ones given as text.
+    assert markers[0]["coordinates"] == [-90.654, 50.123]
+    assert markers[1]["coordinates"] == [-75.5, 45.988]
+    
+    # Area vertices that round onto the one before them are dropped, and so are parts that collapse to nothing.
+    [ring] = markers[2]["feature"]["geometry"]["coordinates"]
+    assert len(ring) == 5 and sorted(map(tuple, ring[:-1])) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    
+    polygon = markers[3]["feature"]["geometry"]
+    assert polygon["type"] == "MultiPolygon" and len(polygon["coordinates"]) == 1
+    
+    # Without precision, nothing is rounded.
+    assert datawrappergraphics.Map._build_markers(data)[0]["coordinates"] == [-90.654321, 50.123456]
+
+
+def test_streamed_upload(api, caplog):
+    api.routes["PUT charts/abc/data"] = {}
+    
+    data = pd.concat([test_map_data] * 3, ignore_index=True)
+    datawrappergraphics.Map(chart_id="abc", expected_type="locator-map", auth_token="test").data(data)
+    
+    # The payload is encoded as it's sent, and decodes to the same markers as encoding it all at once.
+    payload = bytes(datawrappergraphics.Map._marker_payload(data))
+    
+    [upload] = api.sent("PUT")
+    assert upload["body"] == json.loads(payload)
+    assert [marker["id"] for marker in upload["body"]["markers"]] == ["m0", "m1", "m2"]
+    
+    icon_bytes = 3 * len(datawrappergraphics.encoding.dumps(datawrappergraphics.Map.icon_list["circle"]))
+    assert f"Icons took up {icon_bytes:,} of the {len(payload):,} bytes uploaded." in caplog.text
+
+
+def test_async_streamed_upload(async_api, monkeypatch, caplog):
+    monkeypatch.setattr(datawrappergraphics.Datawrapper, "retry_policy", datawrappergraphics.RetryPolicy(backoff_factor=0, jitter=False))
+    
+    # The first upload fails, so the stream has to be sent again from the start.
+    responses = iter([(503, {}), (200, {})])
+    async_api.routes["PUT charts/abc/data"] = lambda call: next(responses)
+    
+    async def upload():
+        await datawrappergraphics.AsyncMap(chart_id="abc", expected_type="locator-map", auth_token="test").data(test_map_data)
+    
+    asyncio.run(upload())
+    
+    payload = bytes(datawrappergraphics.Map._marker_payload(test_map_data))
+    first, second = async_api.sent("PUT")
+    
+    assert first["streamed"] and second["streamed"]
+    assert first["body"] == second["body"] == json.loads(payload)
+    assert int(second["headers"]["Content-Length"]) == len(payload)
+    assert "Icons took up" in caplog.text
+
+
+def test_async_chain(async_api):
+    async_api.routes["GET charts/abc"] = {"publicId": "abc", "type": "d3-lines", "title": "Old", "metadata": {"describe": {"intro": ""}}}
+    async_api.routes["PATCH charts/abc"] = lambda call: call["body"]
+    async_api.routes["POST charts/abc/publish"] = {}
+    
+    chart = datawrappergraphics.AsyncChart(chart_id="abc", auth_token="test").head("Headline").deck("Deck").publish()
+    
+    # Nothing is sent until the chain is awaited, then the steps run in the order they were queued.
+    assert not async_api.calls
+    assert run_chain(chart) is chart
+    
+    assert [(call["method"], call["endpoint"]) for call in async_api.calls] == [("GET", "charts/abc"), ("PATCH", "charts/abc"), ("PATCH", "charts/abc"), ("POST", "charts/abc/publish")]
+    assert [call["body"] for call in async_api.sent("PATCH")] == [{"title": "Headline"}, {"metadata": {"describe": {"intro": "Deck"}}}]
+    
+    # A failed step raises, and the rest of the chain is dropped.
+    async_api.calls.clear()
+    async_api.routes["PATCH charts/abc"] = (500, {})
+    
+    chart.head("Never saved").publish()
+    
+    with pytest.raises(DatawrapperAPIError):
+        run_chain(chart)
+    
+    assert [call["method"] for call in async_api.calls] == ["PATCH"] and not chart._steps
+
+
+def test_async_map_options(async_api, tmp_path):
+    view = {"fit": {"top": [-100, 60], "right": [-90, 50], "bottom": [-100, 40], "left": [-110, 50]}}
+    async_api.routes["GET charts/abc"] = {"publicId": "abc", "type": "locator-map", "metadata": {"visualize": {"view": view}}}
+    async_api.routes["PUT charts/abc/data"] = {}
+    
+    data = pd.concat([test_map_data] * 3, ignore_index=True)
+    data["longitude"] = [-100, -100.01, 0]
+    data["latitude"] = [50, 50.01, 50]
+    
+    snapshot = str(tmp_path / "markers.json")
+    
+    async def upload(input_data, **kwargs):
+        await datawrappergraphics.AsyncMap(chart_id="abc", expected_type="locator-map", auth_token="test").data(input_data, **kwargs)
+    
+    # The point outside the view is dropped and the two close together are clustered, then the snapshot is written after the upload.
+    asyncio.run(upload(data, cull_to_view=True, cluster={"cell_km": 10}, diff=snapshot))
+    
+    [upload_call] = async_api.sent("PUT")
+    assert len(upload_call["body"]["markers"]) == 1
+    assert os.path.exists(snapshot)
+    
+    # Nothing changed since the snapshot, so the upload is skipped.
+    async_api.calls.clear()
+    asyncio.run(upload(data, cull_to_view=True, cluster={"cell_km": 10}, diff=snapshot))
+    
+    assert not async_api.sent("PUT")
+    
+    # Diffing against the map fetches its markers first.
+    async_api.calls.clear()
+    async_api.routes["GET charts/abc/data"] = upload_call["body"]
+    asyncio.run(upload(data, diff=True))
+    
+    assert [call["method"] for call in async_api.calls] == ["GET", "PUT"]
+    assert len(async_api.sent("PUT")[0]["body"]["markers"]) == 3
+    
+    # Chunked input is culled one chunk at a time.
+    async_api.calls.clear()
+    asyncio.run(upload(iter([data.iloc[:2], data.iloc[2:]]), cull_to_view=True))
+    
+    assert len(async_api.sent("PUT")[0]["body"]["markers"]) == 2
+    
+    with pytest.raises(ValueError):
+        datawrappergraphics.AsyncMap(chart_id="abc", expected_type="locator-map", auth_token="test").data(iter([data]), diff=True)
+
+
+def test_async_folder(async_api):
+    charts = [f"c{i}" for i in range(5)]
+    
+    def page(call):
+        offset, limit = int(call["params"]["offset"]), int(call["params"]["limit"])
+        return {"list": [{"publicId": chart_id} for chart_id in charts[offset:offset + limit]], "total": len(charts)}
+    
+    async_api.routes["GET charts"] = page
+    
+    folder = run_chain(datawrappergraphics.AsyncFolder("123", page_size=2, auth_token="test"))
+    
+    assert folder.chart_list == charts
+    assert sorted(int(call["params"]["offset"]) for call in async_api.calls) == [0, 2, 4]
+
+
+def test_gather_limited(async_api):
+    httpx = pytest.importorskip("httpx")
+    
+    running = []
+    most = 0
+    
+    # Each publish waits a moment before answering, so the requests would all overlap without a limit.
+    async def handler(request):
+        nonlocal most
+        running.append(request.url.path)
+        most = max(most, len(running))
+        await asyncio.sleep(0.01)
+        running.remove(request.url.path)
+        return httpx.Response(200, json={})
+    
+    datawrappergraphics.AsyncDatawrapper.set_client(httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url=datawrappergraphics.Datawrapper.API_URL))
+    
+    charts = [datawrappergraphics.AsyncChart(chart_id=f"c{i}", expected_type="d3-lines", auth_token="test").publish() for i in range(6)]
+    results = asyncio.run(datawrappergraphics.gather_limited(*charts, limit=2))
+    
+    assert results == charts
+    assert most == 2
+    assert all(chart._published for chart in charts)
+
+
+def test_walk(api):
+    api.routes["GET folders/1"] = {"id": 1, "name": "Root", "children": [{"id": 2, "name": "Maps"}]}
+    api.routes["GET folders/2"] = {"id": 2, "name": "Maps", "children": [{"id": 3, "name": "Old"}]}
+    api.routes["GET folders/3"] = {"id": 3, "name": "Old", "children": []}
+    
+    # Newest first, like Datawrapper sorts them by lastModifiedAt.
+    charts = {
+        1: [{"publicId": "a", "type": "d3-lines", "lastModifiedAt": "2024-03-01T00:00:00Z"}],
+        2: [{"publicId": "b", "type": "locator-map", "lastModifiedAt": "2024-02-01T00:00:00Z"},
+            {"publicId": "c", "type": "d3-bars", "lastModifiedAt": "2024-01-15T00:00:00Z"},
+            {"publicId": "d", "type": "locator-map", "lastModifiedAt": "2023-12-01T00:00:00Z"}],
+        3: [{"publicId": "e", "type": "locator-map", "lastModifiedAt": "2024-02-01T00:00:00Z"}],
+    }
+    api.routes["GET charts"] = lambda call: {"list": charts[call["params"]["folderId"]], "total": len(charts[call["params"]["folderId"]])}
+    
+    folder = datawrappergraphics.Folder(1, auth_token="test")
+    
+    assert sorted(folder.walk()) == [("Root", "a"), ("Root/Maps", "b"), ("Root/Maps", "c"), ("Root/Maps", "d"), ("Root/Maps/Old", "e")]
+    assert all(call["params"]["orderBy"] == "lastModifiedAt" for call in api.sent("GET", "charts"))
+    
+    # Subfolders past max_depth aren't fetched at all.
+    api.calls.clear()
+    assert sorted(folder.walk(max_depth=1)) == [("Root", "a"), ("Root/Maps", "b"), ("Root/Maps", "c"), ("Root/Maps", "d")]
+    assert not api.sent("GET", "folders/3")
+    
+    assert sorted(folder.walk(chart_type="locator-map")) == [("Root/Maps", "b"), ("Root/Maps", "d"), ("Root/Maps/Old", "e")]
+    assert sorted(folder.walk(chart_type="locator-map", updated_since="2024-01-01")) == [("Root/Maps", "b"), ("Root/Maps/Old", "e")]
+    
+    # A different order can be asked for, so old charts are skipped instead of ending the list.
+    api.calls.clear()
+    charts[2].reverse()
+    
+    assert sorted(folder.walk(updated_since="2024-01-01", orderBy="createdAt", order="ASC")) == [("Root", "a"), ("Root/Maps", "b"), ("Root/Maps", "c"), ("Root/Maps/Old", "e")]
+    assert all(call["params"]["orderBy"] == "createdAt" for call in api.sent("GET", "charts"))
+
+
+def test_bulk_copy_manifest(api, tmp_path):
+    copies = iter(["c1", "c2"])
+    api.routes["POST charts/tpl/copy"] = lambda call: {"publicId": next(copies), "type": "d3-lines", "title": "Template"}
+    api.routes["PATCH charts/c1"] = lambda call: call["body"]
+    api.routes["PATCH charts/c2"] = (500, {})
+    api.routes["GET charts/c1"] = api.routes["GET charts/c2"] = {"type": "d3-lines", "title": "Template"}
+    
+    manifest = str(tmp_path / "manifest.json")
+    specs = [{"key": "on", "title": "Ontario"}, {"key": "qc", "title": "Quebec"}]
+    
+    # The second copy is made, but setting it up fails. Both copies are saved in the manifest as soon as they're made.
+    with pytest.raises(DatawrapperAPIError) as error:
+        datawrappergraphics.Chart.bulk_copy("tpl", specs, manifest=manifest, max_workers=1, auth_token="test")
+    
+    assert error.value.copies == {"on": "c1", "qc": "c2"}
+    assert error.value.report.failed == ["qc"]
+    
+    with open(manifest) as f:
+        assert json.load(f) == {"tpl": {"on": "c1", "qc": "c2"}}
+    
+    # Running it again reuses both copies rather than making new ones, and finishes setting them up.
+    api.calls.clear()
+    api.routes["PATCH charts/c2"] = lambda call: call["body"]
+    
+    charts = datawrappergraphics.Chart.bulk_copy("tpl", specs, manifest=manifest, max_workers=1, auth_token="test")
+    
+    assert [chart.CHART_ID for chart in charts] == ["c1", "c2"]
+    assert not api.sent("POST")
+    assert [(call["endpoint"], call["body"]) for call in api.sent("PATCH")] == [("charts/c1", {"title": "Ontario"}), ("charts/c2", {"title": "Quebec"})]
+
+
+def test_diff(api):
+    data = pd.concat([test_map_data] * 3, ignore_index=True)
+    data["key"] = ["a", "b", "c"]
+    
+    graphic = datawrappergraphics.Map(chart_id="abc", expected_type="locator-map", auth_token="test")
+    markers = json.loads(bytes(datawrappergraphics.Map._marker_payload(data, id_col="key")))["markers"]
+    ids = [marker["id"] for marker in markers]
+    
+    # Markers saved with their keys in another order (ie. by Datawrapper) are still the same markers.
+    def reorder(value):
+        return {key: reorder(value[key]) for key in reversed(list(value))} if isinstance(value, dict) else value
+    
+    reordered = [reorder(marker) for marker in markers]
+    assert json.dumps(reordered) != json.dumps(markers)
+    
+    assert not graphic.diff(data, reordered, id_col="key")
+    
+    # So data(diff=True) doesn't upload them again.
+    api.routes["GET charts/abc/data"] = {"markers": reordered}
+    graphic.data(data, diff=True, id_col="key")
+    
+    assert not api.sent("PUT")
+    
+    # One marker removed, one changed and one added.
+    changed = pd.concat([data.iloc[1:], data.iloc[:1]], ignore_index=True)
+    changed["key"] = ["b", "c", "d"]
+    changed.loc[0, "title"] = "A new title"
+    
+    changes = graphic.diff(changed, reordered, id_col="key")
+    new_ids = [marker["id"] for marker in json.loads(bytes(datawrappergraphics.Map._marker_payload(changed, id_col="key")))["markers"]]
+    
+    assert changes.added == [new_ids[2]]
+    assert changes.removed == [ids[0]]
+    assert changes.changed == [ids[1]]
+    assert changes.delta_bytes > 0
+
+
+def test_publish_only_if_changed(api):
+    remote = {"publicId": "abc", "type": "d3-lines", "title": "Headline", "metadata": {"describe": {"intro": "Deck"}},
+              "publishedAt": "2024-02-01T00:00:00Z", "lastModifiedAt": "2024-01-01T00:00:00Z"}
+    
+    api.routes["GET charts/abc"] = remote
+    api.routes["PATCH charts/abc"] = lambda call: datawrappergraphics.graphics._deep_merge(json.loads(json.dumps(remote)), call["body"])
+    api.routes["POST charts/abc/publish"] = {}
+    
+    assert datawrappergraphics.graphics._modified_since_publish({"lastModifiedAt": "2024-01-01T00:00:00Z"})
+    assert datawrappergraphics.graphics._modified_since_publish({**remote, "lastModifiedAt": "2024-03-01T00:00:00Z"})
+    assert not datawrappergraphics.graphics._modified_since_publish(remote)
+    
+    # Sending the same headline and deck that are already there isn't a change, so publishing is skipped.
+    chart = datawrappergraphics.Chart(chart_id="abc", auth_token="test").head("Headline").deck("Deck")
+    
+    assert not chart.has_changes()
+    chart.publish(only_if_changed=True)
+    
+    assert not api.sent("POST")
+    
+    # A new deck is, so the chart is published. After that, only this object's own changes count.
+    chart.deck("A new deck").publish(only_if_changed=True)
+    
+    assert len(api.sent("POST", "charts/abc/publish")) == 1
+    assert not chart.has_changes()
+    
+    chart.publish(only_if_changed=True)
+    assert len(api.sent("POST", "charts/abc/publish")) == 1
+    
+    # A chart that was changed on Datawrapper after it was published is published, even if nothing changed here.
+    api.routes["GET charts/abc"] = {**remote, "lastModifiedAt": "2024-03-01T00:00:00Z"}
+    datawrappergraphics.Chart(chart_id="abc", auth_token="test").publish(only_if_changed=True)
+    
+    assert len(api.sent("POST", "charts/abc/publish")) == 2
+
+
+def test_iter_charts(api):
+    charts = [{"publicId": f"c{i}", "type": "d3-lines"} for i in range(7)]
+    total = len(charts)
+    
+    def page(call):
+        offset, limit = call["params"]["offset"], call["params"]["limit"]
+        
+        # The second page is slow, so prefetched pages arrive out of order.
+        if offset == 3:
+            time.sleep(0.05)
+        
+        return {"list": charts[offset:offset + limit], "total": total}
+    
+    api.routes["GET charts"] = page
+    
+    folder = datawrappergraphics.Folder(123, auth_token="test")
+    ids = [chart["publicId"] for chart in charts]
+    
+    assert list(folder.iter_charts(page_size=3)) == ids
+    assert [call["params"]["offset"] for call in api.calls] == [0, 3, 6]
+    
+    # Prefetched pages are still yielded in order, and each page is only fetched once.
+    api.calls.clear()
+    assert list(folder.iter_charts(page_size=3, prefetch=2)) == ids
+    assert sorted(call["params"]["offset"] for call in api.calls) == [0, 3, 6]
+    
+    assert list(folder.iter_charts(page_size=3, prefetch=2, expand=True)) == charts
+    assert all(call["params"]["expand"] == "true" for call in api.calls[-3:])
+    
+    # Without a total, pages are fetched one after another instead.
+    api.calls.clear()
+    total = None
+    
+    assert list(folder.iter_charts(page_size=3, prefetch=2)) == ids
+    assert [call["params"]["offset"] for call in api.calls] == [0, 3, 6]
+    
+    # chart_list is fetched once, the first time it's used.
+    api.calls.clear()
+    assert folder.chart_list == ids and folder.num_charts == 7
+    assert len(api.calls) == 1
+
+
+def test_bulk_report(api, monkeypatch, tmp_path):
+    monkeypatch.setattr("sys.argv", [str(tmp_path / "script.py")])
+    
+    folder = datawrappergraphics.Folder(123, auth_token="test")
+    chart_ids = ["c0", "c1", "c2"]
+    
+    # Every operation fails for c1 and works for the others.
+    for chart_id in chart_ids:
+        answer = (500, {}) if chart_id == "c1" else {}
+        api.routes[f"POST charts/{chart_id}/publish"] = answer
+        api.routes[f"DELETE charts/{chart_id}"] = answer
+        api.routes[f"GET charts/{chart_id}/export/png"] = (500, {}) if chart_id == "c1" else b"png"
+    
+    report = folder.publish_all(chart_ids=chart_ids)
+    
+    assert report.succeeded == ["c0", "c2"] and report.failed == ["c1"]
+    assert report.results == {"c0": "c0", "c2": "c2"}
+    assert not report
+    
+    with pytest.raises(DatawrapperAPIError) as error:
+        report.raise_for_errors()
+    
+    assert "c1" in str(error.value) and error.value.report is report
+    
+    report = folder.export_all(directory="exports", chart_ids=chart_ids)
+    
+    assert report.failed == ["c1"]
+    assert report.results == {chart_id: os.path.join(str(tmp_path), "exports", f"{chart_id}.png") for chart_id in ["c0", "c2"]}
+    assert sorted(os.listdir(tmp_path / "exports")) == ["c0.png", "c2.png"]
+    
+    folder._chart_list = chart_ids
+    report = folder.delete_all()
+    
+    assert report.failed == ["c1"] and folder._chart_list is None
+    
+    # Charts are moved 100 at a time, and a failed request fails every chart in it.
+    ids = [f"m{i}" for i in range(250)]
+    api.routes["PATCH charts"] = lambda call: (500, {}) if "m100" in call["body"]["ids"] else {}
+    
+    report = folder.move_all("456", chart_ids=ids)
+    
+    assert [len(call["body"]["ids"]) for call in api.sent("PATCH", "charts")] == [100, 100, 50]
+    assert all(call["body"]["patch"] == {"folderId": "456"} for call in api.sent("PATCH", "charts"))
+    assert report.failed == ids[100:200]
+    assert report.succeeded == ids[:100] + ids[200:]
+    
+    # A report with no failures raises nothing.
+    api.routes["PATCH charts"] = {}
+    assert folder.move_all("456", chart_ids=ids[:10]).raise_for_errors().succeeded == ids[:10]
+
+
+def test_shared_session(api, monkeypatch):
+    api.routes["POST charts/abc/publish"] = api.routes["POST charts/def/publish"] = {}
+    
+    chart = datawrappergraphics.Chart(chart_id="abc", expected_type="d3-lines", auth_token="test")
+    graphic = datawrappergraphics.Map(chart_id="def", expected_type="locator-map", auth_token="test")
+    
+    # Every graphic sends its requests through the one shared session.
+    assert chart.get_session() is graphic.get_session() is api
+    
+    chart.publish()
+    graphic.publish()
+    
+    assert [call["endpoint"] for call in api.calls] == ["charts/abc/publish", "charts/def/publish"]
+    
+    # Changing the settings closes the session, and the next one is built with the new pool size and timeout.
+    monkeypatch.setattr(datawrappergraphics.Datawrapper, "session_config", dict(datawrappergraphics.Datawrapper.session_config))
+    datawrappergraphics.Datawrapper.configure_session(pool_maxsize=4, timeout=7)
+    
+    session = chart.get_session()
+    
+    assert session is not api and session is graphic.get_session()
+    assert session.get_adapter(datawrappergraphics.Datawrapper.API_URL)._pool_maxsize == 4
+    
+    sent = []
+    
+    def request(method, url, **kwargs):
+        sent.append(kwargs)
+        response = requests.Response()
+        response.status_code = 200
+        return response
+    
+    monkeypatch.setattr(session, "request", request)
+    chart.publish()
+    
+    assert sent[0]["timeout"] == 7
+
+
 def test_wrong_hexcode():
     data = test_map_data.copy()
     data["fill"] = "a color!"